@@ -2,31 +2,52 @@ from __future__ import annotations
 
 import json
 import os
+import shutil
 import sys
+import itertools
+import threading
 import time
 from datetime import datetime, timezone
 from typing import Literal, Optional
 
-import imagehash
+import numpy as np
 import pytesseract
 import requests
-from PIL import Image, ImageGrab, ImageOps
+from PIL import Image, ImageOps
+
+from calibration import ANCHOR_BOXES, REF_H, REF_W, Layout, get_layout
+from crop_dump import CropDump
+from embedding import JacketIndex, describe, get_jacket_index
+from endpoints import api_url
+from ingest import grab_clipboard, open_image, to_rgb
+from instrumentation import METRICS
 
 # Assuming these are correctly defined in models.py with the 'self' fix
 # and AnalysisReport is a simple data class for results.
 from models import AnalysisReport, DecodeResult, Pattern, Song
+from lookup import get_table
+from phash import hamming_distances, phash, phash_many
+from recalc import PATCH_TOLERANCE, PLUS_BONUS, RANK_RATIO
+from reconcile import COUNT_FIELDS, OBSERVED_FIELDS, reconcile_result
+from songindex import VARIANTS, SongIndex
+from thumbnails import JACKET_THUMBNAILS, jacket_variant, make_thumbnail
+from version import version_to_string  # re-exported for older callers
 
 if getattr(sys, "frozen", False):
     BASEDIR = os.path.dirname(sys.executable)
 else:
     BASEDIR = os.path.dirname(os.path.abspath(__file__))
-os.environ["TESSDATA_PREFIX"] = os.path.join(BASEDIR, "tesseract", "tessdata")
+BUNDLED_TESSERACT_DIR = os.path.join(BASEDIR, "tesseract")
+# The Windows build ships its own tesseract; elsewhere the system install is used
+if os.path.isdir(os.path.join(BUNDLED_TESSERACT_DIR, "tessdata")):
+    os.environ.setdefault(
+        "TESSDATA_PREFIX", os.path.join(BUNDLED_TESSERACT_DIR, "tessdata")
+    )
 
 # --- CONFIGURATION CONSTANTS ---
 # Use one dictionary for all ROI ratios for better maintainability.
 # The keys correspond to the variable names used in the original code.
 # Format: (x_start, y_start, x_end, y_end) or (x, y) for single point.
-REF_W, REF_H = 1920, 1080
 
 ROI_CONFIG = {
     "SELECT": {
@@ -72,6 +93,165 @@ DIFFICULTY_COLORS = {
 }
 COLOR_TOLERANCE = 5  # Use a small tolerance for minor compression changes
 
+# Selected-difficulty arrow on the SELECT screen: searched down this column
+PIVOT_X, PIVOT_Y_START, PIVOT_Y_END = 843, 627, 1040
+PIVOT_COLORS = {
+    "EASY": (231, 136, 40),
+    "HARD": (234, 98, 124),
+    "OVER": (146, 115, 254),
+    "PLUS": (31, 45, 90),
+}
+
+# Glyph height (px) handed to Tesseract: what the old fixed 4x upscale made of
+# the ~20px digits on a 1080p capture. Larger captures need less upscaling.
+TARGET_GLYPH_HEIGHT = 80
+MAX_UPSCALE = 4
+# The lookup tables were recorded from crops upscaled 4x with LANCZOS
+TABLE_SCALE = 4
+BINARIZE_THRESHOLD = 200
+
+# Fields read below this confidence (0-100) are re-read unless a cross-check
+# (note sum, score, judge, P.A.T.C.H.) already vouches for them
+LOW_CONFIDENCE = 60.0
+# Alternate preprocessing for re-reads, tried in order until one is confident
+REOCR_VARIANTS = (
+    {"threshold": 160},
+    {"scale": MAX_UPSCALE},
+    {"threshold": 230},
+)
+# Jacket matches whose nearest other song is at most this many bits further
+# away are re-ranked by the learned descriptors (see embedding.py)
+RERANK_MARGIN = 3
+# Jacket candidates kept for chart checks and re-ranking
+MATCH_TOP_K = 5
+# Matches this close with a clear margin teach the descriptor index
+LEARN_DISTANCE = 2
+
+# Lookup table field -> (screen type, ROI key) whose preprocessed crop it hashes
+TABLE_SOURCES = {
+    "select_level": ("SELECT", "level"),
+    "select_major_patch": ("SELECT", "major_patch"),
+    "select_minor_patch": ("SELECT", "minor_patch"),
+    "select_minor_judge": ("SELECT", "minor_judge"),
+    "result_level": ("RESULT", "level"),
+}
+
+
+def find_tesseract() -> str | None:
+    """Tesseract binary: TESSERACT_CMD, then the bundled tesseract.exe, then PATH."""
+    tesseract_cmd = os.environ.get("TESSERACT_CMD")
+    if tesseract_cmd:
+        return tesseract_cmd
+    bundled = os.path.join(BUNDLED_TESSERACT_DIR, "tesseract.exe")
+    if os.path.isfile(bundled):
+        return bundled
+    return shutil.which("tesseract")
+
+
+class _RecognizerConfidence(threading.local):
+    """Confidence (0-100) of the last recognizer run on this thread."""
+
+    last = 0.0
+
+
+_confidence = _RecognizerConfidence()
+
+
+def record_confidence(confidence: float):
+    _confidence.last = confidence
+
+
+def last_confidence() -> float:
+    return _confidence.last
+
+
+class _ActiveDump(threading.local):
+    """CropDump of the analysis running on this thread, if dumping is on."""
+
+    current: CropDump | None = None
+
+
+_dump = _ActiveDump()
+
+
+def _match_table(screen_type: str, config_key: str, table: str, target_hash: int):
+    """``get_table(table).match``, noted in the crop dump so replay can redo it."""
+    value = get_table(table).match(target_hash)
+    if _dump.current is not None:
+        _dump.current.record_match(screen_type, config_key, table, value)
+    return value
+
+
+class _ActiveCrops(threading.local):
+    """Preprocessed table-backed crops of the analysis running on this thread."""
+
+    current: dict[tuple[str, str], Image.Image] | None = None
+
+
+_crops = _ActiveCrops()
+
+
+def _keep_crop(screen_type: str, config_key: str, crop: Image.Image):
+    if (
+        _crops.current is not None
+        and (screen_type, config_key) in TABLE_SOURCES.values()
+    ):
+        _crops.current[(screen_type, config_key)] = crop
+
+
+def _table_hashes() -> dict[str, int]:
+    """pHashes of the current analysis' crops, keyed by lookup table field.
+
+    Reports keep these instead of the upscaled crops, which would pile up in
+    ResultSession for the whole session.
+    """
+    crops = _crops.current or {}
+    fields = [field for field, source in TABLE_SOURCES.items() if source in crops]
+    hashes = phash_many([crops[TABLE_SOURCES[field]] for field in fields])
+    return {field: int(h) for field, h in zip(fields, hashes)}
+
+
+def run_tesseract(img: Image.Image, config: str) -> str:
+    """Single entry point for Tesseract so every invocation is counted and timed.
+
+    Uses image_to_data, which costs the same single Tesseract run as
+    image_to_string but also yields word confidences; the lowest one is
+    recorded as the confidence of this read.
+    """
+    METRICS.count("tesseract_calls")
+    with METRICS.span("tesseract"):
+        data = pytesseract.image_to_data(
+            img, config=config, output_type=pytesseract.Output.DICT
+        )
+    words = [
+        (text.strip(), float(conf))
+        for text, conf in zip(data["text"], data["conf"])
+        if float(conf) >= 0 and text.strip()
+    ]
+    record_confidence(min((conf for _, conf in words), default=0.0))
+    return " ".join(text for text, _ in words)
+
+
+class FieldReading:
+    """A field's value and the confidence of the recognizer that produced it."""
+
+    __slots__ = ("value", "confidence")
+
+    def __init__(self, value, confidence: float):
+        self.value = value
+        self.confidence = confidence
+
+
+class SongCandidate:
+    """A jacket match: the song, its pHash distance and (song id, variant) key."""
+
+    __slots__ = ("song", "distance", "key")
+
+    def __init__(self, song: Song, distance: int, key: tuple[int, str]):
+        self.song = song
+        self.distance = distance
+        self.key = key
+
 
 # --- CORE ANALYZER CLASS ---
 
@@ -81,180 +261,210 @@ class ScreenshotAnalyzer:
     Manages the data fetching, scaling, OCR, and analysis logic.
     """
 
-    def __init__(self, song_database: list[Song]):
-        tesseract_exe_path = os.path.join(BASEDIR, "tesseract", "tesseract.exe")
-        pytesseract.pytesseract.tesseract_cmd = tesseract_exe_path
-        self.song_db: dict[int, Song] = {song.id: song for song in song_database}
-        self.jacket_hash_map: dict[str, Song] = self._build_jacket_hash_map()
+    def __init__(
+        self,
+        song_database: list[Song] | SongIndex,
+        tesseract_cmd: str | None = None,
+        dump_dir: str | None = None,
+    ):
+        tesseract_cmd = tesseract_cmd or find_tesseract()
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        # Worker processes pass a SongIndex mapped from publish_song_index
+        if not isinstance(song_database, SongIndex):
+            song_database = SongIndex.from_songs(song_database)
+        self.song_index = song_database
+        # Optional re-ranking of ambiguous jacket matches; None disables it
+        self.jacket_index: JacketIndex | None = get_jacket_index()
+        # Preprocessing variants for re-reads; empty to read every field once
+        self.reocr_variants: tuple[dict, ...] = REOCR_VARIANTS
         self.PHASH_THRESHOLD = 5
-
-    # --- Setup Methods ---
-
-    def _build_jacket_hash_map(self) -> dict[str, Song]:
-        """Creates a map of pHash strings to Song objects for quick lookup."""
-        hash_map = {}
-        for song in self.song_db.values():
-            if song.phash:
-                hash_map[song.phash] = song
-            if song.plus_phash:
-                hash_map[song.plus_phash] = song
-        return hash_map
+        # When set, every analysis writes its crops there (see crop_dump.py)
+        self.dump_dir = dump_dir
+        # Captures from one source share a calibrated layout (see calibration.py)
+        self.capture_source = "default"
+        self._dump_counter = itertools.count()
 
     # --- Static Helper Methods ---
 
     @staticmethod
-    def _ratio(x: int, y: int) -> tuple[float, float]:
-        """Calculates normalized coordinates relative to 1920x1080."""
-        return x / REF_W, y / REF_H
-
-    @staticmethod
-    def _scale_coordinate(
-        ratio_x: float, ratio_y: float, size: tuple[int, int]
-    ) -> tuple[int, int]:
-        """Scales normalized coordinates to the current screenshot size."""
-        user_width, user_height = size
-        abs_x = int(round(user_width * ratio_x))
-        abs_y = int(round(user_height * ratio_y))
-        return abs_x, abs_y
-
-    @staticmethod
-    def determine_screen_type(screenshot: Image.Image) -> Literal["SELECT", "RESULT"]:
-        select_speed_start = (30, 908)
-        select_speed_end = (119, 932)
-        select_speed_crop = screenshot.crop(select_speed_start + select_speed_end)
-        select_speed_hash = imagehash.phash(select_speed_crop)
-        hashed_select_speed = "c0c73d38273ed2c3"
-        if select_speed_hash - imagehash.hex_to_hash(hashed_select_speed) < 5:
+    def determine_screen_type(
+        screenshot: Image.Image, layout: Layout | None = None
+    ) -> Literal["SELECT", "RESULT"]:
+        layout = layout or get_layout(screenshot)
+        select_speed_crop = screenshot.crop(layout.box(ANCHOR_BOXES["select_speed"]))
+        select_speed_hash = phash(select_speed_crop)
+        if get_table("screen_select_speed").match(select_speed_hash) == "SELECT":
             return "SELECT"
         else:
             return "RESULT"
 
     @staticmethod
     def read_selected_level_by_phash(img: Image.Image):
-        level_hash_map = {
-            5: "ea66a51ad2696497",
-            7: "eb4ae42dc42eb196",
-            15: "e87c8d02d369c697",
-            19: "e87a8d09cd699297",
-            21: "f26aad11d327849d",
-        }
-        phash = imagehash.phash(img)
-        print(phash)
-        for level, level_hash in level_hash_map.items():
-            level_hash = imagehash.hex_to_hash(level_hash)
-            if phash - level_hash < 3:
-                return level
-        return 0
+        METRICS.count("phash_fallback.select_level")
+        read_hash = phash(img)
+        METRICS.event(f"Selected level pHash: {read_hash:016x}")
+        level, confidence = get_table("select_level").match_confidence(read_hash)
+        record_confidence(confidence)
+        if level is None:
+            return 0
+        METRICS.count("phash_hit.select_level")
+        return level
 
     @staticmethod
-    def is_pivot_pixel(rgb: tuple[int, int, int]):
-        # easy
-        if abs(rgb[0] - 231) < 5 and abs(rgb[1] - 136) < 5 and abs(rgb[2] - 40) < 5:
-            return "EASY"
-        elif abs(rgb[0] - 234) < 5 and abs(rgb[1] - 98) < 5 and abs(rgb[2] - 124) < 5:
-            return "HARD"
-        elif abs(rgb[0] - 146) < 5 and abs(rgb[1] - 115) < 5 and abs(rgb[2] - 254) < 5:
-            return "OVER"
-        elif abs(rgb[0] - 31) < 5 and abs(rgb[1] - 45) < 5 and abs(rgb[2] - 90) < 5:
-            return "PLUS"
-        else:
+    def find_pivot(img: Image.Image, layout: Layout) -> tuple[int, str] | None:
+        """Reference y and difficulty of the selected-difficulty arrow.
+
+        Reads the arrow's pixel column once and matches every row at once,
+        instead of a getpixel per reference row.
+        """
+        ref_ys = np.arange(PIVOT_Y_START, PIVOT_Y_END)
+        rows = layout.ys(ref_ys)
+        x = layout.point(PIVOT_X, 0)[0]
+        top, bottom = int(rows.min()), int(rows.max()) + 1
+        column = np.asarray(img.crop((x, top, x + 1, bottom)), dtype=np.int16)[:, 0, :]
+        pixels = column[rows - top]
+        colors = np.array(list(PIVOT_COLORS.values()), dtype=np.int16)
+        hits = (np.abs(pixels[:, None, :] - colors[None, :, :]) < 5).all(axis=2)
+        found = np.flatnonzero(hits.any(axis=1))
+        if not len(found):
             return None
+        row = int(found[0])
+        difficulty = list(PIVOT_COLORS)[int(np.argmax(hits[row]))]
+        return int(ref_ys[row]), difficulty
+
+    @staticmethod
+    def is_pivot_pixel(rgb: tuple[int, int, int]):
+        for difficulty, color in PIVOT_COLORS.items():
+            if all(abs(rgb[i] - color[i]) < 5 for i in range(3)):
+                return difficulty
+        return None
 
     def _analyze_select_screen(self, img: Image.Image) -> AnalysisReport:
         screen_type = "SELECT"
         # 1. Get Base Data (Jacket and Match Song)
-        jacket_crop = self._crop_and_ocr(
-            img, screen_type, "jacket", lambda x: x, no_preprocess=True
-        )
-        # jacket_crop.save("out.png")
-        jacket_hash = imagehash.phash(jacket_crop)
-        matched_song, match_distance = self.get_best_match_song(jacket_hash)
+        with METRICS.span("stage.jacket_match"):
+            jacket_crop = self._crop(img, screen_type, "jacket")
+            full_combo_crop = self._crop(img, screen_type, "full_combo")
+            rank_crop = self._crop(img, screen_type, "rank")
+            # One batched transform for every hashed region of the screen
+            jacket_hash, full_combo_hash, rank_hash = (
+                int(h) for h in phash_many([jacket_crop, full_combo_crop, rank_crop])
+            )
+            candidates = self.match_songs(jacket_hash)
 
-        if not matched_song:
+        if not candidates:
             return AnalysisReport(
                 song_name="UNKNOWN SONG (SELECT)",
-                jacket_image=jacket_crop,
-                match_distance=match_distance,
+                jacket_image=make_thumbnail(jacket_crop),
+                match_distance=float("inf"),
             )
 
         # 2. Extract Lines and Base Difficulty Color (if available on select screen)
-        line = self._crop_and_ocr(img, screen_type, "line", self.get_ocr_line)
-        score = self._crop_and_ocr(img, screen_type, "score", self.get_ocr_integer)
-        major_patch = self._crop_and_ocr(
-            img, screen_type, "major_patch", self.get_ocr_select_major_patch
-        )
-        minor_patch = self._crop_and_ocr(
-            img, screen_type, "minor_patch", self.get_ocr_select_minor_patch
-        )
-        if minor_patch < 10:
-            minor_patch = f"0{minor_patch}"
-        patch = float(f"{major_patch}.{minor_patch}")
-
-        major_judge = self._crop_and_ocr(
-            img, screen_type, "major_judge", self.get_ocr_integer
+        specs = {
+            "line": (self.get_ocr_line, {}),
+            "score": (self.get_ocr_integer, {}),
+            "major_patch": (self.get_ocr_select_major_patch, {}),
+            "minor_patch": (self.get_ocr_select_minor_patch, {}),
+            "major_judge": (self.get_ocr_integer, {}),
+            "minor_judge": (self.get_ocr_select_minor_judge, {}),
+        }
+        readings = {
+            key: self._read_field(img, screen_type, key, ocr_func, **kwargs)
+            for key, (ocr_func, kwargs) in specs.items()
+        }
+        line = readings["line"].value
+        patch = self.compose_select_patch(
+            readings["major_patch"].value, readings["minor_patch"].value
         )
-        minor_judge = self._crop_and_ocr(
-            img, screen_type, "minor_judge", self.get_ocr_select_minor_judge
+        judge = self.compose_select_judge(
+            readings["major_judge"].value, readings["minor_judge"].value
         )
-        minor_judge = "0" * (4 - len(str(minor_judge))) + str(minor_judge)
-        judge = float(f"{major_judge}.{minor_judge}")
 
         is_full_combo = False
         is_perfect_decode = False
         is_max_patch = False
+        layout = get_layout(img, self.capture_source)
+
+        # The selected difficulty's arrow: first pivot-colored pixel down its column
+        with METRICS.span("stage.pivot_search"):
+            pivot = self.find_pivot(img, layout)
+        pivot_found = pivot is not None
+        if pivot_found:
+            pivot_y, difficulty = pivot
+            level_box = (PIVOT_X - 105, pivot_y + 29, PIVOT_X, pivot_y + 95)
+            raw_level_crop = img.crop(layout.box(level_box))
+            level_kwargs = {"do_invert": True, "scale": TABLE_SCALE}
+            with METRICS.span("field.level"):
+                level_crop = self.ocr_preprocess(raw_level_crop, **level_kwargs)
+                _keep_crop("SELECT", "level", level_crop)
+                level = self.get_ocr_integer(level_crop)
+            if _dump.current is not None:
+                _dump.current.add(
+                    "SELECT",
+                    "level",
+                    raw_level_crop,
+                    level_crop,
+                    "get_ocr_integer",
+                    level_kwargs,
+                    level,
+                    last_confidence(),
+                )
+            METRICS.event(f"OCRed Level: {level}")
+            # The chart on screen settles jackets that match several songs
+            match, match_margin = self.resolve_song(
+                candidates, jacket_crop, line, difficulty, level
+            )
+            matched_song, match_distance = match.song, match.distance
+            available_levels = matched_song.get_available_levels(line, difficulty)
+            if len(available_levels) == 1:
+                level = available_levels[0]
+            if not level in available_levels:
+                level = self.read_selected_level_by_phash(level_crop)
 
-        # Iterate until it founds the arrow
-        pivot_x = 843
-        pivot_y = 627
-        pivot_found = False
-        while pivot_y < 1040:
-            abs_coords = self._get_abs_coords(
-                (pivot_x, pivot_y, pivot_x, pivot_y), img.size
+        if not pivot_found:
+            METRICS.count("pivot_not_found")
+            METRICS.event("Pivot not found")
+            match, match_margin = self.resolve_song(candidates, jacket_crop)
+            matched_song, match_distance = match.song, match.distance
+
+        # 3. Re-read doubtful fields the level and P.A.T.C.H. cannot vouch for
+        is_f_rank = _match_table("SELECT", "rank", "select_f_rank", rank_hash) == "F"
+        confirmed = set()
+        if pivot_found:
+            if matched_song.get_available_levels(line, difficulty):
+                confirmed.add("line")
+            rank = "F" if is_f_rank else self.calculate_rank(judge)
+            expected_patch = self.calculate_patch(
+                level, rank, difficulty == "PLUS", judge
             )
-            pivot_pixel = img.getpixel((abs_coords[0], abs_coords[1]))
-            difficulty = self.is_pivot_pixel(pivot_pixel)
-            if difficulty:
-                pivot_found = True
-                level_start_x = pivot_x
-                if difficulty == "UNKNOWN":
-                    difficulty = "PLUS"
-                level_start_x = pivot_x - 105
-                level_start_y = pivot_y + 29
-                level_end_x = pivot_x
-                level_end_y = pivot_y + 95
-                level_abs_coords = self._get_abs_coords(
-                    (level_start_x, level_start_y, level_end_x, level_end_y), img.size
+            if level and abs(patch - expected_patch) <= PATCH_TOLERANCE:
+                confirmed.update(
+                    ("major_patch", "minor_patch", "major_judge", "minor_judge")
                 )
-                level_crop = img.crop(level_abs_coords)
-                level_crop = self.ocr_preprocess(level_crop, do_invert=True)
-                # level_crop.show()
-                level = self.get_ocr_integer(level_crop)
-                print(f"OCRed Level: {level}")
-                available_levels = matched_song.get_available_levels(line, difficulty)
-                if len(available_levels) == 1:
-                    level = available_levels[0]
-                if not level in available_levels:
-                    level = self.read_selected_level_by_phash(level_crop)
-                break
-            pivot_y += 1
+        self._confirm_fields(img, screen_type, readings, specs, confirmed)
+        score = readings["score"].value
+        patch = self.compose_select_patch(
+            readings["major_patch"].value, readings["minor_patch"].value
+        )
+        judge = self.compose_select_judge(
+            readings["major_judge"].value, readings["minor_judge"].value
+        )
 
-        if not pivot_found:
-            print("Pivot not found")
+        rank = self.calculate_rank(judge)
+        if is_f_rank:
+            rank = "F"
 
-        full_combo_crop = self._crop_and_ocr(
-            img, screen_type, "full_combo", lambda x: x, no_preprocess=True
-        )
-        hashed_full_combo = imagehash.hex_to_hash("8a82953d9d376b1a")
-        # full_combo_crop.show()
-        full_combo_hash = imagehash.phash(full_combo_crop)
-        if full_combo_hash - hashed_full_combo < 5:
+        if _match_table("SELECT", "full_combo", "select_full_combo", full_combo_hash):
             is_full_combo = True
 
         if judge == 100:
             is_full_combo = True
             is_perfect_decode = True
 
-        max_patch_pixel = img.getpixel(ROI_CONFIG[screen_type]["max_patch"])
+        max_patch_pixel = img.getpixel(
+            layout.point(*ROI_CONFIG[screen_type]["max_patch"])
+        )
         if (
             abs(max_patch_pixel[0] - 200) < 5
             and abs(max_patch_pixel[1] - 111) < 5
@@ -262,16 +472,6 @@ class ScreenshotAnalyzer:
         ):
             is_max_patch = True
 
-        rank_crop = self._crop_and_ocr(
-            img, screen_type, "rank", lambda x: x, no_preprocess=True
-        )
-        # rank_crop.show()
-        rank_hash = imagehash.phash(rank_crop)
-        hashed_f_rank = imagehash.hex_to_hash("bb604083cfda63a7")
-
-        rank = self.calculate_rank(judge)
-        if rank_hash - hashed_f_rank < 5:
-            rank = "F"
         # 4. Return Report (Use N/A for missing result screen stats)
         return AnalysisReport(
             matched_song,
@@ -281,15 +481,33 @@ class ScreenshotAnalyzer:
             line,
             difficulty,
             level,
-            jacket_crop,
+            # Reports keep the shared thumbnail, not the full-resolution crop
+            JACKET_THUMBNAILS.thumbnail(
+                matched_song.id, jacket_variant(difficulty), jacket_crop
+            ),
             jacket_hash,
             match_distance,
             rank,
             is_full_combo,
             is_perfect_decode,
             is_max_patch,
+            screen_type=screen_type,
+            confidence={key: r.confidence for key, r in readings.items()},
+            match_margin=match_margin,
+            crop_hashes=_table_hashes(),
         )
 
+    @staticmethod
+    def compose_select_patch(major_patch: int, minor_patch: int) -> float:
+        if minor_patch < 10:
+            minor_patch = f"0{minor_patch}"
+        return float(f"{major_patch}.{minor_patch}")
+
+    @staticmethod
+    def compose_select_judge(major_judge: int, minor_judge: int) -> float:
+        minor_judge = "0" * (4 - len(str(minor_judge))) + str(minor_judge)
+        return float(f"{major_judge}.{minor_judge}")
+
     def _crop_and_ocr(
         self,
         img: Image.Image,
@@ -301,11 +519,31 @@ class ScreenshotAnalyzer:
         **kwargs,
     ):
         """Helper to handle scaling, cropping, and running OCR."""
-        size = img.size
+        with METRICS.span(f"field.{config_key}"):
+            return self._crop_and_ocr_impl(
+                img,
+                screen_type,
+                config_key,
+                ocr_func,
+                is_point,
+                no_preprocess,
+                **kwargs,
+            )
+
+    def _crop_and_ocr_impl(
+        self,
+        img: Image.Image,
+        screen_type: Literal["SELECT", "RESULT"],
+        config_key: str,
+        ocr_func,
+        is_point=False,
+        no_preprocess=False,
+        **kwargs,
+    ):
+        layout = get_layout(img, self.capture_source)
         ref_coords = ROI_CONFIG[screen_type][config_key]
         if is_point:
-            rx, ry = self._ratio(ref_coords[0], ref_coords[1])
-            abs_x, abs_y = self._scale_coordinate(rx, ry, size)
+            abs_x, abs_y = layout.point(ref_coords[0], ref_coords[1])
             return ocr_func(img, abs_x, abs_y, **kwargs)  # Call color/point function
 
         # Handle notes area with common X but separate Y
@@ -318,168 +556,373 @@ class ScreenshotAnalyzer:
             "total_notes",
         ]:
             notes_x = ROI_CONFIG[screen_type]["notes_area"]
-            rx0, rxf = self._ratio(notes_x[0], 0)[0], self._ratio(notes_x[2], 0)[0]
-            ry0, ryf = (
-                self._ratio(0, ref_coords[0])[1],
-                self._ratio(0, ref_coords[1])[1],
-            )
-        else:
-            # Bounding box logic
-            rx0, ry0 = self._ratio(ref_coords[0], ref_coords[1])
-            rxf, ryf = self._ratio(ref_coords[2], ref_coords[3])
+            ref_coords = (notes_x[0], ref_coords[0], notes_x[2], ref_coords[1])
 
-        abs_x0, abs_y0 = self._scale_coordinate(rx0, ry0, size)
-        abs_xf, abs_yf = self._scale_coordinate(rxf, ryf, size)
-
-        crop = img.crop((abs_x0, abs_y0, abs_xf, abs_yf))
+        crop = img.crop(layout.box(ref_coords))
         if no_preprocess:
+            if _dump.current is not None:
+                _dump.current.add(screen_type, config_key, crop)
             return ocr_func(crop, **kwargs)
-        # do preprocess for better OCR result
-        crop = self.ocr_preprocess(crop, **kwargs)
-        return ocr_func(crop, **kwargs)
+        raw_crop = crop
+        # do preprocess for better OCR result; table-backed fields keep the
+        # scale their hashes were recorded at
+        if (screen_type, config_key) in TABLE_SOURCES.values():
+            kwargs.setdefault("scale", TABLE_SCALE)
+        with METRICS.span("preprocess"):
+            crop = self.ocr_preprocess(crop, **kwargs)
+        _keep_crop(screen_type, config_key, crop)
+        value = ocr_func(crop, **kwargs)
+        if _dump.current is not None:
+            _dump.current.add(
+                screen_type,
+                config_key,
+                raw_crop,
+                crop,
+                ocr_func.__name__,
+                kwargs,
+                value,
+                last_confidence(),
+            )
+        return value
+
+    def _crop(
+        self,
+        img: Image.Image,
+        screen_type: Literal["SELECT", "RESULT"],
+        config_key: str,
+    ) -> Image.Image:
+        """Returns the raw (not preprocessed) crop of an ROI."""
+        return self._crop_and_ocr(
+            img, screen_type, config_key, lambda x: x, no_preprocess=True
+        )
+
+    def _read_field(
+        self,
+        img: Image.Image,
+        screen_type: Literal["SELECT", "RESULT"],
+        config_key: str,
+        ocr_func,
+        **kwargs,
+    ) -> FieldReading:
+        """``_crop_and_ocr`` plus the confidence of whatever produced the value."""
+        record_confidence(0.0)
+        value = self._crop_and_ocr(img, screen_type, config_key, ocr_func, **kwargs)
+        return FieldReading(value, _confidence.last)
+
+    def _confirm_fields(
+        self,
+        img: Image.Image,
+        screen_type: Literal["SELECT", "RESULT"],
+        readings: dict[str, FieldReading],
+        specs: dict[str, tuple],
+        confirmed: set[str],
+    ):
+        """Re-reads low-confidence fields that no cross-check vouches for.
+
+        Each suspect gets the ``reocr_variants`` preprocessing in turn until
+        one reads confidently; the most confident reading is kept. Variants
+        the regular pass already used are skipped.
+        """
+        for config_key, reading in readings.items():
+            if reading.confidence >= LOW_CONFIDENCE or config_key in confirmed:
+                continue
+            METRICS.count("reocr.fields")
+            ocr_func, kwargs = specs[config_key]
+            # Corrections are learned from the crop of the regular pass
+            crop = (_crops.current or {}).get((screen_type, config_key))
+            best = reading
+            # What the regular pass used; table-backed fields default to TABLE_SCALE
+            regular = dict(kwargs)
+            if (screen_type, config_key) in TABLE_SOURCES.values():
+                regular.setdefault("scale", TABLE_SCALE)
+            for variant in self.reocr_variants:
+                if all(regular.get(key) == value for key, value in variant.items()):
+                    continue  # would repeat the regular read
+                candidate = self._read_field(
+                    img, screen_type, config_key, ocr_func, **{**kwargs, **variant}
+                )
+                if candidate.confidence > best.confidence:
+                    best = candidate
+                if best.confidence >= LOW_CONFIDENCE:
+                    break
+            if crop is not None:
+                _keep_crop(screen_type, config_key, crop)
+            if best is not reading:
+                METRICS.count("reocr.improved")
+                METRICS.event(
+                    f"Re-read {config_key}: {reading.value} ({reading.confidence:.0f})"
+                    f" -> {best.value} ({best.confidence:.0f})"
+                )
+            readings[config_key] = best
+
+    def _cross_check_result(
+        self,
+        readings: dict[str, FieldReading],
+        song: Song,
+        difficulty: str,
+        rank_hash: int,
+    ) -> set[str]:
+        """Result fields whose values agree with each other.
+
+        A field that takes part in a consistent relation (counts summing to
+        the total, score and judge recomputed from the counts, P.A.T.C.H.
+        recomputed from level and judge) is trusted however unsure the
+        recognizer was about it.
+        """
+        value = {key: reading.value for key, reading in readings.items()}
+        counts = [value[key] for key in COUNT_FIELDS]
+        confirmed = set()
+        if value["total_notes"] and sum(counts) == value["total_notes"]:
+            confirmed.update(("total_notes", *COUNT_FIELDS))
+        if value["score"] and value["score"] == self.calculate_score(*counts[:3]):
+            confirmed.update(("score", *COUNT_FIELDS[:3]))
+        levels = song.get_available_levels(value["line"], difficulty) if song else []
+        if levels:
+            confirmed.add("line")
+            if value["level"] in levels:
+                confirmed.add("level")
+        if not sum(counts):
+            return confirmed
+        judge = self.calculate_judge_rate(*counts)
+        if abs(value["judge"] - judge) < 1e-4:
+            confirmed.update(("judge", *COUNT_FIELDS))
+            rank = self.calculate_rank(judge)
+            if _match_table("RESULT", "rank", "result_f_rank", rank_hash) == "F":
+                rank = "F"
+            patch = self.calculate_patch(
+                value["level"], rank, difficulty == "PLUS", judge
+            )
+            if abs(value["patch"] - patch) <= PATCH_TOLERANCE:
+                confirmed.update(("patch", "level"))
+        return confirmed
+
+    @staticmethod
+    def _reconcile(readings: dict[str, FieldReading]) -> bool:
+        """Replaces misread counts, score or judge with the consistent solution."""
+        with METRICS.span("stage.reconcile"):
+            solution = reconcile_result(
+                {key: readings[key].value for key in OBSERVED_FIELDS},
+                {key: readings[key].confidence for key in OBSERVED_FIELDS},
+            )
+        if solution is None:
+            METRICS.count("reconcile.unsolved")
+            return False
+        for key, value in solution.items():
+            if value != readings[key].value:
+                METRICS.count("reconcile.corrected")
+                METRICS.event(f"Reconciled {key}: {readings[key].value} -> {value}")
+                readings[key] = FieldReading(value, readings[key].confidence)
+        return True
+
+    @staticmethod
+    def confirm_correction(report: AnalysisReport, field: str, value) -> bool:
+        """Teaches a lookup table the right value for the report's crop of that field.
+
+        Returns False if the analysis behind the report did not read that field.
+        """
+        crop_hash = report.crop_hashes.get(field)
+        if crop_hash is None:
+            return False
+        get_table(field).add(value, crop_hash)
+        return True
 
     # --- OCR / Matching Functions (Moved from global scope) ---
 
+    def match_songs(
+        self, target_hash: int, k: int = MATCH_TOP_K
+    ) -> list[SongCandidate]:
+        """The ``k`` songs closest to the pHash, nearest first, in one pass.
+
+        Each song appears once, by its closer jacket variant; equal distances
+        are ordered by song id so ties do not depend on the song list order.
+        """
+        index = self.song_index
+        if not len(index.jacket_hashes):
+            return []
+        distances = hamming_distances(index.jacket_hashes, target_hash)
+        # Songs have at most two jackets, so 2k rows hold at least k songs
+        rows = min(2 * k, len(distances))
+        top = np.argpartition(distances, rows - 1)[:rows]
+        song_rows = index.jacket_rows[top]
+        # Song rows are in song id order
+        order = np.lexsort((song_rows, distances[top]))
+        candidates = {}
+        for i, song_row in zip(top[order].tolist(), song_rows[order].tolist()):
+            if song_row not in candidates:
+                song = index.song(song_row)
+                variant = VARIANTS[index.jacket_variants[i]]
+                candidates[song_row] = SongCandidate(
+                    song, int(distances[i]), (song.id, variant)
+                )
+        return list(candidates.values())[:k]
+
+    def resolve_song(
+        self,
+        candidates: list[SongCandidate],
+        jacket: Image.Image | None = None,
+        line: int | None = None,
+        difficulty: str | None = None,
+        level: int | None = None,
+    ) -> tuple[SongCandidate, int | None]:
+        """Picks the song among ``match_songs`` candidates.
+
+        Returns it with its pHash margin over the closest other candidate
+        that fits the chart read from the screen (None if no other does).
+        Candidates without a chart for the OCR'd line, difficulty and level
+        are dropped first; only if songs within RERANK_MARGIN remain are the
+        learned descriptors consulted. A match that is clear by pHash, or
+        clear among the songs that have the chart, teaches them instead, so
+        songs whose art always collides with another still get a descriptor.
+        """
+        best = candidates[0]
+        plausible = candidates
+        chart_confirmed = False
+        if line is not None and difficulty is not None:
+            fitting = [
+                c
+                for c in candidates
+                if self._fits_chart(c.song, line, difficulty, level)
+            ]
+            # Nothing fits when the OCR is off; the jacket alone decides then
+            if fitting:
+                plausible = fitting
+                chart_confirmed = bool(level)
+        choice = plausible[0]
+        if choice is not best:
+            METRICS.count("jacket_match.chart")
+        close = [c for c in plausible if c.distance - choice.distance <= RERANK_MARGIN]
+        if len(close) >= 2:
+            METRICS.count("jacket_match.ambiguous")
+            if jacket is not None and self.jacket_index is not None:
+                choice = self._rerank_jacket(close, jacket)
+        elif (
+            jacket is not None
+            and self.jacket_index is not None
+            and choice.distance <= LEARN_DISTANCE
+            and choice.key not in self.jacket_index
+            and (
+                chart_confirmed
+                or all(
+                    c.distance - choice.distance > RERANK_MARGIN
+                    for c in candidates
+                    if c is not choice
+                )
+            )
+        ):
+            self.jacket_index.add(choice.key, describe(jacket))
+        others = [c.distance for c in plausible if c is not choice]
+        margin = min(others) - choice.distance if others else None
+        return choice, margin
+
+    @staticmethod
+    def _fits_chart(song: Song, line: int, difficulty: str, level: int | None) -> bool:
+        levels = song.get_available_levels(line, difficulty)
+        return level in levels if level else bool(levels)
+
+    def _rerank_jacket(
+        self, close: list[SongCandidate], jacket: Image.Image
+    ) -> SongCandidate:
+        similarities = self.jacket_index.similarities(
+            describe(jacket), [c.key for c in close]
+        )
+        # A song without a descriptor cannot be outscored, so ranking only the
+        # others could drop the right one; keep the pHash order then
+        if len(similarities) < len(close):
+            METRICS.count("jacket_rerank.incomplete")
+            return close[0]
+        METRICS.count("jacket_rerank")
+        choice = max(close, key=lambda c: similarities[c.key])
+        if choice is not close[0]:
+            METRICS.count("jacket_rerank.changed")
+        return choice
+
     def get_best_match_song(
-        self, target_hash: imagehash.ImageHash
+        self, target_hash: int, jacket: Image.Image | None = None
     ) -> tuple[Optional[Song], int]:
         """Finds the Song object corresponding to the target pHash."""
-        min_distance = float("inf")
-        best_match_song = None
-
-        for phash_str, song_obj in self.jacket_hash_map.items():
-            # Tesseract 5 hash format is used for consistency
-            ref_hash = imagehash.hex_to_hash(phash_str)
-            distance = target_hash - ref_hash
-
-            if distance < min_distance:
-                min_distance = distance
-                best_match_song = song_obj
-        return best_match_song, min_distance
+        candidates = self.match_songs(target_hash)
+        if not candidates:
+            return None, float("inf")
+        choice, _ = self.resolve_song(candidates, jacket)
+        return choice.song, choice.distance
 
     @staticmethod
-    def get_ocr_judge(img_crop: Image.Image) -> float:
+    def get_ocr_judge(img_crop: Image.Image, **kwargs) -> float:
         """OCR for judge percentage (e.g., 99.0000%)."""
         # Fix: Char whitelist spelling
         ocr_config = r"--psm 7 -c tessedit_char_whitelist=0123456789.%"
-        text = pytesseract.image_to_string(img_crop, config=ocr_config).strip()
+        text = run_tesseract(img_crop, ocr_config)
 
         # Cleanup and convert to float
         text = text.replace("%", "")
         try:
             return float(text)
         except ValueError:
+            record_confidence(0.0)
             return 0.0
 
     @staticmethod
-    def get_ocr_line(img_crop: Image.Image) -> int:
+    def get_ocr_line(img_crop: Image.Image, **kwargs) -> int:
         """OCR for line count (4, 6). If no text, assume 6."""
         # Whitelist 4, 6, and 8
         ocr_config = r"--psm 7 -c tessedit_char_whitelist=46"
-        text = pytesseract.image_to_string(img_crop, config=ocr_config).strip()
+        text = run_tesseract(img_crop, ocr_config)
 
         # Fallback logic: if OCR is empty, assume 6 (a common game logic)
         try:
             return int(text)
         except ValueError:
+            record_confidence(0.0)
             return 6
 
     @staticmethod
     def get_ocr_integer(img_crop: Image.Image, **kwargs) -> int:
         """OCR for pure integer values (Level, Score, Notes)."""
         config = "--psm 7 --oem 1 -c tessedit_char_whitelist=0123456789"
-        text = pytesseract.image_to_string(img_crop, config=config).strip()
+        text = run_tesseract(img_crop, config)
         try:
             return int(text)
         except ValueError:
-            level_img_phash = imagehash.phash(img_crop)
-            print(f"Error when converting the text to str: '{text}'")
-            print(f"Read pHash: {level_img_phash}")
-            print(f"Trying to read it by pHash...")
+            METRICS.event(f"Could not convert OCR text '{text}', trying pHash")
+            record_confidence(0.0)
             return ScreenshotAnalyzer.find_level_phash(img_crop)
 
     @staticmethod
     def get_ocr_select_major_patch(img_crop: Image.Image, **kwargs) -> int:
-        config = "--psm 7 --oem 1 -c tessedit_char_whitelist=0123456789"
-        text = pytesseract.image_to_string(img_crop, config=config).strip()
-        phash = imagehash.phash(img_crop)
-        print(f"Major Patch PHash: {phash}")
-        phash_map = {
-            609: "f3738c6596f2218c",
-            610: "f3738e6696a3218c",
-            627: "e151ca6616e93b9c",
-            637: "e1518e6216e52f9e",
-            641: "f3f19a622c93698c",
-            642: "f371966a2ad2658c",
-            661: "e3619a63af61619c",
-            670: "f3698c662cb3338c",
-            671: "f3698c662cf3138c",
-            676: "f36b8c6405f2738c",
-        }
-        lowest_distance = 50
-        possible_patch = ""
-        for patch, known_phash in phash_map.items():
-            known_phash = imagehash.hex_to_hash(known_phash)
-            distance = phash - known_phash
-            if distance < lowest_distance:
-                lowest_distance = distance
-                possible_patch = patch
-        if lowest_distance < 3:
-            return possible_patch
-        try:
-            return int(text)
-        except ValueError:
-            return 0
+        return ScreenshotAnalyzer._read_by_table_or_ocr(img_crop, "select_major_patch")
 
     @staticmethod
     def get_ocr_select_minor_patch(img_crop: Image.Image, **kwargs) -> int:
-        config = "--psm 7 --oem 1 -c tessedit_char_whitelist=0123456789"
-        text = pytesseract.image_to_string(img_crop, config=config).strip()
-        phash = imagehash.phash(img_crop)
-        print(f"Minor Patch PHash: {phash}")
-        phash_map = {22: "ae78d02f0dac78d2", 88: "aa2ad5ad52cc2cd3"}
-        lowest_distance = 50
-        possible_patch = ""
-        for patch, known_phash in phash_map.items():
-            known_phash = imagehash.hex_to_hash(known_phash)
-            distance = phash - known_phash
-            if distance < lowest_distance:
-                lowest_distance = distance
-                possible_patch = patch
-        if lowest_distance < 3:
-            return possible_patch
-        try:
-            return int(text)
-        except ValueError:
-            return 0
+        return ScreenshotAnalyzer._read_by_table_or_ocr(img_crop, "select_minor_patch")
 
     @staticmethod
     def get_ocr_select_minor_judge(img_crop: Image.Image, **kwargs) -> int:
+        return ScreenshotAnalyzer._read_by_table_or_ocr(img_crop, "select_minor_judge")
+
+    @staticmethod
+    def _read_by_table_or_ocr(img_crop: Image.Image, field: str) -> int:
+        """Looks the crop up in the field's pHash table, falling back to Tesseract."""
+        read_hash = phash(img_crop)
+        METRICS.event(f"{field} pHash: {read_hash:016x}")
+        value, confidence = get_table(field).match_confidence(read_hash)
+        if value is not None:
+            # A known glyph: no need to spawn Tesseract at all
+            METRICS.count("phash_hit.select_table")
+            record_confidence(confidence)
+            return value
         config = "--psm 7 --oem 1 -c tessedit_char_whitelist=0123456789"
-        text = pytesseract.image_to_string(img_crop, config=config).strip()
-        phash = imagehash.phash(img_crop)
-        print(f"Minor Judge PHash: {phash}")
-        phash_map = {5277: "9dc1aabc8183ec3b", 5572: "9be4e6ea9110ee13"}
-        lowest_distance = 50
-        possible_patch = ""
-        for patch, known_phash in phash_map.items():
-            known_phash = imagehash.hex_to_hash(known_phash)
-            distance = phash - known_phash
-            if distance < lowest_distance:
-                lowest_distance = distance
-                possible_patch = patch
-        if lowest_distance < 3:
-            return possible_patch
+        text = run_tesseract(img_crop, config)
         try:
             return int(text)
         except ValueError:
+            record_confidence(0.0)
             return 0
 
     @staticmethod
     def get_ocr_patch(img_crop: Image.Image, **kwargs) -> float:
         """OCR for patch value (e.g., 2.79)."""
         config = "--psm 7 -c tessedit_char_whitelist=0123456789."
-        text = pytesseract.image_to_string(img_crop, config=config).strip()
+        text = run_tesseract(img_crop, config)
 
         # Post-processing fix for patch if the decimal is missed
         if not "." in text and len(text) >= 3:
@@ -489,21 +932,15 @@ class ScreenshotAnalyzer:
         try:
             return float(text)
         except ValueError:
+            record_confidence(0.0)
             return 0.0
 
-    def _get_abs_coords(self, coords: tuple[int, int, int, int], size: tuple[int, int]):
-        rx1, ry1 = self._ratio(coords[0], coords[1])
-        rx2, ry2 = self._ratio(coords[2], coords[3])
-        abs_x1, abs_y1 = self._scale_coordinate(rx1, ry1, size)
-        abs_x2, abs_y2 = self._scale_coordinate(rx2, ry2, size)
-        return abs_x1, abs_y1, abs_x2, abs_y2
-
     @staticmethod
     def get_ocr_difficulty_text(
         img_crop: Image.Image,
     ) -> Literal["EASY", "HARD", "OVER", "PLUS"]:
         config = "--psm 8 -c tessedit_char_whitelist=EASYHRDOVPLUS"
-        return pytesseract.image_to_string(img_crop, config=config)
+        return run_tesseract(img_crop, config)
 
     @staticmethod
     def get_difficulty(r: int, g: int, b: int) -> str:
@@ -561,25 +998,12 @@ class ScreenshotAnalyzer:
         judge: float,
     ) -> float:
         """Calculates the P.A.T.C.H. value."""
-        rank_ratio = {
-            "C": 0.2,
-            "B": 0.3,
-            "A": 0.4,
-            "A+": 0.5,
-            "AA": 0.6,
-            "AA+": 0.7,
-            "S": 0.8,
-            "S+": 0.9,
-            "SS": 0.95,
-            "SS+": 1,
-        }
-
         if rank == "F":
-            return 0.0  # Handle case not in rank_ratio
+            return 0.0
 
-        patch_base = level * 42 * (judge / 100) * rank_ratio[rank]
+        patch_base = level * 42 * (judge / 100) * RANK_RATIO[rank]
         if is_plus:
-            patch_base *= 1.02
+            patch_base *= PLUS_BONUS
 
         # The game often rounds this value to two decimal places
         return round(patch_base, 2)
@@ -603,13 +1027,67 @@ class ScreenshotAnalyzer:
         return perfect_high, perfect, great, good, miss
 
     @staticmethod
-    def ocr_preprocess(img: Image.Image, do_invert: bool = False):
-        """Do some preprocess (upscaling, binarization) for the best OCR result"""
-        resized_img = img.resize(
-            (img.width * 4, img.height * 4), Image.Resampling.LANCZOS
+    def estimate_glyph_height(
+        grayscale_img: Image.Image,
+        dark_text: bool = False,
+        threshold: int = BINARIZE_THRESHOLD,
+    ) -> int:
+        """Height of the band of rows holding text pixels.
+
+        Text is bright, or with ``dark_text`` dark on a light box, i.e. the
+        pixels that end up white after binarizing (and inverting).
+        """
+        pixels = np.asarray(grayscale_img)
+        text = pixels <= threshold if dark_text else pixels > threshold
+        rows = np.flatnonzero(text.any(axis=1))
+        if len(rows) == 0:
+            return grayscale_img.height
+        return int(rows[-1] - rows[0] + 1)
+
+    @staticmethod
+    def choose_scale(
+        grayscale_img: Image.Image,
+        dark_text: bool = False,
+        threshold: int = BINARIZE_THRESHOLD,
+    ) -> float:
+        """Upscale factor that brings the glyphs to TARGET_GLYPH_HEIGHT."""
+        glyph_height = ScreenshotAnalyzer.estimate_glyph_height(
+            grayscale_img, dark_text, threshold
         )
-        grayscale_img = resized_img.convert("L")
-        bw_img = grayscale_img.point(lambda x: 255 if x > 200 else 0, "1")
+        return min(MAX_UPSCALE, max(1.0, TARGET_GLYPH_HEIGHT / glyph_height))
+
+    @staticmethod
+    def ocr_preprocess(
+        img: Image.Image,
+        do_invert: bool = False,
+        scale: float | None = None,
+        threshold: int = BINARIZE_THRESHOLD,
+    ):
+        """Do some preprocess (upscaling, binarization) for the best OCR result
+
+        ``scale`` defaults to one chosen from the glyph height, so 1440p and 4K
+        crops aren't blown up 16x in area. A fixed ``scale`` reproduces the
+        original LANCZOS pipeline exactly.
+        """
+        if scale is not None:
+            resized_img = img.resize(
+                (round(img.width * scale), round(img.height * scale)),
+                Image.Resampling.LANCZOS,
+            )
+            grayscale_img = resized_img.convert("L")
+        else:
+            grayscale_img = img.convert("L")
+            scale = ScreenshotAnalyzer.choose_scale(grayscale_img, do_invert, threshold)
+            METRICS.count(
+                "preprocess.pixels_saved",
+                int(img.width * img.height * (MAX_UPSCALE**2 - scale**2)),
+            )
+            if scale > 1:
+                grayscale_img = grayscale_img.resize(
+                    (round(img.width * scale), round(img.height * scale)),
+                    Image.Resampling.LANCZOS,
+                )
+        bw_img = grayscale_img.point(lambda x: 255 if x > threshold else 0, "1")
 
         if do_invert:
             bw_img = ImageOps.invert(bw_img)
@@ -618,114 +1096,169 @@ class ScreenshotAnalyzer:
 
     @staticmethod
     def find_level_phash(img: Image.Image):
-        given_hash = imagehash.phash(img)
-        level_hash_map = {
-            5: "ec6495db9b249293",
-            6: "eea5995a92ad9292",
-            8: "eead9552916d9292",
-            9: "ec32954d93b2926d",
-        }
-        closest_level = 0
-        closest_distance = float("inf")
-        for level, compare_hash in level_hash_map.items():
-            compare_hash = imagehash.hex_to_hash(compare_hash)
-            distance = compare_hash - given_hash
-            if distance < closest_distance:
-                closest_distance = distance
-                closest_level = level
-
-        return closest_level if closest_distance < 5 else 0
+        METRICS.count("phash_fallback.level")
+        level, confidence = get_table("result_level").match_confidence(phash(img))
+        record_confidence(confidence)
+        if level is None:
+            return 0
+        METRICS.count("phash_hit.level")
+        return level
 
     # --- Main Execution Method ---
-    def extract_info(self, image_path: str | None = None) -> AnalysisReport:
-        """Main method to analyze a screenshot and return a structured report."""
+    @staticmethod
+    def load_image(image_path: str | None = None) -> Optional[Image.Image]:
+        """Opens a screenshot file, or reads the clipboard when no path is given."""
         try:
             if image_path:
-                img = Image.open(image_path)
-            else:
-                # Try to read image from clipboard
-                img = ImageGrab.grabclipboard()
+                return open_image(image_path)
+            # Try to read image from clipboard
+            img = grab_clipboard()
         except FileNotFoundError:
             print(f"Error: File not found at {image_path}")
-            return AnalysisReport(song_name="FILE NOT FOUND")
+            return None
         if img is None:
             print("Error: Clipboard is empty or does not contain an image.")
+            return None
+        return img
+
+    def extract_info(self, image_path: str | None = None) -> AnalysisReport:
+        """Main method to analyze a screenshot and return a structured report."""
+        img = self.load_image(image_path)
+        if img is None:
             # Return an empty report to prevent the crash
             return AnalysisReport(song_name="NO IMAGE")
 
-        screen_type = self.determine_screen_type(img)
+        with METRICS.span("extract_info"):
+            return self.analyze_image(img)
+
+    def analyze_image(
+        self, img: Image.Image, dump_name: str | None = None
+    ) -> AnalysisReport:
+        """Analyzes an already loaded screenshot in any PIL mode.
+
+        With ``dump_dir`` set, the crops are also saved as ``<dump_name>.npz``.
+        """
+        img = to_rgb(img)
+        _crops.current = {}
+        try:
+            if self.dump_dir is None:
+                return self._analyze_image(img)
+            return self._analyze_and_dump(img, dump_name)
+        finally:
+            _crops.current = None
+
+    def _analyze_and_dump(self, img: Image.Image, dump_name: str | None):
+        dump = _dump.current = CropDump()
+        report = error = None
+        try:
+            report = self._analyze_image(img)
+            return report
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _dump.current = None
+            if dump_name is None:
+                dump_name = f"{datetime.now():%Y%m%d-%H%M%S}-{next(self._dump_counter)}"
+            os.makedirs(self.dump_dir, exist_ok=True)
+            dump.save(
+                os.path.join(self.dump_dir, f"{dump_name}.npz"),
+                size=img.size,
+                screen_type=report.screen_type if report else None,
+                song_id=report.song.id if report else None,
+                error=error,
+            )
+
+    def _analyze_image(self, img: Image.Image) -> AnalysisReport:
+        with METRICS.span("stage.classify"):
+            screen_type = self.determine_screen_type(
+                img, get_layout(img, self.capture_source)
+            )
 
         if screen_type == "SELECT":
+            METRICS.count("screen.select")
             return self._analyze_select_screen(img)
+        METRICS.count("screen.result")
 
         # --- 1. jacket and Song Match ---
-        jacket_crop = self._crop_and_ocr(
-            img, screen_type, "jacket", lambda x: x, no_preprocess=True
-        )  # Pass crop back as PIL Image
-        jacket_hash = imagehash.phash(jacket_crop)
-        matched_song, match_distance = self.get_best_match_song(jacket_hash)
-
-        # --- 2. OCR Extraction ---
-        # Note: 'good' corresponds to the 'good' count in the stats.
-
-        judge_rate_ocr = self._crop_and_ocr(
-            img, screen_type, "judge", self.get_ocr_judge
-        )
-        lines = self._crop_and_ocr(img, screen_type, "line", self.get_ocr_line)
-        level_ocr = self._crop_and_ocr(
-            img, screen_type, "level", self.get_ocr_integer, do_invert=True
-        )
-        patch_ocr = self._crop_and_ocr(
-            img, screen_type, "patch", self.get_ocr_patch, do_invert=True
-        )
-        score_ocr = self._crop_and_ocr(img, screen_type, "score", self.get_ocr_integer)
-        total_notes = self._crop_and_ocr(
-            img, screen_type, "total_notes", self.get_ocr_integer
-        )
-        perfect_high = self._crop_and_ocr(
-            img, screen_type, "perfect_high_y", self.get_ocr_integer
-        )
-        perfect = self._crop_and_ocr(
-            img, screen_type, "perfect_y", self.get_ocr_integer
-        )
-        great = self._crop_and_ocr(img, screen_type, "great_y", self.get_ocr_integer)
-        good = self._crop_and_ocr(img, screen_type, "good_y", self.get_ocr_integer)
-        miss = self._crop_and_ocr(img, screen_type, "miss_y", self.get_ocr_integer)
-        rank_crop = self._crop_and_ocr(
-            img, screen_type, "rank", lambda x: x, no_preprocess=True
-        )
-        rank_hash = imagehash.phash(rank_crop)
-        perfect_high, perfect, great, good, miss = self.verify_notes_count(
-            total_notes, perfect_high, perfect, great, good, miss
-        )
+        with METRICS.span("stage.jacket_match"):
+            jacket_crop = self._crop(img, screen_type, "jacket")
+            rank_crop = self._crop(img, screen_type, "rank")
+            jacket_hash, rank_hash = (
+                int(h) for h in phash_many([jacket_crop, rank_crop])
+            )
+            candidates = self.match_songs(jacket_hash)
 
-        # --- 3. Difficulty Color Check ---
+        # --- 2. Difficulty Color Check ---
+        layout = get_layout(img, self.capture_source)
         r, g, b = img.getpixel(
-            self._scale_coordinate(
-                *self._ratio(*ROI_CONFIG[screen_type]["difficulty_color"]), img.size
-            )
+            layout.point(*ROI_CONFIG[screen_type]["difficulty_color"])
         )
         difficulty_str = self.get_difficulty(r, g, b)
         is_plus_difficulty = difficulty_str == "PLUS"
 
-        # --- 4. Calculation ---
-        calculated_judge_rate = self.calculate_judge_rate(
-            perfect_high, perfect, great, good, miss
+        # --- 3. OCR Extraction ---
+        # Note: 'good' corresponds to the 'good' count in the stats.
+        specs = {
+            "judge": (self.get_ocr_judge, {}),
+            "line": (self.get_ocr_line, {}),
+            "level": (self.get_ocr_integer, {"do_invert": True}),
+            "patch": (self.get_ocr_patch, {"do_invert": True}),
+            "score": (self.get_ocr_integer, {}),
+            "total_notes": (self.get_ocr_integer, {}),
+            **{key: (self.get_ocr_integer, {}) for key in COUNT_FIELDS},
+        }
+        readings = {
+            key: self._read_field(img, screen_type, key, ocr_func, **kwargs)
+            for key, (ocr_func, kwargs) in specs.items()
+        }
+        # The chart on screen settles jackets that match several songs
+        match, match_margin = self.resolve_song(
+            candidates,
+            jacket_crop,
+            readings["line"].value,
+            difficulty_str,
+            readings["level"].value,
         )
-        calculated_score = self.calculate_score(perfect_high, perfect, great)
-        calculated_rank = self.calculate_rank(calculated_judge_rate)
-        # Try to find out if rank is F (bc F cannot be calculated...)
-        F_RANK_HASH = imagehash.hex_to_hash("a3636e1f941a1736")
-        if F_RANK_HASH - rank_hash < 5:
-            calculated_rank = "F"
-
-        level_int = level_ocr
-        calculated_patch = self.calculate_patch(
-            level_int,
-            calculated_rank,
-            is_plus_difficulty,
-            calculated_judge_rate,
+        matched_song, match_distance = match.song, match.distance
+        confirmed = self._cross_check_result(
+            readings, matched_song, difficulty_str, rank_hash
         )
+        if not confirmed.issuperset(OBSERVED_FIELDS) and self._reconcile(readings):
+            confirmed = self._cross_check_result(
+                readings, matched_song, difficulty_str, rank_hash
+            )
+        self._confirm_fields(img, screen_type, readings, specs, confirmed)
+        if not confirmed.issuperset(OBSERVED_FIELDS):
+            # The re-read values may add up where the first reading did not
+            self._reconcile(readings)
+
+        lines = readings["line"].value
+        level_ocr = readings["level"].value
+        patch_ocr = readings["patch"].value
+        total_notes = readings["total_notes"].value
+        perfect_high, perfect, great, good, miss = self.verify_notes_count(
+            total_notes, *(readings[key].value for key in COUNT_FIELDS)
+        )
+
+        # --- 4. Calculation ---
+        with METRICS.span("stage.calculation"):
+            calculated_judge_rate = self.calculate_judge_rate(
+                perfect_high, perfect, great, good, miss
+            )
+            calculated_score = self.calculate_score(perfect_high, perfect, great)
+            calculated_rank = self.calculate_rank(calculated_judge_rate)
+            # Try to find out if rank is F (bc F cannot be calculated...)
+            if _match_table("RESULT", "rank", "result_f_rank", rank_hash) == "F":
+                calculated_rank = "F"
+
+            level_int = level_ocr
+            calculated_patch = self.calculate_patch(
+                level_int,
+                calculated_rank,
+                is_plus_difficulty,
+                calculated_judge_rate,
+            )
         available_levels = matched_song.get_available_levels(lines, difficulty_str)
         if len(available_levels) == 1:
             level_int = available_levels[0]
@@ -751,7 +1284,9 @@ class ScreenshotAnalyzer:
             lines,
             difficulty_str,
             level_int,
-            jacket_crop,
+            JACKET_THUMBNAILS.thumbnail(
+                matched_song.id, jacket_variant(difficulty_str), jacket_crop
+            ),
             jacket_hash,
             match_distance,
             calculated_rank,
@@ -760,21 +1295,25 @@ class ScreenshotAnalyzer:
             is_maximum_patch,
             total_notes,
             perfect_high,
+            screen_type=screen_type,
+            confidence={key: r.confidence for key, r in readings.items()},
+            match_margin=match_margin,
+            crop_hashes=_table_hashes(),
         )
 
 
 # --- INITIALIZATION AND EXECUTION ---
 
 
-def version_to_string(version: tuple[int, int, int]):
-    return f"v{version[0]}.{version[1]}.{version[2]}"
+def fetch_archive(api_key: str, http=requests) -> dict[str, DecodeResult]:
+    """``http`` is the requests module or a ``requests.Session`` (see net.py)."""
+    archive_endpoint = api_url("get_archive")
+    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+    res = http.post(archive_endpoint, headers=headers)
+    return parse_archive(res.json())
 
 
-def fetch_archive(api_key: str) -> dict[str, DecodeResult]:
-    archive_endpoint = "https://www.platina-archive.app/api/v1/get_archive"
-    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
-    res = requests.post(archive_endpoint, headers=headers)
-    archive_json = res.json()
+def parse_archive(archive_json: list[dict]) -> dict[str, DecodeResult]:
     archive = {}
     for arc in archive_json:
         song_id = arc.get("song_id")
@@ -800,29 +1339,35 @@ def fetch_archive(api_key: str) -> dict[str, DecodeResult]:
     return archive
 
 
-def fetch_latest_client_version() -> tuple[int, int, int]:
+def fetch_latest_client_version(http=requests) -> tuple[int, int, int]:
     """Fetch the latest client version"""
-    client_version_endpoint = "https://www.platina-archive.app/api/v1/client_version"
-    res = requests.get(client_version_endpoint)
+    client_version_endpoint = api_url("client_version")
+    res = http.get(client_version_endpoint)
     res.raise_for_status()
     data = res.json()
     return (data["major"], data["minor"], data["patch"])
 
 
-def fetch_songs():
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+CACHE_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "cache")
+CACHED_DB_PATH = os.path.join(CACHE_DIR, "db.json")
+
+
+def fetch_songs(http=requests):
     """Fetches song and pattern data from the API."""
-    songs_endpoint = "https://www.platina-archive.app/api/v1/platina_songs"
-    patterns_endpoint = "https://www.platina-archive.app/api/v1/platina_patterns"
+    cached_db, songs_headers, patterns_headers = songs_request_headers()
+    res_songs = http.get(api_url("platina_songs"), headers=songs_headers)
+    res_patterns = http.get(api_url("platina_patterns"), headers=patterns_headers)
+    return songs_from_responses(cached_db, res_songs, res_patterns)
+
 
+def songs_request_headers() -> tuple[dict, dict, dict]:
+    """The db.json cache and the conditional-GET headers for songs and patterns."""
     # check local storage
     DEFAULT_DATE = datetime(2025, 4, 10).isoformat()  # Date that needs update
-    APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
-    CACHE_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "cache")
-    CACHED_DB_PATH = os.path.join(CACHE_DIR, "db.json")
     songs_headers = {}
     patterns_headers = {}
     cached_db = {}
-    needs_update = False
 
     if os.path.isfile(CACHED_DB_PATH):
         with open(CACHED_DB_PATH, "r") as f:
@@ -831,10 +1376,14 @@ def fetch_songs():
         patterns_last_modified = cached_db.get("Patterns-Last-Modified", DEFAULT_DATE)
         songs_headers = {"If-Modified-Since": songs_last_modified}
         patterns_headers = {"If-Modified-Since": patterns_last_modified}
+    return cached_db, songs_headers, patterns_headers
+
 
-    # Use POST method and check status
-    res_songs = requests.get(songs_endpoint, headers=songs_headers)
-    res_patterns = requests.get(patterns_endpoint, headers=patterns_headers)
+def songs_from_responses(
+    cached_db: dict, res_songs: requests.Response, res_patterns: requests.Response
+) -> list[Song]:
+    """Songs from the two responses (or the cache on 304); updates db.json."""
+    needs_update = False
     res_songs.raise_for_status()
     res_patterns.raise_for_status()
 
@@ -861,6 +1410,18 @@ def fetch_songs():
         with open(CACHED_DB_PATH, "w") as f:
             json.dump(cached_db, f)
 
+    return build_songs(songs_json, patterns_json)
+
+
+def load_cached_songs(path: str = CACHED_DB_PATH) -> list[Song]:
+    """Loads songs from a db.json cache file without touching the network."""
+    with open(path, "r") as f:
+        cached_db = json.load(f)
+    return build_songs(cached_db["songs"], cached_db["patterns"])
+
+
+def build_songs(songs_json: list[dict], patterns_json: list[dict]) -> list[Song]:
+    """Builds Song objects (with their patterns) from the API payloads."""
     # Build the Song objects
     songs = {}
     for song_data in songs_json:
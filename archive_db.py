@@ -0,0 +1,230 @@
+"""Local SQLite copy of the user's archive, plus every analyzed play.
+
+``best`` mirrors the server's archive (one row per chart, keyed like
+``AnalysisReport.chart_key``) so comparisons are an indexed lookup and work
+before the server sync finishes. ``history`` keeps every play the client has
+shown, which the server does not store. The database runs in WAL mode so the
+Tk thread can read while a background sync writes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterable
+
+from models import AnalysisReport, DecodeResult
+
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+ARCHIVE_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "archive")
+
+_COLUMNS = (
+    "chart_key, song_id, line, difficulty, level, judge, score, patch,"
+    " decoded_at, is_full_combo, is_max_patch"
+)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS best (
+    chart_key TEXT PRIMARY KEY,
+    song_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    judge REAL NOT NULL,
+    score INTEGER NOT NULL,
+    patch REAL NOT NULL,
+    decoded_at TEXT NOT NULL,
+    is_full_combo INTEGER NOT NULL,
+    is_max_patch INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS best_decoded_at ON best (decoded_at);
+CREATE INDEX IF NOT EXISTS best_patch ON best (patch);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    chart_key TEXT NOT NULL,
+    song_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    judge REAL NOT NULL,
+    score INTEGER NOT NULL,
+    patch REAL NOT NULL,
+    decoded_at TEXT NOT NULL,
+    is_full_combo INTEGER NOT NULL,
+    is_max_patch INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_chart ON history (chart_key, decoded_at);
+CREATE INDEX IF NOT EXISTS history_decoded_at ON history (decoded_at);
+"""
+_PLACEHOLDERS = ", ".join("?" * len(_COLUMNS.split(",")))
+_UPSERT_SET = ", ".join(
+    f"{column} = excluded.{column}"
+    for column in (c.strip() for c in _COLUMNS.split(","))
+    if column != "chart_key"
+)
+
+
+def archive_path(api_key: str) -> str:
+    """One database per account; the key itself is not written to disk."""
+    digest = hashlib.blake2b(api_key.encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(ARCHIVE_DIR, f"{digest}.sqlite3")
+
+
+def record_from_report(
+    report: AnalysisReport, decoded_at: datetime | None = None
+) -> DecodeResult:
+    return DecodeResult(
+        report.song.id,
+        report.line,
+        report.difficulty,
+        report.level,
+        report.judge,
+        report.score,
+        report.patch,
+        decoded_at or datetime.now(timezone.utc),
+        report.is_full_combo,
+        report.is_maximum_patch,
+    )
+
+
+def _to_row(record: DecodeResult) -> tuple:
+    return (
+        f"{record.song_id}|{record.line}|{record.difficulty}|{record.level}",
+        record.song_id,
+        record.line,
+        record.difficulty,
+        record.level,
+        record.judge,
+        record.score,
+        record.patch,
+        record.decoded_at.astimezone(timezone.utc).isoformat(),
+        int(bool(record.is_full_combo)),
+        int(bool(record.is_max_patch)),
+    )
+
+
+def _from_row(row: tuple) -> DecodeResult:
+    return DecodeResult(
+        row[1],
+        row[2],
+        row[3],
+        row[4],
+        row[5],
+        row[6],
+        row[7],
+        datetime.fromisoformat(row[8]),
+        bool(row[9]),
+        bool(row[10]),
+    )
+
+
+class ArchiveStore:
+    """Best records and play history in one SQLite file, safe to share between threads."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the file consistent on power loss; NORMAL only risks the last commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM best").fetchone()[0]
+
+    def get(self, chart_key: str) -> DecodeResult | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM best WHERE chart_key = ?", (chart_key,)
+            ).fetchone()
+        return _from_row(row) if row else None
+
+    def put(self, record: DecodeResult):
+        """Stores ``record`` as the best of its chart."""
+        self.put_many([record])
+
+    def put_many(self, records: Iterable[DecodeResult]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO best ({_COLUMNS}) VALUES ({_PLACEHOLDERS})",
+                map(_to_row, records),
+            )
+
+    def merge_archive(self, archive: dict[str, DecodeResult]):
+        """Merges the server's archive into the best records in one transaction.
+
+        A server record replaces the local one only if it was decoded later or
+        has a higher judge, so plays stored while the sync was in flight (or
+        not yet uploaded) survive it; charts missing on the server are kept.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO best ({_COLUMNS}) VALUES ({_PLACEHOLDERS})"
+                f" ON CONFLICT (chart_key) DO UPDATE SET {_UPSERT_SET}"
+                " WHERE excluded.decoded_at > best.decoded_at"
+                " OR excluded.judge > best.judge",
+                map(_to_row, archive.values()),
+            )
+
+    def best_records(self) -> dict[str, DecodeResult]:
+        """Every best record, by chart key."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM best").fetchall()
+        return {row[0]: _from_row(row) for row in rows}
+
+    def update_patches(self, patches: dict[str, float]):
+        """Sets the P.A.T.C.H. of the given charts' best records in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE best SET patch = ? WHERE chart_key = ?",
+                [(patch, key) for key, patch in patches.items()],
+            )
+
+    def add_history(self, records: Iterable[DecodeResult]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO history ({_COLUMNS}) VALUES ({_PLACEHOLDERS})",
+                map(_to_row, records),
+            )
+
+    def history(self, chart_key: str, limit: int = 50) -> list[DecodeResult]:
+        """Plays of one chart, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM history WHERE chart_key = ?"
+                " ORDER BY decoded_at DESC LIMIT ?",
+                (chart_key, limit),
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def play_count(self, chart_key: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM history WHERE chart_key = ?", (chart_key,)
+            ).fetchone()[0]
+
+    def recent(self, limit: int = 50) -> list[DecodeResult]:
+        """Most recently improved best records."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM best ORDER BY decoded_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def top_patch(self, limit: int = 50) -> list[DecodeResult]:
+        """Best records with the highest P.A.T.C.H."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM best ORDER BY patch DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
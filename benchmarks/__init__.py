@@ -0,0 +1 @@
+"""Benchmarks for the screenshot analysis pipeline. Run with ``python -m benchmarks.run``."""
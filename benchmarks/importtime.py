@@ -0,0 +1,74 @@
+"""Import-time profile of the client's modules (wraps ``python -X importtime``).
+
+Usage:
+    python -m benchmarks.importtime --out imports.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# What the client imports before the window appears vs. on the background thread
+DEFAULT_MODULES = ["client", "analyzer", "login", "models", "phash"]
+
+
+def profile_import(module: str, top: int = 15) -> dict:
+    """Imports ``module`` in a fresh interpreter and parses the importtime report."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        entries.append(
+            {
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+
+    own = next((e for e in reversed(entries) if e["module"] == module), None)
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "total_ms": round(own["cumulative_us"] / 1000, 3) if own else None,
+        "modules_loaded": len(entries),
+        "heaviest": sorted(entries, key=lambda e: e["self_us"], reverse=True)[:top],
+    }
+
+
+def run(modules: list[str], top: int = 15) -> dict:
+    return {"import_time": [profile_import(module, top) for module in modules]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--out", help="Write JSON results to this file (default: stdout)"
+    )
+    args = parser.parse_args(argv)
+
+    output = json.dumps(run(args.modules, args.top), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Load test for the local analysis service (server.py).
+
+Posts screenshots to /analyze from concurrent clients and reports latency
+percentiles, throughput and the status code mix. Without ``--url`` it starts a
+service in-process on a free port first.
+
+Usage:
+    python -m benchmarks.loadtest shots/*.png --concurrency 16 --requests 500
+    python -m benchmarks.loadtest shot.png --url http://127.0.0.1:8765 --raw
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from benchmarks.run import percentile
+from ingest import open_image
+
+
+def load_payloads(paths: list[str], raw: bool) -> list[tuple[bytes, dict]]:
+    """Request bodies and headers: the file as-is, or decoded to raw RGB."""
+    payloads = []
+    for path in paths:
+        if raw:
+            rgb = open_image(path)
+            headers = {
+                "Content-Type": "application/octet-stream",
+                "X-Width": str(rgb.width),
+                "X-Height": str(rgb.height),
+            }
+            payloads.append((rgb.tobytes(), headers))
+        else:
+            with open(path, "rb") as f:
+                payloads.append((f.read(), {"Content-Type": "image/png"}))
+    return payloads
+
+
+def post(url: str, body: bytes, headers: dict) -> tuple[int, float]:
+    request = urllib.request.Request(
+        f"{url}/analyze", data=body, headers=headers, method="POST"
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def run(url: str, payloads, concurrency: int, requests: int) -> dict:
+    latencies = []
+    statuses: dict[int, int] = {}
+    lock = threading.Lock()
+
+    def one(payload):
+        status, elapsed = post(url, *payload)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, islice(cycle(payloads), requests)))
+    wall_time = time.perf_counter() - wall_start
+
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "p50_ms": round(percentile(ordered, 0.5) * 1000, 3) if ordered else None,
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3) if ordered else None,
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else None,
+        "throughput_per_sec": round(len(ordered) / wall_time, 3),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--url", help="Running service (default: start one)")
+    parser.add_argument("--songs", help="db.json for the in-process service")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-pending", type=int)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--raw", action="store_true", help="Send raw RGB bodies")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(args.images, args.raw)
+    server = service = None
+    url = args.url
+    if url is None:
+        from cli import load_songs
+        from server import AnalysisService, make_server
+
+        workers = args.workers or 1
+        service = AnalysisService(
+            load_songs(args.songs), workers, args.max_pending or workers * 4
+        )
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        result = run(url.rstrip("/"), payloads, args.concurrency, args.requests)
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            result["server_metrics"] = json.load(response)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            service.shutdown()
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Local stand-in for the platina-archive.app API, for offline load testing.
+
+Implements the endpoints the client uses (platina_songs, platina_patterns,
+client_version, get_archive, update_archive, register) with in-memory state.
+Song and pattern lists answer ``If-Modified-Since`` with 304 like production.
+Every request can be delayed (``--latency-ms`` +- ``--jitter-ms``) and a share
+of them failed (``--error-rate``) to exercise retries and queues.
+
+Point the client or benchmarks at it with ``PLATINA_API_URL``:
+    python -m benchmarks.mock_api --songs db.json --port 8780
+    PLATINA_API_URL=http://127.0.0.1:8780 python client.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8780
+API_PREFIX = "/api/v1/"
+
+
+def parse_http_date(value: str) -> datetime | None:
+    """RFC 7231 dates, plus the ISO dates older clients cached."""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class MockApiState:
+    """Data served by the mock, shared by all request threads."""
+
+    def __init__(
+        self,
+        songs: list[dict],
+        patterns: list[dict],
+        client_version: tuple[int, int, int] = (0, 0, 0),
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        # HTTP dates have second resolution
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.songs = songs
+        self.patterns = patterns
+        self.songs_modified = now
+        self.patterns_modified = now
+        self.client_version = client_version
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.users: dict[str, str] = {}  # name -> password
+        self.archives: dict[str, dict[str, dict]] = {}  # api key -> archive key -> row
+        self.stats: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_db_json(cls, path: str, **kwargs) -> MockApiState:
+        with open(path, "r", encoding="utf-8") as f:
+            db = json.load(f)
+        return cls(db["songs"], db["patterns"], **kwargs)
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def inject(self) -> bool:
+        """Sleeps for the configured latency; True if this request should fail."""
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(
+                -self.jitter_ms, self.jitter_ms
+            )
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+    def register(self, name: str, password: str) -> str | None:
+        with self._lock:
+            if self.users.setdefault(name, password) != password:
+                return None
+        return f"{name}::{secrets.token_hex(16)}"
+
+    def get_archive(self, api_key: str) -> list[dict]:
+        with self._lock:
+            return list(self.archives.get(api_key, {}).values())
+
+    def update_archive(self, api_key: str, row: dict):
+        key = f"{row['song_id']}|{row['line']}|{row['difficulty']}|{row['level']}"
+        row = {**row, "decoded_at": datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            self.archives.setdefault(api_key, {})[key] = row
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    server_version = "PlatinaArchiveMock/1"
+    state: MockApiState  # set by make_server
+
+    def _send_json(self, status: HTTPStatus, payload, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_modified(self):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _dispatch(self, routes: dict):
+        if self.path == "/_stats":
+            self._send_json(HTTPStatus.OK, self.state.stats)
+            return
+        name = self.path[len(API_PREFIX) :] if self.path.startswith(API_PREFIX) else ""
+        route = routes.get(name)
+        if route is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"msg": "not found"})
+            return
+        self.state.count(name)
+        if self.state.inject():
+            self.state.count("injected_errors")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"msg": "injected error"})
+            return
+        route()
+
+    def do_GET(self):
+        self._dispatch(
+            {
+                "platina_songs": lambda: self._list(
+                    self.state.songs, self.state.songs_modified
+                ),
+                "platina_patterns": lambda: self._list(
+                    self.state.patterns, self.state.patterns_modified
+                ),
+                "client_version": self._client_version,
+            }
+        )
+
+    def do_POST(self):
+        self._dispatch(
+            {
+                "get_archive": self._get_archive,
+                "update_archive": self._update_archive,
+                "register": self._register,
+            }
+        )
+
+    def _list(self, rows: list[dict], modified: datetime):
+        since = parse_http_date(self.headers.get("If-Modified-Since", ""))
+        if since is not None and since >= modified:
+            self.state.count("not_modified")
+            self._send_not_modified()
+            return
+        self._send_json(
+            HTTPStatus.OK, rows, {"Last-Modified": format_datetime(modified, True)}
+        )
+
+    def _client_version(self):
+        major, minor, patch = self.state.client_version
+        self._send_json(HTTPStatus.OK, {"major": major, "minor": minor, "patch": patch})
+
+    def _api_key(self) -> str | None:
+        api_key = self.headers.get("X-API-Key")
+        if not api_key:
+            self._send_json(HTTPStatus.UNAUTHORIZED, {"msg": "missing API key"})
+        return api_key
+
+    def _get_archive(self):
+        api_key = self._api_key()
+        if api_key:
+            self._send_json(HTTPStatus.OK, self.state.get_archive(api_key))
+
+    def _update_archive(self):
+        api_key = self._api_key()
+        if not api_key:
+            return
+        try:
+            self.state.update_archive(api_key, self._read_json())
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"msg": f"bad archive: {e}"})
+            return
+        self._send_json(HTTPStatus.OK, {"msg": "updated"})
+
+    def _register(self):
+        data = self._read_json()
+        name, password = data.get("name"), data.get("password")
+        api_key = self.state.register(name, password) if name and password else None
+        if api_key is None:
+            self._send_json(
+                HTTPStatus.BAD_REQUEST, {"msg": "Invalid username or password"}
+            )
+            return
+        self._send_json(HTTPStatus.OK, {"key": api_key})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(
+    state: MockApiState, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    handler = type("BoundMockApiHandler", (MockApiHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(state: MockApiState, port: int = 0):
+    """Starts the mock on a daemon thread; returns (server, base URL)."""
+    server = make_server(state, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--songs", help="db.json to serve (default: synthetic songs)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--client-version", default="0.0.0")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    options = {
+        "client_version": tuple(int(p) for p in args.client_version.split(".")),
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+    if args.songs:
+        state = MockApiState.from_db_json(args.songs, **options)
+    else:
+        from benchmarks.synthetic import make_song_corpus, songs_to_db_json
+
+        db = songs_to_db_json(make_song_corpus(200)[0])
+        state = MockApiState(db["songs"], db["patterns"], **options)
+
+    server = make_server(state, args.host, args.port)
+    print(f"Mock API on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
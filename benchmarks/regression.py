@@ -0,0 +1,273 @@
+"""Accuracy and latency regression harness over a labeled screenshot corpus.
+
+A corpus is a directory of screenshots, each with a ground-truth JSON file of
+the same name (``0001.png`` + ``0001.json``) holding any of the fields in
+FIELDS. Songs come from a db.json cache file (``--songs``, defaults to the
+corpus' own db.json).
+
+Usage:
+    python -m benchmarks.regression corpus/ --out report.json
+    python -m benchmarks.regression corpus/ --baseline report.json
+    python -m benchmarks.regression --make-synthetic corpus/ --count 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import ScreenshotAnalyzer, load_cached_songs
+from benchmarks.run import percentile
+from embedding import JacketIndex
+from songindex import SongIndex, publish_song_index
+
+FIELDS = [
+    "screen_type",
+    "song_id",
+    "line",
+    "difficulty",
+    "level",
+    "judge",
+    "score",
+    "patch",
+    "rank",
+    "is_full_combo",
+]
+CONFUSION_FIELDS = ["level", "difficulty"]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _configure_tesseract(analyzer: ScreenshotAnalyzer):
+    """The shipped pipeline: Tesseract, lookup tables, re-reads and jacket re-ranking."""
+    # Descriptors learned during the run stay in memory, so runs do not
+    # depend on (or write to) the user's learned index
+    analyzer.jacket_index = JacketIndex()
+
+
+def _configure_single_pass(analyzer: ScreenshotAnalyzer):
+    """Every field read once; low-confidence fields are not re-read."""
+    _configure_tesseract(analyzer)
+    analyzer.reocr_variants = ()
+
+
+def _configure_phash_only(analyzer: ScreenshotAnalyzer):
+    """Jackets matched by pHash and chart alone, without learned descriptors."""
+    _configure_tesseract(analyzer)
+    analyzer.jacket_index = None
+
+
+# name -> function applied to each worker's analyzer before analysis
+CONFIGURATIONS = {
+    "tesseract": _configure_tesseract,
+    "single_pass": _configure_single_pass,
+    "phash_only": _configure_phash_only,
+}
+
+_worker_analyzer: ScreenshotAnalyzer | None = None
+
+
+def _init_worker(index_path: str, config_name: str, tesseract_cmd: str | None = None):
+    global _worker_analyzer
+    _worker_analyzer = ScreenshotAnalyzer(SongIndex.open(index_path), tesseract_cmd)
+    CONFIGURATIONS[config_name](_worker_analyzer)
+
+
+def _analyze_one(image_path: str) -> tuple[str, dict | None, float, str | None]:
+    start = time.perf_counter()
+    try:
+        report = _worker_analyzer.extract_info(image_path)
+        prediction = report.json()
+        prediction["rank"] = report.rank
+        prediction["screen_type"] = report.screen_type
+        error = None
+    except Exception as e:
+        prediction = None
+        error = f"{type(e).__name__}: {e}"
+    return image_path, prediction, time.perf_counter() - start, error
+
+
+def load_corpus(corpus_dir: str) -> list[tuple[str, dict]]:
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        truth_path = os.path.join(corpus_dir, f"{stem}.json")
+        if not os.path.isfile(truth_path):
+            continue
+        with open(truth_path, "r", encoding="utf-8") as f:
+            samples.append((os.path.join(corpus_dir, name), json.load(f)))
+    return samples
+
+
+def field_matches(field: str, expected, actual) -> bool:
+    if field in ("judge", "patch"):
+        try:
+            return abs(float(expected) - float(actual)) < 1e-6
+        except (TypeError, ValueError):
+            return False
+    return expected == actual
+
+
+def evaluate(
+    samples,
+    songs_path: str,
+    config_name: str,
+    workers: int,
+    tesseract_cmd: str | None = None,
+) -> dict:
+    truths = dict(samples)
+    correct = {field: 0 for field in FIELDS}
+    totals = {field: 0 for field in FIELDS}
+    confusion = {field: {} for field in CONFUSION_FIELDS}
+    latencies = []
+    errors = []
+
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(
+            publish_song_index(load_cached_songs(songs_path)),
+            config_name,
+            tesseract_cmd,
+        ),
+    ) as pool:
+        for path, prediction, elapsed, error in pool.map(
+            _analyze_one, truths.keys(), chunksize=4
+        ):
+            latencies.append(elapsed)
+            if error:
+                errors.append({"path": path, "error": error})
+            truth = truths[path]
+            for field in FIELDS:
+                if field not in truth:
+                    continue
+                actual = prediction.get(field) if prediction else None
+                totals[field] += 1
+                if field_matches(field, truth[field], actual):
+                    correct[field] += 1
+                if field in confusion:
+                    row = confusion[field].setdefault(str(truth[field]), {})
+                    row[str(actual)] = row.get(str(actual), 0) + 1
+    wall_time = time.perf_counter() - wall_start
+
+    ordered = sorted(latencies)
+    return {
+        "samples": len(samples),
+        "accuracy": {
+            field: round(correct[field] / totals[field], 4)
+            for field in FIELDS
+            if totals[field]
+        },
+        "confusion": confusion,
+        "latency": {
+            "p50_ms": round(percentile(ordered, 0.5) * 1000, 3) if ordered else 0,
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 3) if ordered else 0,
+        },
+        "throughput_per_sec": round(len(samples) / wall_time, 3) if wall_time else 0,
+        "errors": errors,
+    }
+
+
+def find_regressions(
+    report: dict, baseline: dict, max_accuracy_drop: float, max_latency_increase: float
+) -> list[str]:
+    """Compares two harness reports and describes every regression beyond the thresholds."""
+    problems = []
+    for config, result in report["configurations"].items():
+        base = baseline.get("configurations", {}).get(config)
+        if not base:
+            continue
+        for field, accuracy in result["accuracy"].items():
+            base_accuracy = base["accuracy"].get(field)
+            if (
+                base_accuracy is not None
+                and base_accuracy - accuracy > max_accuracy_drop
+            ):
+                problems.append(
+                    f"[{config}] {field} accuracy {base_accuracy} -> {accuracy}"
+                )
+        base_p95 = base["latency"]["p95_ms"]
+        p95 = result["latency"]["p95_ms"]
+        if base_p95 and (p95 - base_p95) / base_p95 > max_latency_increase:
+            problems.append(f"[{config}] p95 latency {base_p95}ms -> {p95}ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", help="Directory of screenshots + ground-truth JSON")
+    parser.add_argument(
+        "--songs", help="db.json with songs (default: <corpus>/db.json)"
+    )
+    parser.add_argument(
+        "--config",
+        nargs="+",
+        choices=sorted(CONFIGURATIONS),
+        default=sorted(CONFIGURATIONS),
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--tesseract", help="Path to the tesseract binary")
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    parser.add_argument("--max-latency-increase", type=float, default=0.2)
+    parser.add_argument(
+        "--make-synthetic",
+        action="store_true",
+        help="Write a synthetic labeled corpus into CORPUS and exit",
+    )
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.make_synthetic:
+        from benchmarks.synthetic import write_corpus
+
+        write_corpus(args.corpus, args.count)
+        return 0
+
+    songs_path = args.songs or os.path.join(args.corpus, "db.json")
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print(f"No labeled screenshots found in {args.corpus}", file=sys.stderr)
+        return 2
+
+    report = {"corpus": os.path.abspath(args.corpus), "configurations": {}}
+    for config_name in args.config:
+        result = evaluate(
+            samples, songs_path, config_name, args.workers, args.tesseract
+        )
+        report["configurations"][config_name] = result
+        print(
+            f"[{config_name}] p50={result['latency']['p50_ms']}ms "
+            f"p95={result['latency']['p95_ms']}ms accuracy={result['accuracy']}",
+            file=sys.stderr,
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        problems = find_regressions(
+            report, baseline, args.max_accuracy_drop, args.max_latency_increase
+        )
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Times each stage of the analysis pipeline on synthetic screenshots.
+
+Usage:
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --resolutions 1920x1080 2560x1440 --samples 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pytesseract
+
+from analyzer import TABLE_SCALE, ScreenshotAnalyzer
+from benchmarks.importtime import DEFAULT_MODULES, profile_import
+from benchmarks.synthetic import RESOLUTIONS, generate_screenshot, make_song_corpus
+from phash import phash
+
+SCHEMA_VERSION = 1
+
+# (ROI key, OCR function name, preprocess kwargs)
+OCR_FIELDS = {
+    "SELECT": [
+        ("line", "get_ocr_line", {}),
+        ("score", "get_ocr_integer", {}),
+        ("major_patch", "get_ocr_select_major_patch", {}),
+        ("minor_patch", "get_ocr_select_minor_patch", {}),
+        ("major_judge", "get_ocr_integer", {}),
+        ("minor_judge", "get_ocr_select_minor_judge", {}),
+    ],
+    "RESULT": [
+        ("judge", "get_ocr_judge", {}),
+        ("line", "get_ocr_line", {}),
+        ("level", "get_ocr_integer", {"do_invert": True}),
+        ("patch", "get_ocr_patch", {"do_invert": True}),
+        ("score", "get_ocr_integer", {}),
+        ("total_notes", "get_ocr_integer", {}),
+        ("perfect_high_y", "get_ocr_integer", {}),
+        ("perfect_y", "get_ocr_integer", {}),
+        ("great_y", "get_ocr_integer", {}),
+        ("good_y", "get_ocr_integer", {}),
+        ("miss_y", "get_ocr_integer", {}),
+    ],
+}
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage name."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+
+    def time(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self) -> dict[str, dict]:
+        return {stage: summarize(values) for stage, values in self.samples.items()}
+
+    def mean_ms(self, prefix: str) -> float:
+        """Sum of the mean times of every stage starting with ``prefix``."""
+        return sum(
+            sum(values) / len(values) * 1000
+            for stage, values in self.samples.items()
+            if stage.startswith(prefix)
+        )
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+
+def _raw_crop(analyzer: ScreenshotAnalyzer, img, screen_type, key):
+    return analyzer._crop_and_ocr(
+        img, screen_type, key, lambda x: x, no_preprocess=True
+    )
+
+
+def bench_stages(analyzer, img, screen_type, truth, timer: StageTimer, run_ocr: bool):
+    timer.time("classify", analyzer.determine_screen_type, img)
+
+    def match_jacket():
+        jacket_crop = _raw_crop(analyzer, img, screen_type, "jacket")
+        return analyzer.get_best_match_song(phash(jacket_crop))
+
+    timer.time("jacket_match", match_jacket)
+
+    for key, func_name, kwargs in OCR_FIELDS[screen_type]:
+        crop = _raw_crop(analyzer, img, screen_type, key)
+        processed = timer.time(
+            f"preprocess.{key}", analyzer.ocr_preprocess, crop, **kwargs
+        )
+        # The original fixed 4x pipeline, to report what adaptive scaling saves
+        reference = timer.time(
+            f"preprocess_4x.{key}",
+            analyzer.ocr_preprocess,
+            crop,
+            scale=TABLE_SCALE,
+            **kwargs,
+        )
+        if run_ocr:
+            timer.time(f"ocr.{key}", getattr(analyzer, func_name), processed, **kwargs)
+            timer.time(
+                f"ocr_4x.{key}", getattr(analyzer, func_name), reference, **kwargs
+            )
+
+    def calculate():
+        judge = analyzer.calculate_judge_rate(
+            truth["perfect_high"],
+            truth["perfect"],
+            truth["great"],
+            truth["good"],
+            truth["miss"],
+        )
+        analyzer.calculate_score(
+            truth["perfect_high"], truth["perfect"], truth["great"]
+        )
+        rank = analyzer.calculate_rank(judge)
+        analyzer.calculate_patch(
+            truth["level"], rank, truth["difficulty"] == "PLUS", judge
+        )
+
+    timer.time("calculation", calculate)
+
+
+def run(args) -> dict:
+    songs, jackets = make_song_corpus(args.songs, seed=args.seed)
+    analyzer = ScreenshotAnalyzer(songs)
+    if args.tesseract:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract
+
+    run_ocr = not args.no_ocr
+    if run_ocr:
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            print("Tesseract not found, skipping OCR stages", file=sys.stderr)
+            run_ocr = False
+
+    results = {}
+    for size in args.resolutions:
+        label = f"{size[0]}x{size[1]}"
+        results[label] = {}
+        for screen_type in ("SELECT", "RESULT"):
+            rng = random.Random(f"{args.seed}-{label}-{screen_type}")
+            timer = StageTimer()
+            extract_samples = []
+            with tempfile.TemporaryDirectory() as tmpdir:
+                for i in range(args.samples):
+                    img, truth = generate_screenshot(
+                        screen_type, songs, jackets, size, rng, args.font
+                    )
+                    bench_stages(analyzer, img, screen_type, truth, timer, run_ocr)
+                    if run_ocr:
+                        path = os.path.join(tmpdir, f"{i}.png")
+                        img.save(path)
+                        start = time.perf_counter()
+                        analyzer.extract_info(path)
+                        extract_samples.append(time.perf_counter() - start)
+            entry = {
+                "stages": timer.summary(),
+                # Per screenshot, preprocessing plus OCR of every field
+                "adaptive_preprocess_saved_ms": round(
+                    timer.mean_ms("preprocess_4x.")
+                    + timer.mean_ms("ocr_4x.")
+                    - timer.mean_ms("preprocess.")
+                    - timer.mean_ms("ocr."),
+                    3,
+                ),
+            }
+            if extract_samples:
+                entry["extract_info"] = summarize(extract_samples)
+                entry["extract_info_per_sec"] = round(
+                    len(extract_samples) / sum(extract_samples), 3
+                )
+            results[label][screen_type] = entry
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "label": args.label,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "songs": args.songs,
+            "samples": args.samples,
+            "seed": args.seed,
+            "ocr": run_ocr,
+        },
+        "results": results,
+    }
+    if args.import_time:
+        report["import_time"] = [profile_import(m) for m in DEFAULT_MODULES]
+    return report
+
+
+def parse_resolution(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--out", help="Write JSON results to this file (default: stdout)"
+    )
+    parser.add_argument(
+        "--label", default="", help="Free-form label, e.g. a release tag"
+    )
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--songs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--font", help="Path to the TTF used for digits")
+    parser.add_argument("--tesseract", help="Path to the tesseract binary")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip Tesseract stages")
+    parser.add_argument(
+        "--import-time", action="store_true", help="Include an import-time profile"
+    )
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        type=parse_resolution,
+        default=RESOLUTIONS,
+        metavar="WxH",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Startup, sync and upload throughput against the local mock API.
+
+Starts ``benchmarks.mock_api`` in-process, points the client code at it with
+PLATINA_API_URL and uses a temporary APPDATA, so neither production nor the
+real song cache is touched.
+
+Usage:
+    python -m benchmarks.sync --songs 500 --uploads 1000 --concurrency 8
+    python -m benchmarks.sync --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_api import MockApiState, start_in_background
+
+
+def _timed(func, *args) -> float | str:
+    """Milliseconds taken by ``func``, or the error it raised (e.g. an injected 500)."""
+    start = time.perf_counter()
+    try:
+        func(*args)
+    except Exception as e:
+        return f"error: {type(e).__name__}: {e}"
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def run(args) -> dict:
+    # Set before anything imports analyzer: the song cache path is fixed at import
+    os.environ["APPDATA"] = tempfile.mkdtemp(prefix="platina-sync-")
+    import requests
+
+    from analyzer import fetch_archive, fetch_latest_client_version, fetch_songs
+    from benchmarks.run import percentile
+    from benchmarks.synthetic import make_song_corpus, songs_to_db_json
+    from endpoints import api_url
+
+    db = songs_to_db_json(make_song_corpus(args.songs, args.seed)[0])
+    state = MockApiState(
+        db["songs"],
+        db["patterns"],
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        seed=args.seed,
+    )
+    server, url = start_in_background(state)
+    os.environ["PLATINA_API_URL"] = url
+
+    api_key = requests.post(
+        api_url("register"), json={"name": "bench", "password": "bench"}
+    ).json()["key"]
+    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+    state.error_rate = args.error_rate  # registration itself is not under test
+    payloads = [
+        {
+            "song_id": pattern["songID"],
+            "line": pattern["line"],
+            "difficulty": pattern["difficulty"],
+            "level": pattern["level"],
+            "judge": 99.5,
+            "score": 195000,
+            "patch": 30.0,
+            "is_full_combo": False,
+            "is_max_patch": False,
+        }
+        for pattern in db["patterns"]
+    ]
+
+    result = {
+        "songs": args.songs,
+        "startup": {
+            "client_version_ms": _timed(fetch_latest_client_version),
+            "fetch_songs_cold_ms": _timed(fetch_songs),
+            "fetch_songs_not_modified_ms": _timed(fetch_songs),
+        },
+    }
+
+    latencies = []
+    statuses: dict[int, int] = {}
+
+    def upload(payload):
+        start = time.perf_counter()
+        try:
+            status = requests.post(
+                api_url("update_archive"), json=payload, headers=headers
+            ).status_code
+        except requests.RequestException:
+            status = 0
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    jobs = [payloads[i % len(payloads)] for i in range(args.uploads)]
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(upload, jobs))
+    wall_time = time.perf_counter() - wall_start
+    ordered = sorted(latencies)
+    result["upload"] = {
+        "requests": args.uploads,
+        "concurrency": args.concurrency,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "p50_ms": round(percentile(ordered, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "throughput_per_sec": round(args.uploads / wall_time, 3),
+    }
+    result["sync"] = {
+        "archive_rows": len(state.get_archive(api_key)),
+        "fetch_archive_ms": _timed(fetch_archive, api_key),
+    }
+    result["server_stats"] = dict(state.stats)
+
+    server.shutdown()
+    server.server_close()
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--songs", type=int, default=300)
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    output = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Synthetic SELECT/RESULT screenshots rendered from ROI_CONFIG.
+
+Every generated screenshot comes with the ground truth it was drawn from, so
+the same corpus can be used for timing and for accuracy checks.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+from typing import Literal
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from analyzer import (
+    DIFFICULTY_COLORS,
+    PIVOT_COLORS,
+    PIVOT_X,
+    REF_H,
+    REF_W,
+    ROI_CONFIG,
+    ScreenshotAnalyzer,
+)
+from calibration import ANCHOR_BOXES
+from lookup import TABLES_DIR
+from models import Pattern, Song
+from phash import DCT_BASIS, HASH_SIZE, IMG_SIZE, hex_to_value, phash, value_to_hex
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+DIFFICULTIES = ["EASY", "HARD", "OVER", "PLUS"]
+FONT_CANDIDATES = [
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+    "arialbd.ttf",
+    "Arial Bold.ttf",
+]
+
+# Where the selected-difficulty arrow is drawn (the analyzer searches wider)
+PIVOT_Y_RANGE = (640, 900)
+BACKGROUND = (24, 24, 36)
+TEXT_COLOR = (255, 255, 255)
+FRAME_COLOR = (200, 200, 220)
+FRAME_WIDTH = 8  # reference pixels around the jacket
+
+
+def load_font(size: int, font_path: str | None = None) -> ImageFont.ImageFont:
+    """Loads a bold sans-serif font close to the in-game digits."""
+    candidates = [font_path] if font_path else FONT_CANDIDATES
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def hash_pattern(target_hash: int) -> Image.Image:
+    """A 32x32 grayscale pattern whose pHash is ``target_hash``.
+
+    Stands in for game art that only exists as a hash in the lookup tables:
+    the 8x8 low-frequency block is set to +1/-1 by the hash bits and
+    transformed back to pixels.
+    """
+    bits = np.unpackbits(np.array([target_hash], dtype=">u8").view(np.uint8))
+    block = np.where(bits.reshape(HASH_SIZE, HASH_SIZE), 1.0, -1.0)
+    block[0, 0] = 0.0  # the mean below keeps the DC term positive
+    scale = np.diag(DCT_BASIS @ DCT_BASIS.T)
+    pixels = DCT_BASIS.T @ (block / np.outer(scale, scale)) @ DCT_BASIS
+    pixels = 128 + pixels * (100 / np.abs(pixels).max())
+    return Image.fromarray(pixels.astype(np.uint8).reshape(IMG_SIZE, IMG_SIZE))
+
+
+def _select_speed_indicator() -> Image.Image:
+    with open(os.path.join(TABLES_DIR, "screen_select_speed.json"), "r") as f:
+        entries = json.load(f)["entries"]
+    target = next(e["phash"] for e in entries if e["value"] == "SELECT")
+    return hash_pattern(hex_to_value(target)).convert("RGB")
+
+
+def make_jacket(rng: random.Random, size: int = 400) -> Image.Image:
+    """Renders a random blocky "album cover" with enough structure for pHash."""
+    grid = rng.choice([4, 6, 8])
+    small = Image.new("RGB", (grid, grid))
+    small.putdata(
+        [
+            (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            for _ in range(grid * grid)
+        ]
+    )
+    jacket = small.resize((size, size), Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(jacket)
+    for _ in range(rng.randint(2, 6)):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        r = rng.randint(size // 16, size // 4)
+        fill = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x0 - r, y0 - r, x0 + r, y0 + r), fill=fill)
+    return jacket
+
+
+def make_song_corpus(
+    count: int, seed: int = 0
+) -> tuple[list[Song], dict[int, Image.Image]]:
+    """Generates songs whose pHash values come from generated jackets."""
+    rng = random.Random(seed)
+    songs = []
+    jackets = {}
+    for song_id in range(1, count + 1):
+        jacket = make_jacket(rng)
+        song = Song(
+            song_id=song_id,
+            title=f"Synthetic {song_id}",
+            artist="Benchmark",
+            bpm="180",
+            dlc="BASE",
+            phash=value_to_hex(phash(jacket)),
+            plus_phash=None,
+        )
+        for line in (4, 6):
+            for index, difficulty in enumerate(DIFFICULTIES):
+                level = min(20, 2 + index * 4 + rng.randint(0, 3))
+                song.add_pattern(Pattern(line, difficulty, level, "synthetic"))
+        songs.append(song)
+        jackets[song_id] = jacket
+    return songs, jackets
+
+
+def random_play(rng: random.Random, song: Song) -> dict:
+    """Picks a chart and note counts, and derives the values the game shows."""
+    pattern = rng.choice(song.patterns)
+    total = rng.randint(300, 2500)
+    miss = rng.choice([0, 0, rng.randint(0, 20)])
+    good = rng.randint(0, 15)
+    great = rng.randint(0, 60)
+    rest = max(0, total - miss - good - great)
+    perfect_high = int(rest * rng.uniform(0.7, 1.0))
+    perfect = rest - perfect_high
+    total = perfect_high + perfect + great + good + miss
+
+    judge = ScreenshotAnalyzer.calculate_judge_rate(
+        perfect_high, perfect, great, good, miss
+    )
+    rank = ScreenshotAnalyzer.calculate_rank(judge)
+    return {
+        "song_id": song.id,
+        "line": pattern.line,
+        "difficulty": pattern.difficulty,
+        "level": pattern.level,
+        "judge": judge,
+        "score": ScreenshotAnalyzer.calculate_score(perfect_high, perfect, great),
+        "patch": ScreenshotAnalyzer.calculate_patch(
+            pattern.level, rank, pattern.difficulty == "PLUS", judge
+        ),
+        "rank": rank,
+        "is_full_combo": miss == 0,
+        "total_notes": total,
+        "perfect_high": perfect_high,
+        "perfect": perfect,
+        "great": great,
+        "good": good,
+        "miss": miss,
+    }
+
+
+class _Canvas:
+    """Draws in reference (1920x1080) coordinates onto an image of any size."""
+
+    def __init__(self, size: tuple[int, int], font_path: str | None = None):
+        self.image = Image.new("RGB", size, BACKGROUND)
+        self.draw = ImageDraw.Draw(self.image)
+        self.sx = size[0] / REF_W
+        self.sy = size[1] / REF_H
+        self.font_path = font_path
+
+    def box(self, coords: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        x0, y0, x1, y1 = coords
+        return (
+            round(x0 * self.sx),
+            round(y0 * self.sy),
+            round(x1 * self.sx),
+            round(y1 * self.sy),
+        )
+
+    def text(self, coords, text: str, dark: bool = False):
+        x0, y0, x1, y1 = self.box(coords)
+        if dark:
+            self.draw.rectangle((x0, y0, x1, y1), fill=TEXT_COLOR)
+        font = load_font(max(6, int((y1 - y0) * 0.85)), self.font_path)
+        self.draw.text(
+            ((x0 + x1) / 2, (y0 + y1) / 2),
+            text,
+            fill=BACKGROUND if dark else TEXT_COLOR,
+            font=font,
+            anchor="mm",
+        )
+
+    def paste(self, coords, image: Image.Image):
+        x0, y0, x1, y1 = self.box(coords)
+        self.image.paste(image.resize((x1 - x0, y1 - y0)), (x0, y0))
+
+    def fill(self, coords, color):
+        self.draw.rectangle(self.box(coords), fill=color)
+
+    def jacket(self, coords, image: Image.Image):
+        """Pastes a jacket inside its fixed frame (a calibration anchor)."""
+        x0, y0, x1, y1 = coords
+        w = FRAME_WIDTH
+        self.fill((x0 - w, y0 - w, x1 + w, y1 + w), FRAME_COLOR)
+        self.paste(coords, image)
+
+
+def render_result(
+    play: dict, jacket: Image.Image, size: tuple[int, int], font_path=None
+) -> Image.Image:
+    roi = ROI_CONFIG["RESULT"]
+    canvas = _Canvas(size, font_path)
+    canvas.jacket(roi["jacket"], jacket)
+    canvas.text(roi["judge"], f"{play['judge']:.4f}%")
+    canvas.text(roi["line"], str(play["line"]))
+    canvas.text(roi["level"], str(play["level"]), dark=True)
+    canvas.text(roi["patch"], f"{play['patch']:.2f}", dark=True)
+    canvas.text(roi["score"], str(play["score"]))
+    notes_x0, _, notes_x1, _ = roi["notes_area"]
+    for key, field in [
+        ("total_notes", "total_notes"),
+        ("perfect_high_y", "perfect_high"),
+        ("perfect_y", "perfect"),
+        ("great_y", "great"),
+        ("good_y", "good"),
+        ("miss_y", "miss"),
+    ]:
+        y0, y1 = roi[key]
+        canvas.text((notes_x0, y0, notes_x1, y1), str(play[field]))
+    x, y = roi["difficulty_color"]
+    canvas.fill((x - 8, y - 8, x + 8, y + 8), DIFFICULTY_COLORS[play["difficulty"]])
+    canvas.text(roi["rank"], play["rank"])
+    return canvas.image
+
+
+def render_select(
+    play: dict,
+    jacket: Image.Image,
+    size: tuple[int, int],
+    font_path=None,
+    rng: random.Random | None = None,
+) -> Image.Image:
+    roi = ROI_CONFIG["SELECT"]
+    rng = rng or random.Random(0)
+    canvas = _Canvas(size, font_path)
+    canvas.jacket(roi["jacket"], jacket)
+    canvas.text(roi["line"], str(play["line"]))
+    canvas.text(roi["score"], str(play["score"]))
+    major_patch, minor_patch = f"{play['patch']:.2f}".split(".")
+    canvas.text(roi["major_patch"], major_patch)
+    canvas.text(roi["minor_patch"], minor_patch)
+    major_judge, minor_judge = f"{play['judge']:.4f}".split(".")
+    canvas.text(roi["major_judge"], major_judge)
+    canvas.text(roi["minor_judge"], minor_judge)
+    canvas.text(roi["rank"], play["rank"])
+    # What determine_screen_type looks for
+    canvas.paste(ANCHOR_BOXES["select_speed"], _select_speed_indicator())
+
+    # Selected-difficulty arrow and the level text to its left
+    pivot_y = rng.randrange(*PIVOT_Y_RANGE)
+    canvas.fill(
+        (PIVOT_X, pivot_y, PIVOT_X + 12, pivot_y + 12),
+        PIVOT_COLORS[play["difficulty"]],
+    )
+    canvas.text(
+        (PIVOT_X - 105, pivot_y + 29, PIVOT_X, pivot_y + 95),
+        str(play["level"]),
+        dark=True,
+    )
+    return canvas.image
+
+
+def generate_screenshot(
+    screen_type: Literal["SELECT", "RESULT"],
+    songs: list[Song],
+    jackets: dict[int, Image.Image],
+    size: tuple[int, int],
+    rng: random.Random,
+    font_path: str | None = None,
+) -> tuple[Image.Image, dict]:
+    """Returns a synthetic screenshot and its ground truth."""
+    song = rng.choice(songs)
+    play = random_play(rng, song)
+    play["screen_type"] = screen_type
+    if screen_type == "SELECT":
+        img = render_select(play, jackets[song.id], size, font_path, rng)
+    else:
+        img = render_result(play, jackets[song.id], size, font_path)
+    return img, play
+
+
+def songs_to_db_json(songs: list[Song]) -> dict:
+    """Serializes songs in the same layout as the client's db.json cache."""
+    return {
+        "songs": [
+            {
+                "songID": song.id,
+                "title": song.title,
+                "artist": song.artist,
+                "BPM": song.bpm,
+                "DLC": song.dlc,
+                "pHash": song.phash,
+                "plusPHash": song.plus_phash,
+            }
+            for song in songs
+        ],
+        "patterns": [
+            {
+                "songID": song.id,
+                "line": pattern.line,
+                "difficulty": pattern.difficulty,
+                "level": pattern.level,
+                "designer": pattern.designer,
+            }
+            for song in songs
+            for pattern in song.patterns
+        ],
+    }
+
+
+def write_corpus(
+    out_dir: str,
+    count: int,
+    sizes: list[tuple[int, int]] = RESOLUTIONS,
+    songs: int = 100,
+    seed: int = 0,
+    font_path: str | None = None,
+):
+    """Writes a labeled corpus: <name>.png + <name>.json, plus db.json for the songs."""
+    os.makedirs(out_dir, exist_ok=True)
+    song_list, jackets = make_song_corpus(songs, seed=seed)
+    with open(os.path.join(out_dir, "db.json"), "w") as f:
+        json.dump(songs_to_db_json(song_list), f)
+
+    rng = random.Random(seed)
+    for i in range(count):
+        screen_type = "SELECT" if i % 2 else "RESULT"
+        size = sizes[i % len(sizes)]
+        img, truth = generate_screenshot(
+            screen_type, song_list, jackets, size, rng, font_path
+        )
+        # Otherwise the sample is scored through the other screen's pipeline
+        classified = ScreenshotAnalyzer.determine_screen_type(img)
+        if classified != screen_type:
+            raise AssertionError(
+                f"synthetic {screen_type} screen at {size[0]}x{size[1]} "
+                f"classifies as {classified}"
+            )
+        name = f"{i:05d}_{screen_type.lower()}_{size[0]}x{size[1]}"
+        img.save(os.path.join(out_dir, f"{name}.png"))
+        with open(os.path.join(out_dir, f"{name}.json"), "w") as f:
+            json.dump(truth, f, indent=2)
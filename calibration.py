@@ -0,0 +1,410 @@
+"""Maps ROI_CONFIG's 1920x1080 reference coordinates onto a capture.
+
+A plain full-screen 16:9 capture needs only a linear scale, which is what
+``Layout.linear`` gives. Window borders, letterboxing and non-16:9 captures
+shift the game area, so for those ``calibrate`` first finds the game's content
+box (uniform borders are trimmed, otherwise a centered 16:9 box is assumed)
+and then refines it with anchors: fixed UI elements whose reference crops are
+located by template matching, coarsely on a 4x downscaled search window and
+then at reference scale. The resulting layout is cached per capture size and
+source, so calibration runs once per capture setup and every later crop is a
+direct lookup.
+
+Anchors are recorded from a reference screenshot:
+    python -m calibration record shot.png select_speed
+    python -m calibration record shot.png result_judge_label --box 960,270,1100,300
+    python -m calibration show other_shot.png
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import weakref
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from ingest import open_image
+
+if getattr(sys, "frozen", False):
+    BASEDIR = os.path.dirname(sys.executable)
+else:
+    BASEDIR = os.path.dirname(os.path.abspath(__file__))
+ANCHORS_DIR = os.path.join(BASEDIR, "tables", "anchors")
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+USER_ANCHORS_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "anchors")
+
+REF_W, REF_H = 1920, 1080
+ASPECT_TOLERANCE = 0.01
+# Known fixed UI elements, by reference box; record templates for them with
+# `python -m calibration record`
+ANCHOR_BOXES = {
+    # SELECT
+    "select_speed": (30, 908, 119, 932),
+    "select_jacket_frame": (736, 42, 768, 74),  # top-left corner of the frame
+    # RESULT
+    "result_jacket_frame": (98, 169, 130, 201),
+}
+COARSE_FACTOR = 4
+SEARCH_MARGIN = 96  # reference pixels around the expected anchor position
+REFINE_RADIUS = COARSE_FACTOR
+MIN_CORRELATION = 0.8
+BORDER_TOLERANCE = 8
+BORDER_FRACTION = 0.9
+# Captures of one setup calibrated without any anchor matching before its
+# unanchored layout is cached anyway (the anchors may never show up in it)
+MAX_UNANCHORED_CALIBRATIONS = 8
+
+
+class Layout:
+    """Where the 1920x1080 reference frame sits in a capture."""
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        origin: tuple[float, float],
+        content_size: tuple[float, float],
+        anchors: tuple[str, ...] = (),
+    ):
+        self._size = size
+        self._origin = origin
+        self._content_size = content_size
+        self._anchors = anchors
+
+    @classmethod
+    def linear(cls, size: tuple[int, int]) -> Layout:
+        return cls(size, (0.0, 0.0), (float(size[0]), float(size[1])))
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def origin(self):
+        return self._origin
+
+    @property
+    def content_size(self):
+        return self._content_size
+
+    @property
+    def anchors(self):
+        """Names of the anchors the layout was fitted to."""
+        return self._anchors
+
+    @property
+    def scale(self) -> tuple[float, float]:
+        return self._content_size[0] / REF_W, self._content_size[1] / REF_H
+
+    def point(self, x: float, y: float) -> tuple[int, int]:
+        # Same arithmetic as the old ratio scaling, so linear layouts match it exactly
+        return (
+            int(round(self._origin[0] + self._content_size[0] * (x / REF_W))),
+            int(round(self._origin[1] + self._content_size[1] * (y / REF_H))),
+        )
+
+    def box(
+        self, coords: tuple[float, float, float, float]
+    ) -> tuple[int, int, int, int]:
+        return (*self.point(coords[0], coords[1]), *self.point(coords[2], coords[3]))
+
+    def ys(self, ys: np.ndarray) -> np.ndarray:
+        """Vectorized ``point`` for y coordinates."""
+        return np.rint(
+            self._origin[1] + self._content_size[1] * (np.asarray(ys) / REF_H)
+        ).astype(np.int64)
+
+    def __repr__(self):
+        return (
+            f"Layout(size={self._size}, origin={self._origin},"
+            f" content_size={self._content_size}, anchors={self._anchors})"
+        )
+
+
+def _is_16_9(width: float, height: float) -> bool:
+    return abs(width / height - REF_W / REF_H) <= ASPECT_TOLERANCE * REF_W / REF_H
+
+
+def _border_lines(gray: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    """Rows of ``gray`` that are almost entirely one of the border ``colors``.
+
+    Title bar text is tolerated; a flat game background of another shade is not.
+    """
+    median = np.median(gray, axis=1, keepdims=True)
+    uniform = (np.abs(gray - median) < BORDER_TOLERANCE).mean(axis=1)
+    matches = (np.abs(median - colors[None, :]) < BORDER_TOLERANCE).any(axis=1)
+    return (uniform >= BORDER_FRACTION) & matches
+
+
+def find_content_box(img: Image.Image) -> tuple[float, float, float, float]:
+    """(x, y, width, height) of the game area inside borders or letterboxing."""
+    width, height = img.size
+    step = max(1, width // 480)
+    gray = np.asarray(img.convert("L"), dtype=np.int16)
+    # Border colors are those of the capture's outermost rows and columns
+    colors = np.array(
+        [np.median(line) for line in (gray[0], gray[-1], gray[:, 0], gray[:, -1])]
+    )
+    # Every row and column is tested, each on a subsample of its pixels
+    rows = _border_lines(gray[:, ::step], colors)
+    cols = _border_lines(gray[::step, :].T, colors)
+
+    def inner(flat: np.ndarray) -> tuple[int, int]:
+        if flat.all():
+            return 0, len(flat)
+        return int(np.argmin(flat)), len(flat) - int(np.argmin(flat[::-1]))
+
+    y0, y1 = inner(rows)
+    x0, x1 = inner(cols)
+    box = (x0, y0, x1 - x0, y1 - y0)
+    if box[2] > 0 and box[3] > 0 and _is_16_9(box[2], box[3]):
+        return box
+    # No clean border: the game keeps its aspect ratio, centered
+    content_w = min(width, height * REF_W / REF_H)
+    content_h = content_w * REF_H / REF_W
+    return ((width - content_w) / 2, (height - content_h) / 2, content_w, content_h)
+
+
+def _correlate(region: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """Normalized cross-correlation of ``template`` at every offset in ``region``."""
+    t = template - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+    windows = sliding_window_view(region, template.shape)
+    n = template.size
+    sums = windows.sum(axis=(2, 3))
+    sq_sums = np.einsum("ijkl,ijkl->ij", windows, windows)
+    numerator = np.einsum("ijkl,kl->ij", windows, t)
+    variance = np.maximum(sq_sums - sums * sums / n, 1e-6)
+    return numerator / (np.sqrt(variance) * max(t_norm, 1e-6))
+
+
+def _to_reference(
+    img: Image.Image,
+    layout: Layout,
+    box: tuple[float, float, float, float],
+    factor: int,
+) -> np.ndarray:
+    """Grayscale crop of ``box`` (reference coords) resampled to reference scale / factor."""
+    crop = img.crop(layout.box(box)).convert("L")
+    size = (
+        max(1, round((box[2] - box[0]) / factor)),
+        max(1, round((box[3] - box[1]) / factor)),
+    )
+    return np.asarray(crop.resize(size, Image.Resampling.BILINEAR), dtype=np.float32)
+
+
+def locate_anchor(
+    img: Image.Image,
+    layout: Layout,
+    ref_box: tuple[int, int, int, int],
+    template: np.ndarray,
+) -> tuple[float, float, float] | None:
+    """Reference-frame (x, y) of the anchor's top-left corner and its correlation."""
+    x0, y0, x1, y1 = ref_box
+    w, h = x1 - x0, y1 - y0
+    search = (
+        x0 - SEARCH_MARGIN,
+        y0 - SEARCH_MARGIN,
+        x1 + SEARCH_MARGIN,
+        y1 + SEARCH_MARGIN,
+    )
+    coarse_template = np.asarray(
+        Image.fromarray(template.astype(np.uint8)).resize(
+            (max(1, w // COARSE_FACTOR), max(1, h // COARSE_FACTOR)),
+            Image.Resampling.BILINEAR,
+        ),
+        dtype=np.float32,
+    )
+    region = _to_reference(img, layout, search, COARSE_FACTOR)
+    if (
+        region.shape[0] < coarse_template.shape[0]
+        or region.shape[1] < coarse_template.shape[1]
+    ):
+        return None
+    scores = _correlate(region, coarse_template)
+    cy, cx = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    guess_x = search[0] + cx * COARSE_FACTOR
+    guess_y = search[1] + cy * COARSE_FACTOR
+
+    refine = (
+        guess_x - REFINE_RADIUS,
+        guess_y - REFINE_RADIUS,
+        guess_x + w + REFINE_RADIUS,
+        guess_y + h + REFINE_RADIUS,
+    )
+    region = _to_reference(img, layout, refine, 1)
+    if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]:
+        return None
+    scores = _correlate(region, template)
+    fy, fx = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return refine[0] + fx, refine[1] + fy, float(scores[fy, fx])
+
+
+def load_anchors() -> dict[str, tuple[tuple[int, int, int, int], np.ndarray]]:
+    """Recorded anchor templates (bundled, then user-recorded ones on top)."""
+    anchors = {}
+    for folder in (ANCHORS_DIR, USER_ANCHORS_DIR):
+        index_path = os.path.join(folder, "anchors.json")
+        if not os.path.isfile(index_path):
+            continue
+        with open(index_path, "r", encoding="utf-8") as f:
+            boxes = json.load(f)
+        for name, box in boxes.items():
+            with Image.open(os.path.join(folder, f"{name}.png")) as template:
+                anchors[name] = (
+                    tuple(box),
+                    np.asarray(template.convert("L"), dtype=np.float32),
+                )
+    return anchors
+
+
+def _fit_axis(
+    ref: np.ndarray, observed: np.ndarray, scale: float
+) -> tuple[float, float]:
+    """(scale, offset) with observed = scale * ref + offset; offset only if ref is degenerate."""
+    if len(ref) >= 2 and np.ptp(ref) > 0:
+        scale, offset = np.polyfit(ref, observed, 1)
+        return float(scale), float(offset)
+    return scale, float(np.mean(observed - scale * ref))
+
+
+def calibrate(img: Image.Image, anchors: dict | None = None) -> Layout:
+    """Fits a layout to one capture."""
+    anchors = load_anchors() if anchors is None else anchors
+    if not anchors and _is_16_9(*img.size):
+        return Layout.linear(img.size)
+    x, y, w, h = find_content_box(img)
+    layout = Layout(img.size, (x, y), (w, h))
+    if not anchors:
+        return layout
+
+    names, ref, observed = [], [], []
+    for name, (ref_box, template) in anchors.items():
+        found = locate_anchor(img, layout, ref_box, template)
+        if found is None or found[2] < MIN_CORRELATION:
+            continue
+        names.append(name)
+        ref.append(ref_box[:2])
+        # The match is in this layout's reference frame; map it to pixels
+        sx, sy = layout.scale
+        observed.append((x + found[0] * sx, y + found[1] * sy))
+    if not names:
+        return layout
+    ref, observed = np.array(ref, dtype=np.float64), np.array(observed)
+    sx, ox = _fit_axis(ref[:, 0], observed[:, 0], layout.scale[0])
+    sy, oy = _fit_axis(ref[:, 1], observed[:, 1], layout.scale[1])
+    return Layout(img.size, (ox, oy), (sx * REF_W, sy * REF_H), tuple(names))
+
+
+_layouts: dict[tuple[tuple[int, int], str], Layout] = {}
+# Layouts no anchor matched in yet (e.g. the first capture was a RESULT screen
+# and only SELECT anchors are recorded), with the capture they were fitted to
+_provisional: dict[tuple[tuple[int, int], str], tuple[weakref.ref, Layout]] = {}
+_unanchored: dict[tuple[tuple[int, int], str], int] = {}
+_anchors: dict | None = None
+_lock = threading.Lock()
+
+
+def cached_layout(size: tuple[int, int], source: str = "default") -> Layout | None:
+    """The layout ``get_layout`` settled on for this capture setup, if any yet."""
+    return _layouts.get((size, source))
+
+
+def get_layout(img: Image.Image, source: str = "default") -> Layout:
+    """Cached layout for captures of this size from this source.
+
+    A layout is cached once an anchor has matched, or right away when no
+    anchors are recorded. Until then each new capture is calibrated again,
+    so a setup whose first captures lack the anchors still gets fitted;
+    after MAX_UNANCHORED_CALIBRATIONS misses the unanchored fit is cached.
+    """
+    global _anchors
+    key = (img.size, source)
+    layout = _layouts.get(key)
+    if layout is not None:
+        return layout
+    provisional = _provisional.get(key)
+    if provisional is not None and provisional[0]() is img:
+        return provisional[1]
+    with _lock:
+        if _anchors is None:
+            _anchors = load_anchors()
+        anchors = _anchors
+    layout = calibrate(img, anchors)
+    with _lock:
+        attempts = _unanchored.get(key, 0) + 1
+        if layout.anchors or not anchors or attempts >= MAX_UNANCHORED_CALIBRATIONS:
+            _provisional.pop(key, None)
+            _unanchored.pop(key, None)
+            return _layouts.setdefault(key, layout)
+        _provisional[key] = (weakref.ref(img), layout)
+        _unanchored[key] = attempts
+        return layout
+
+
+def reset_layouts():
+    """Forgets cached layouts and anchors, e.g. after recording a new anchor."""
+    global _anchors
+    with _lock:
+        _layouts.clear()
+        _provisional.clear()
+        _unanchored.clear()
+        _anchors = None
+
+
+def record_anchor(
+    img: Image.Image,
+    name: str,
+    box: tuple[int, int, int, int],
+    folder: str = USER_ANCHORS_DIR,
+):
+    """Saves the reference-scale crop of ``box`` from a well-aligned capture."""
+    layout = calibrate(img, anchors={})
+    template = _to_reference(img, layout, box, 1)
+    os.makedirs(folder, exist_ok=True)
+    Image.fromarray(template.astype(np.uint8)).save(os.path.join(folder, f"{name}.png"))
+    index_path = os.path.join(folder, "anchors.json")
+    boxes = {}
+    if os.path.isfile(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            boxes = json.load(f)
+    boxes[name] = list(box)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(boxes, f, indent=2)
+    reset_layouts()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Record an anchor template")
+    record.add_argument("screenshot")
+    record.add_argument("name")
+    record.add_argument("--box", help="x0,y0,x1,y1 in 1920x1080 reference pixels")
+    record.add_argument("--folder", default=USER_ANCHORS_DIR)
+    show = commands.add_parser("show", help="Print the layout fitted to a capture")
+    show.add_argument("screenshot")
+    args = parser.parse_args(argv)
+
+    img = open_image(args.screenshot)
+    if args.command == "record":
+        if args.box:
+            box = tuple(int(v) for v in args.box.split(","))
+        elif args.name in ANCHOR_BOXES:
+            box = ANCHOR_BOXES[args.name]
+        else:
+            parser.error(f"unknown anchor {args.name}; pass --box")
+        record_anchor(img, args.name, box, args.folder)
+        print(f"Recorded {args.name} {box} in {args.folder}")
+    else:
+        print(calibrate(img))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""Headless entry point: analyzes screenshots without the Tk client.
+
+Runs anywhere Tesseract is installed (found through TESSERACT_CMD, the
+bundled tesseract.exe or PATH). Songs come from a db.json cache file, or are
+fetched from the server when there is none.
+
+Usage:
+    platina-archive analyze shot.png screenshots/ --out results.jsonl
+    platina-archive analyze screenshots/ --songs db.json --workers 8 --dedup
+    platina-archive video recording.mp4 --songs db.json
+    platina-archive rederive --dry-run
+    platina-archive correct shot.png select_level 14
+    platina-archive serve --songs db.json --workers 4
+
+From a source checkout use ``python -m cli`` instead of ``platina-archive``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from analyzer import (
+    CACHED_DB_PATH,
+    TABLE_SOURCES,
+    ScreenshotAnalyzer,
+    fetch_songs,
+    find_tesseract,
+    load_cached_songs,
+)
+from models import AnalysisReport, Song
+from recalc import find_inconsistent_reports, rederive_archive
+from session import ResultSession, list_screenshots, play_key
+from songindex import SongIndex, publish_song_index
+from video import DEFAULT_SAMPLE_FPS, ingest
+
+
+def load_songs(songs_path: str | None = None) -> list[Song]:
+    """Songs from ``songs_path``, else the client's cache, else the server."""
+    if songs_path:
+        return load_cached_songs(songs_path)
+    if os.path.isfile(CACHED_DB_PATH):
+        return load_cached_songs(CACHED_DB_PATH)
+    return fetch_songs()
+
+
+def expand_paths(paths: Iterable[str]) -> list[str]:
+    """Screenshot files, with directories expanded to the images they contain."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded += list_screenshots(path)
+        else:
+            expanded.append(path)
+    return expanded
+
+
+_worker_analyzer: ScreenshotAnalyzer | None = None
+
+
+def _init_worker(
+    songs: list[Song] | str, tesseract_cmd: str | None, dump_dir: str | None = None
+):
+    """``songs`` is a song list or the path of a published song index."""
+    global _worker_analyzer
+    if isinstance(songs, str):
+        songs = SongIndex.open(songs)
+    _worker_analyzer = ScreenshotAnalyzer(songs, tesseract_cmd, dump_dir)
+
+
+def _analyze_path(path: str) -> tuple[str, AnalysisReport | None, str | None]:
+    try:
+        img = _worker_analyzer.load_image(path)
+        if img is None:
+            return path, None, "file not found"
+        dump_name = os.path.splitext(os.path.basename(path))[0]
+        return path, _worker_analyzer.analyze_image(img, dump_name), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def analyze_files(
+    paths: Iterable[str],
+    songs: list[Song],
+    workers: int = 1,
+    tesseract_cmd: str | None = None,
+    dump_dir: str | None = None,
+) -> Iterator[tuple[str, AnalysisReport | None, str | None]]:
+    """Analyzes screenshots in order, yielding (path, report, error) for each one."""
+    paths = list(paths)
+    if workers <= 1:
+        _init_worker(songs, tesseract_cmd, dump_dir)
+        yield from map(_analyze_path, paths)
+        return
+    # Workers map one shared index instead of each unpickling the song list
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(publish_song_index(songs), tesseract_cmd, dump_dir),
+    ) as pool:
+        yield from pool.map(_analyze_path, paths, chunksize=4)
+
+
+def report_to_json(report: AnalysisReport) -> dict:
+    return {
+        **report.json(),
+        "title": report.song.title,
+        "rank": report.rank,
+        "screen_type": report.screen_type,
+        "match_distance": report.match_distance,
+        "match_margin": report.match_margin,
+        "confidence": report.confidence,
+    }
+
+
+def cmd_analyze(args) -> int:
+    if not (args.tesseract or find_tesseract()):
+        print("Error: tesseract not found (set TESSERACT_CMD)", file=sys.stderr)
+        return 2
+    paths = expand_paths(args.paths)
+    songs = load_songs(args.songs)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    session = ResultSession()
+    plays: dict[tuple, dict] = {}
+    analyzed: dict[str, AnalysisReport] = {}
+    failed = 0
+    try:
+        results = analyze_files(
+            paths, songs, args.workers, args.tesseract, args.dump_crops
+        )
+        for path, report, error in results:
+            if report is not None:
+                analyzed[path] = report
+            if error:
+                failed += 1
+                record = {"path": path, "error": error}
+            elif args.dedup:
+                # Printed once at the end, with every capture of the play merged
+                report, _ = session.add(report)
+                plays.setdefault(play_key(report), {"path": path})
+                plays[play_key(report)].update(report_to_json(report))
+                continue
+            else:
+                record = {"path": path, **report_to_json(report)}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        for record in plays.values():
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(paths) - failed}/{len(paths)} screenshots analyzed", file=sys.stderr)
+    # One vectorized check over the batch instead of one per screenshot
+    inconsistent = set(map(id, find_inconsistent_reports(analyzed.values())))
+    for path, report in analyzed.items():
+        if id(report) in inconsistent:
+            print(
+                f"Warning: {path}: rank {report.rank} / P.A.T.C.H. {report.patch}"
+                f" disagree with judge {report.judge}%",
+                file=sys.stderr,
+            )
+    return 1 if failed else 0
+
+
+def cmd_video(args) -> int:
+    songs_path = args.songs or CACHED_DB_PATH
+    plays, errors = ingest(args.source, songs_path, args.workers, args.sample_fps)
+    for seconds, error in errors:
+        print(f"Error: frame at {seconds:.2f}s: {error}", file=sys.stderr)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for seconds, report in plays:
+            record = {"seconds": round(seconds, 2), **report_to_json(report)}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(plays)} plays found", file=sys.stderr)
+    return 0
+
+
+def cmd_rederive(args) -> int:
+    from archive_db import ArchiveStore, archive_path
+
+    path = args.archive
+    if not path:
+        from credentials import load_api_key
+
+        api_key = load_api_key()
+        if not api_key:
+            print("Error: no API key; pass --archive", file=sys.stderr)
+            return 2
+        path = archive_path(api_key)
+    if not os.path.isfile(path):
+        print(f"Error: no local archive at {path}", file=sys.stderr)
+        return 2
+    store = ArchiveStore(path)
+    try:
+        records = store.best_records()
+        changes = rederive_archive(records)
+        for key, patch in changes.items():
+            record = {"chart_key": key, "patch": records[key].patch, "new_patch": patch}
+            print(json.dumps(record, ensure_ascii=False))
+        if not args.dry_run:
+            store.update_patches(changes)
+    finally:
+        store.close()
+    action = "would change" if args.dry_run else "changed"
+    print(f"{len(changes)}/{len(records)} records {action}", file=sys.stderr)
+    return 0
+
+
+def cmd_correct(args) -> int:
+    if not (args.tesseract or find_tesseract()):
+        print("Error: tesseract not found (set TESSERACT_CMD)", file=sys.stderr)
+        return 2
+    analyzer = ScreenshotAnalyzer(load_songs(args.songs), args.tesseract)
+    img = analyzer.load_image(args.screenshot)
+    if img is None:
+        print(f"Error: {args.screenshot}: file not found", file=sys.stderr)
+        return 2
+    report = analyzer.analyze_image(img)
+    if not analyzer.confirm_correction(report, args.field, args.value):
+        print(
+            f"Error: {args.screenshot} has no {args.field} crop"
+            f" (read as a {report.screen_type} screen)",
+            file=sys.stderr,
+        )
+        return 1
+    print(
+        f"{args.field} = {args.value} learned from {args.screenshot}", file=sys.stderr
+    )
+    return 0
+
+
+def cmd_serve(args) -> int:
+    from server import serve
+
+    serve(
+        args.songs, args.host, args.port, args.workers, args.max_pending, args.tesseract
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    from server import add_arguments as add_serve_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="platina-archive", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="Analyze screenshots to JSON lines")
+    analyze.add_argument("paths", nargs="+", help="Screenshot files or folders")
+    analyze.add_argument("--songs", help="db.json with songs (default: client cache)")
+    analyze.add_argument("--workers", type=int, default=1)
+    analyze.add_argument("--tesseract", help="Path to the tesseract binary")
+    analyze.add_argument("--out", help="Write JSON lines to this file")
+    analyze.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Merge captures of the same play and print each play once",
+    )
+    analyze.add_argument(
+        "--dump-crops",
+        metavar="DIR",
+        help="Save every ROI crop per screenshot for `python -m replay`",
+    )
+    analyze.set_defaults(func=cmd_analyze)
+
+    video = commands.add_parser("video", help="Find plays in a recording")
+    video.add_argument("source", help="Video file or folder of extracted frames")
+    video.add_argument("--songs", help="db.json with songs (default: client cache)")
+    video.add_argument("--workers", type=int, default=os.cpu_count())
+    video.add_argument("--sample-fps", type=float, default=DEFAULT_SAMPLE_FPS)
+    video.add_argument("--out", help="Write JSON lines to this file")
+    video.set_defaults(func=cmd_video)
+
+    rederive = commands.add_parser(
+        "rederive",
+        help="Recompute P.A.T.C.H. of every record in the local archive",
+    )
+    rederive.add_argument(
+        "--archive", help="Archive database (default: the logged-in account's)"
+    )
+    rederive.add_argument(
+        "--dry-run", action="store_true", help="Only print what would change"
+    )
+    rederive.set_defaults(func=cmd_rederive)
+
+    correct = commands.add_parser(
+        "correct", help="Teach a lookup table the right value of a misread field"
+    )
+    correct.add_argument("screenshot", help="Screenshot with the misread field")
+    correct.add_argument("field", choices=sorted(TABLE_SOURCES))
+    correct.add_argument("value", type=int, help="The value shown on the screen")
+    correct.add_argument("--songs", help="db.json with songs (default: client cache)")
+    correct.add_argument("--tesseract", help="Path to the tesseract binary")
+    correct.set_defaults(func=cmd_correct)
+
+    serve = commands.add_parser("serve", help="Run the local HTTP analysis service")
+    add_serve_arguments(serve)
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
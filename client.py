@@ -4,24 +4,24 @@ import math
 import sys
 import os
 import threading
-import time
 import tkinter as tk
 from datetime import datetime, timezone
-from tkinter import messagebox, ttk
-
-import requests
-from PIL import Image, ImageTk
-from pynput import keyboard
-
-from analyzer import (
-    ScreenshotAnalyzer,
-    fetch_archive,
-    fetch_songs,
-    fetch_latest_client_version,
-    version_to_string,
-)
+from tkinter import filedialog, messagebox, simpledialog, ttk
+
+from PIL import ImageTk
+
+# Heavy modules (analyzer -> pytesseract/numpy, requests, pynput) are
+# imported on background threads once the window is up, see _load_in_background
+# and net.NetworkLoop.
+from archive_db import ArchiveStore, archive_path, record_from_report
+from instrumentation import METRICS
+from log_panel import LogBuffer, LogPanel
 from login import RegisterWindow, _check_local_key, load_key_from_file
 from models import AnalysisReport, DecodeResult
+from net import NetworkLoop, UiQueue
+from session import ResultSession, list_screenshots
+from thumbnails import jacket_variant
+from version import version_to_string
 
 VERSION = (0, 2, 5)
 current_version_str = version_to_string(VERSION)
@@ -29,6 +29,10 @@ if getattr(sys, "frozen", False):
     BASEDIR = os.path.dirname(sys.executable)
 else:
     BASEDIR = os.path.dirname(os.path.abspath(__file__))
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+DIAGNOSTICS_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "diagnostics")
+LOG_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "logs")
+MAX_JACKET_PHOTOS = 32
 
 
 class PlatinaArchiveClient:
@@ -46,12 +50,21 @@ class PlatinaArchiveClient:
         app.configure(bg="#E0E0E0")
         app.protocol("WM_DELETE_WINDOW", self._on_close)
 
-        self.hotkey_listener = self._setup_global_hotkey()
-        self.hotkey_listener.start()
+        self.hotkey_listener = None
         self.analyzer = None
-        self.archive = None
+        # Report on screen; its crop hashes back "Correct level"
+        self.displayed_report: AnalysisReport | None = None
+        # Network results and worker-thread UI updates reach Tk through this queue
+        self.ui = UiQueue(app)
+        self.net = NetworkLoop(self.ui.post, self._on_network_error)
+        self.session = ResultSession()
+        self._jacket_photos: dict[tuple[int, str], ImageTk.PhotoImage] = {}
         self.decoder_name = None
         self.api_key = _check_local_key() or load_key_from_file()
+        # Local copy: comparisons work before (and without) the server sync
+        self.archive = (
+            ArchiveStore(archive_path(self.api_key)) if self.api_key else None
+        )
 
         self.top_frame = ttk.Frame(app, style="Top.TFrame")
         self.top_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
@@ -115,19 +128,10 @@ class PlatinaArchiveClient:
         self.log_frame = ttk.Frame(app, style="Log.TFrame")
         self.log_frame.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        self.log_text = tk.Text(
-            self.log_frame,
-            wrap=tk.WORD,
-            height=10,
-            font=("Roboto", 9),
-            bg="#F0F0F0",
-            fg="black",
+        os.makedirs(LOG_DIR, exist_ok=True)
+        self.log_panel = LogPanel(
+            self.log_frame, LogBuffer(log_path=os.path.join(LOG_DIR, "client.log"))
         )
-        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        self.log_scrollbar = ttk.Scrollbar(self.log_frame, command=self.log_text.yview)
-        self.log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.log_text.config(yscrollcommand=self.log_scrollbar.set)
 
         # --- Button for Triggering Analysis ---
         self.analyze_button = ttk.Button(
@@ -144,35 +148,90 @@ class PlatinaArchiveClient:
             app, text="Reload song DB", command=self.load_db
         )
         self.reload_db_button.pack(side=tk.BOTTOM, pady=5)
-        latest_version = fetch_latest_client_version()
-        if latest_version > VERSION:
-            latest_version_str = version_to_string(latest_version)
-            self.log_message(
-                f"새로운 클라이언트 버전이 탐지되었습니다, 업데이트를 권장드립니다. ({current_version_str} -> {latest_version_str})"
-            )
-        else:
-            self.log_message("클라이언트가 최신 버전입니다.")
+
+        # --- Button for importing a folder of screenshots ---
+        self.import_button = ttk.Button(
+            app, text="Import screenshot folder", command=self.import_folder
+        )
+        self.import_button.pack(side=tk.BOTTOM, pady=5)
+
+        # --- Button for analyzer diagnostics ---
+        self.diagnostics_button = ttk.Button(
+            app, text="Diagnostics", command=self.show_diagnostics
+        )
+        self.diagnostics_button.pack(side=tk.BOTTOM, pady=5)
+
+        # --- Button for teaching the level table a misread level ---
+        self.correct_button = ttk.Button(
+            app, text="Correct level", command=self.correct_level
+        )
+        self.correct_button.pack(side=tk.BOTTOM, pady=5)
 
         if not self.api_key:
             messagebox.showinfo(
                 "플라티나 아카이브 등록",
                 "새로운 디코더를 발견 했습니다, 이름과 비밀번호를 설정해주세요.",
             )
-            RegisterWindow(self.app, self._handle_successful_register)
+            RegisterWindow(self.app, self._handle_successful_register, self.net)
         else:
             self.decoder_name = self.api_key.split("::")[0]
             self.log_message(f"{self.decoder_name}님, 환영합니다.")
-            self.archive = fetch_archive(self.api_key)
+
+        # Let the window paint first; everything slow happens on a worker
+        thread = threading.Thread(target=self._load_in_background)
+        thread.daemon = True
+        thread.start()
+
+    def _load_in_background(self):
+        """Imports the analysis stack off the Tk thread and starts the startup network calls"""
+        # The version check, archive sync and song fetch run concurrently;
+        # their failures reach _on_network_error, not this thread
+        self.net.submit(
+            self.net.fetch_latest_client_version(), on_done=self._on_client_version
+        )
+        if self.api_key:
+            self.net.submit(self._sync_archive())
         self.load_db()
 
+        try:
+            listener = self._setup_global_hotkey()
+        except Exception as e:
+            self.log_message(f"Alt+Insert 단축키를 등록하지 못했습니다: {e}")
+            return
+        # _on_close reads the listener on the Tk thread, so it is set there
+        self.ui.post(self._start_hotkey_listener, listener)
+
+    def _start_hotkey_listener(self, listener):
+        self.hotkey_listener = listener
+        self.hotkey_listener.start()
+
+    def _on_client_version(self, latest_version: tuple[int, int, int]):
+        if latest_version > VERSION:
+            latest_version_str = version_to_string(latest_version)
+            self.log_message(
+                f"새로운 클라이언트 버전이 탐지되었습니다, 업데이트를 권장드립니다. ({current_version_str} -> {latest_version_str})"
+            )
+        else:
+            self.log_message("클라이언트가 최신 버전입니다.")
+
+    def _on_network_error(self, error: BaseException):
+        self.log_message(f"서버와 통신하지 못했습니다: {error}")
+
+    async def _sync_archive(self):
+        archive = await self.net.fetch_archive(self.api_key)
+        await self.net.run_blocking(self.archive.merge_archive, archive)
+
     def _handle_successful_register(self, name: str, api_key: str):
         self.decoder_name = name
         self.api_key = api_key
-        self.archive = fetch_archive(self.api_key)
+        self.archive = ArchiveStore(archive_path(api_key))
         self.log_message(f"등록 성공. 환영합니다, {name}님.")
+        self.net.submit(self._sync_archive())
 
     def _setup_global_hotkey(self):
         """Setup the global hotkey <Alt+Insert>"""
+        from pynput import keyboard
+
         hotkeys = {"<alt>+<insert>": self.run_analysis_thread}
         return keyboard.GlobalHotKeys(hotkeys)
 
@@ -188,34 +247,131 @@ class PlatinaArchiveClient:
     def _execute_analysis(self):
         """Run the analysis"""
         self.log_message("Hotkey detected...")
-        report = self.analyzer.extract_info()
-        self.app.after(
-            0, self.update_display, report
-        )  # Use tkinter's after method to ensure display update is on the main thread
+        report = self._analyze_clipboard(self.log_message)
+        if report:
+            # Widgets may only be touched from the Tk thread
+            self.ui.post(self.update_display, report)
+
+    def _analyze_clipboard(self, log) -> AnalysisReport | None:
+        """Analyzes the clipboard image, skipping captures of an already seen play"""
+        if not self.analyzer:
+            log("곡 데이터를 불러오는 중입니다. 잠시 후 다시 시도해주세요.")
+            return None
+        img = self.analyzer.load_image()
+        if img is None:
+            log("클립보드에 이미지가 없습니다.")
+            return None
+        if self.session.seen_image(img):
+            log("이미 분석한 스크린샷입니다.")
+            return None
+        report, changed = self.session.add(self.analyzer.analyze_image(img))
+        if not changed:
+            log(
+                f"이미 분석한 기록입니다: {report.song.title} {report.line}L {report.difficulty} Lv.{report.level}"
+            )
+            return None
+        return report
+
+    def import_folder(self):
+        """Analyzes every screenshot in a folder and reports each play once"""
+        if not self.analyzer:
+            self.log_message("곡 데이터를 불러오는 중입니다. 잠시 후 다시 시도해주세요.")
+            return
+        folder = filedialog.askdirectory(parent=self.app)
+        if not folder:
+            return
+        thread = threading.Thread(target=self._import_folder_worker, args=(folder,))
+        thread.daemon = True
+        thread.start()
+
+    def _import_folder_worker(self, folder: str):
+        paths = list_screenshots(folder)
+        self.log_message(f"스크린샷 {len(paths)}개 분석 중...")
+        reports, errors, inconsistent = self.session.import_images(
+            self.analyzer, paths
+        )
+        for path, error in errors:
+            self.log_message(f"분석 실패: {os.path.basename(path)} ({error})")
+        for report in inconsistent:
+            self.log_message(
+                f"판정과 랭크/P.A.T.C.H.가 맞지 않습니다. 확인해주세요: {report.song.title} {report.line}L {report.difficulty} Lv.{report.level}"
+            )
+        self.log_message(
+            f"스크린샷 {len(paths)}개에서 기록 {len(reports)}개를 찾았습니다."
+        )
+        # One transaction for the whole folder instead of one per play
+        archive = self.archive
+        if archive:
+            archive.add_history(record_from_report(report) for report in reports)
+        for report in reports:
+            self.ui.post(self.update_display, report, False)
 
     def load_db(self):
-        # Fetch song data
-        song_data = None
-        while not song_data:
-            try:
-                song_data = fetch_songs()
-            except:
-                time.sleep(0.5)  # Try again after 0.5s
+        self.net.submit(self._load_db())
+
+    async def _load_db(self):
+        from analyzer import ScreenshotAnalyzer
+
+        song_data = await self.net.fetch_songs_until_loaded()
+        self.analyzer = await self.net.run_blocking(ScreenshotAnalyzer, song_data)
         self.log_message(f"곡 데이터 {len(song_data)}개 로딩 완료")
-        self.analyzer = ScreenshotAnalyzer(song_data)
 
     def log_message(self, msg):
-        now = datetime.now()
-        structured_time = f"[{now.hour:02d}:{now.minute:02d}:{now.second:02d}] "
-        self.log_text.insert(tk.END, structured_time + msg + "\n")
-        self.log_text.see(tk.END)
-
-    def update_display(self, report: AnalysisReport):
-        # Size: 400x400
-        resized_jacket_image = report.jacket_image.resize(
-            (200, 200), Image.Resampling.LANCZOS
+        """Thread-safe; the log panel picks the line up on its next flush"""
+        self.log_panel.log(msg)
+
+    def show_diagnostics(self):
+        """Shows the analyzer instrumentation in the log and saves it as JSON"""
+        if not METRICS.enabled:
+            METRICS.enabled = True
+            self.log_message(
+                "진단 정보 수집을 시작합니다. 분석 후 다시 누르면 결과를 표시합니다."
+            )
+            return
+        self.log_message("--- Diagnostics ---")
+        for line in METRICS.summary_lines():
+            self.log_message(line)
+        path = os.path.join(
+            DIAGNOSTICS_DIR, f"diagnostics-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        METRICS.export_json(path)
+        self.log_message(f"진단 정보 저장: {path}")
+
+    def correct_level(self):
+        """Teaches the level tables the right level of the report on screen"""
+        report = self.displayed_report
+        hashes = report.crop_hashes if report else {}
+        fields = [f for f in ("select_level", "result_level") if f in hashes]
+        if not fields or not self.analyzer:
+            self.log_message("수정할 레벨이 없습니다. 먼저 스크린샷을 분석해주세요.")
+            return
+        level = simpledialog.askinteger(
+            "레벨 수정",
+            f"{report.song.title}의 올바른 레벨을 입력해주세요.",
+            parent=self.app,
+            initialvalue=report.level,
+            minvalue=1,
         )
-        self.jacket_photo = ImageTk.PhotoImage(resized_jacket_image)
+        if level is None:
+            return
+        for field in fields:
+            self.analyzer.confirm_correction(report, field, level)
+        self.log_message(f"레벨 {level}을(를) 학습했습니다. 다음 분석부터 적용됩니다.")
+
+    def _jacket_photo(self, report: AnalysisReport) -> ImageTk.PhotoImage:
+        """PhotoImage for the report's thumbnail (already sized by the analyzer)"""
+        key = (report.song.id, jacket_variant(report.difficulty))
+        photo = self._jacket_photos.pop(key, None)
+        if photo is None:
+            photo = ImageTk.PhotoImage(report.jacket_image)
+        self._jacket_photos[key] = photo  # most recently used last
+        if len(self._jacket_photos) > MAX_JACKET_PHOTOS:
+            del self._jacket_photos[next(iter(self._jacket_photos))]
+        return photo
+
+    def update_display(self, report: AnalysisReport, record_history: bool = True):
+        self.displayed_report = report
+        self.jacket_photo = self._jacket_photo(report)
         self.jacket_canvas.delete("all")
         self.jacket_canvas.create_image(0, 0, image=self.jacket_photo, anchor=tk.NW)
 
@@ -243,6 +399,12 @@ class PlatinaArchiveClient:
             self.log_message(
                 f"Warning: Jacket match distance {report.match_distance} is high. Result might be uncertain."
             )
+        from analyzer import RERANK_MARGIN
+
+        if report.match_margin is not None and report.match_margin <= RERANK_MARGIN:
+            self.log_message(
+                f"Warning: Another song's jacket is within {report.match_margin} of this match. Result might be uncertain."
+            )
         # Do sanity check for ocr-read level
         if not report.level in report.song.get_available_levels(
             report.line, report.difficulty
@@ -251,25 +413,30 @@ class PlatinaArchiveClient:
                 f"Warning: Level {report.level} is NOT registered on DB. Result might be uncertain."
             )
 
-        # Compare to user's archive
-        archive_key = (
-            f"{report.song.id}|{report.line}|{report.difficulty}|{report.level}"
-        )
+        if not self.archive:
+            # Not registered yet: there is no archive to record or compare with
+            self.log_message("디코더 등록 후 기록을 저장하고 비교할 수 있습니다.")
+            return
+
         utc_now = datetime.now(timezone.utc)
-        existing_archive = self.archive.get(
-            archive_key,
-            DecodeResult(
-                report.song.id,
-                report.line,
-                report.difficulty,
-                report.level,
-                0.0,
-                0,
-                0.0,
-                utc_now,
-                False,
-                False,
-            ),
+        if record_history:
+            self.archive.add_history([record_from_report(report, utc_now)])
+        self.log_message(
+            f"이 채보의 {self.archive.play_count(report.chart_key)}번째 기록입니다."
+        )
+
+        # Compare to user's archive
+        existing_archive = self.archive.get(report.chart_key) or DecodeResult(
+            report.song.id,
+            report.line,
+            report.difficulty,
+            report.level,
+            0.0,
+            0,
+            0.0,
+            utc_now,
+            False,
+            False,
         )
         if report.judge > existing_archive.judge:
             self.log_higher_score_and_report(report, existing_archive)
@@ -342,49 +509,43 @@ class PlatinaArchiveClient:
             theoretical_perfect_high = math.ceil(new_archive.total_notes * 0.98)
             need_perfect_high = theoretical_perfect_high - new_archive.perfect_high
             self.log_message(f"패론치까지 단 {need_perfect_high}개!")
-        # report higher score to the server
-        update_archive_endpoint = (
-            "https://www.platina-archive.app/api/v1/update_archive"
-        )
-        headers = {
-            "X-API-Key": self.api_key,
-            "Content-Type": "application/json",
-        }
-        requests.post(update_archive_endpoint, json=new_archive.json(), headers=headers)
-        # update internal archive
-        archive_key = f"{new_archive.song.id}|{new_archive.line}|{new_archive.difficulty}|{new_archive.level}"
-        internal_archive = self.archive.get(
-            archive_key,
-            DecodeResult(
-                new_archive.song.id,
-                new_archive.line,
-                new_archive.difficulty,
-                new_archive.level,
-                0.0,
-                0,
-                0.0,
-                datetime.now(timezone.utc),
-                False,
-                False,
-            ),
-        )
-        internal_archive.judge = new_archive.judge
-        internal_archive.score = new_archive.score
-        internal_archive.patch = new_archive.patch
-        internal_archive.decoded_at = datetime.now(timezone.utc)
-        internal_archive.is_full_combo = new_archive.is_full_combo
-        internal_archive.is_max_patch = new_archive.is_maximum_patch
-        self.archive[archive_key] = internal_archive
+        # report higher score to the server, off the Tk thread
+        if self.session.needs_upload(new_archive):
+            self.net.queue_upload(
+                self.api_key,
+                new_archive.json(),
+                on_done=lambda _: self._on_uploaded(new_archive),
+                on_error=self._on_upload_error,
+            )
+        else:
+            # update local archive
+            self.archive.put(record_from_report(new_archive))
+
+    def _on_uploaded(self, report: AnalysisReport):
+        """Records an upload the server accepted; a failed one stays eligible for retry"""
+        self.session.mark_uploaded(report)
+        if self.archive:
+            self.archive.put(record_from_report(report))
+
+    def _on_upload_error(self, error: BaseException):
+        self.log_message(f"기록을 서버에 업로드하지 못했습니다: {error}")
 
     def _on_close(self):
-        """Stops the global hotkey listener and closes the app"""
-        self.hotkey_listener.stop()
+        """Stops the global hotkey listener, cancels network work and closes the app"""
+        if self.hotkey_listener:
+            self.hotkey_listener.stop()
+        self.net.close()
+        self.ui.stop()
+        self.log_panel.stop()
+        if self.archive:
+            self.archive.close()
         self.app.destroy()
 
     def run_analysis(self, event=None):
         self.log_message("Reading clipboard for image...")
-        report = self.analyzer.extract_info()
-        self.update_display(report)
+        report = self._analyze_clipboard(self.log_message)
+        if report:
+            self.update_display(report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+"""Keeps test runs away from the user's PLATiNA-ARCHiVE folder.
+
+Modules read APPDATA at import time, so it is redirected before any of them
+is imported. Living at the repository root also puts the flat modules on
+``sys.path`` for plain ``pytest`` runs.
+"""
+
+import os
+import tempfile
+
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="platina-tests-")
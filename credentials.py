@@ -0,0 +1,70 @@
+"""API key storage, independent of the GUI.
+
+The keyring backend is pluggable: set ``PLATINA_KEYRING`` to a backend class
+path (e.g. ``keyring.backends.SecretService.Keyring``) or to ``env`` to read the
+key from ``PLATINA_API_KEY`` only, which suits headless workers. Without it the
+Windows credential vault is used on Windows and keyring's own default elsewhere.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+
+import keyring
+from keyring.errors import KeyringError
+
+KEYRING_SERVICE_ID = "PlatinaArchiveClient"
+KEY_FILE = "platina.key"
+
+if getattr(sys, "frozen", False):
+    base_dir = os.path.dirname(sys.executable)
+else:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def configure_keyring(backend: str | None = None):
+    """Selects the keyring backend; ``backend`` overrides PLATINA_KEYRING."""
+    backend = backend or os.environ.get("PLATINA_KEYRING")
+    if backend == "env":
+        from keyring.backends import fail
+
+        keyring.set_keyring(fail.Keyring())
+    elif backend:
+        module_name, class_name = backend.rsplit(".", 1)
+        keyring.set_keyring(getattr(importlib.import_module(module_name), class_name)())
+    elif sys.platform == "win32":
+        from keyring.backends import Windows
+
+        keyring.set_keyring(Windows.WinVaultKeyring())
+
+
+def save_api_key(api_key: str):
+    keyring.set_password(KEYRING_SERVICE_ID, "main_api_key", api_key)
+
+
+def load_api_key() -> str | None:
+    """PLATINA_API_KEY if set, else the key stored in the keyring."""
+    api_key = os.environ.get("PLATINA_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        return keyring.get_password(KEYRING_SERVICE_ID, "main_api_key")
+    except KeyringError:
+        return None
+
+
+def load_key_from_file():
+    key_path = os.path.join(base_dir, KEY_FILE)
+    if not os.path.isfile(key_path):
+        return None
+    with open(key_path, "r") as f:
+        api_key = f.read().strip()
+
+    os.remove(key_path)
+    save_api_key(api_key)
+    return api_key
+
+
+configure_keyring()
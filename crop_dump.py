@@ -0,0 +1,93 @@
+"""Per-screenshot archives of every ROI crop, for offline OCR tuning.
+
+With ``ScreenshotAnalyzer(dump_dir=...)`` each analysis writes one compressed
+``.npz`` holding the raw and preprocessed crop of every field plus a JSON
+record of how each was read (OCR function or lookup table, preprocessing
+options, value and confidence). ``replay.py`` re-runs recognition on those crops without
+decoding or classifying full screenshots again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+META_KEY = "meta"
+
+
+def array_key(screen_type: str, config_key: str, kind: str) -> str:
+    return f"{screen_type}.{config_key}.{kind}"
+
+
+class CropDump:
+    """Crops and readings collected during one analysis."""
+
+    def __init__(self):
+        self._arrays: dict[str, np.ndarray] = {}
+        self._fields: dict[str, dict] = {}
+
+    @property
+    def fields(self):
+        return self._fields
+
+    def add(
+        self,
+        screen_type: str,
+        config_key: str,
+        raw: Image.Image,
+        preprocessed: Image.Image | None = None,
+        ocr_func: str | None = None,
+        kwargs: dict | None = None,
+        value=None,
+        confidence: float | None = None,
+    ):
+        """Records a field's first reading; re-reads of the same field are ignored."""
+        name = f"{screen_type}.{config_key}"
+        if name in self._fields:
+            return
+        self._arrays[array_key(screen_type, config_key, "raw")] = np.asarray(raw)
+        if preprocessed is not None:
+            self._arrays[array_key(screen_type, config_key, "pre")] = np.asarray(
+                preprocessed
+            )
+        self._fields[name] = {
+            "screen_type": screen_type,
+            "config_key": config_key,
+            "ocr_func": ocr_func,
+            "kwargs": kwargs or {},
+            "value": value,
+            "confidence": confidence,
+        }
+
+    def record_match(self, screen_type: str, config_key: str, table: str, value):
+        """Notes that a raw crop was read by matching its pHash against ``table``."""
+        field = self._fields.get(f"{screen_type}.{config_key}")
+        if field is not None:
+            field.update(table=table, value=value)
+
+    def save(self, path: str, **meta):
+        meta = {**meta, "fields": self._fields}
+        np.savez_compressed(
+            path,
+            **self._arrays,
+            **{META_KEY: np.array(json.dumps(meta, ensure_ascii=False, default=str))},
+        )
+
+
+def load_dump(path: str) -> tuple[dict, dict[str, np.ndarray]]:
+    """(metadata, crop arrays) of a dump written by CropDump.save."""
+    with np.load(path) as data:
+        meta = json.loads(str(data[META_KEY]))
+        arrays = {key: data[key] for key in data.files if key != META_KEY}
+    return meta, arrays
+
+
+def list_dumps(folder: str) -> list[str]:
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.endswith(".npz")
+    )
@@ -0,0 +1,227 @@
+"""Compact jacket descriptors for re-ranking ambiguous pHash matches.
+
+A 64-bit pHash only keeps the sign of 64 low-frequency coefficients, so
+similar album art, PLUS jacket variants and compression artifacts can leave
+several songs within a few bits of a capture. The descriptor here keeps the
+coefficients themselves at two scales plus a coarse color histogram, as one
+L2-normalized float32 vector, so similarity is a single dot product.
+
+The server only publishes pHashes, so descriptors are learned: whenever a
+jacket matches one song unambiguously its descriptor is stored under
+``(song_id, variant)`` and persisted next to the user lookup tables. Later
+captures whose pHash match is ambiguous are re-ranked among the closest
+candidates that have a descriptor.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Literal
+
+import numpy as np
+from PIL import Image
+
+from lookup import USER_TABLES_DIR
+from phash import _dct_basis
+
+EMBEDDINGS_PATH = os.path.join(USER_TABLES_DIR, "jacket_embeddings.npz")
+
+DESCRIPTOR_IMG_SIZE = 32
+FINE_COEFFS = 8  # 8x8 low-frequency block of the 32x32 image
+COARSE_COEFFS = 6  # 6x6 block of the 16x16 image
+COLOR_LEVELS = 4  # per channel, 64 histogram bins
+DESCRIPTOR_SIZE = FINE_COEFFS**2 - 1 + COARSE_COEFFS**2 - 1 + COLOR_LEVELS**3
+
+_FINE_BASIS = _dct_basis(DESCRIPTOR_IMG_SIZE, FINE_COEFFS).astype(np.float32)
+_COARSE_BASIS = _dct_basis(DESCRIPTOR_IMG_SIZE // 2, COARSE_COEFFS).astype(np.float32)
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+Variant = Literal["normal", "plus"]
+
+
+def _unit_rows(blocks: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(blocks, axis=1, keepdims=True)
+    return blocks / np.maximum(norms, 1e-6)
+
+
+def describe_many(images: Iterable[Image.Image]) -> np.ndarray:
+    """(N, DESCRIPTOR_SIZE) float32 descriptors with unit norm."""
+    size = (DESCRIPTOR_IMG_SIZE, DESCRIPTOR_IMG_SIZE)
+    rgb = [
+        np.asarray(image.convert("RGB").resize(size, Image.Resampling.BOX))
+        for image in images
+    ]
+    if not rgb:
+        return np.empty((0, DESCRIPTOR_SIZE), dtype=np.float32)
+    pixels = np.stack(rgb)
+    n = len(pixels)
+
+    luma = pixels.astype(np.float32) @ _LUMA
+    half = DESCRIPTOR_IMG_SIZE // 2
+    pooled = luma.reshape(n, half, 2, half, 2).mean(axis=(2, 4))
+    # The DC term only carries brightness, which varies between captures
+    fine = (_FINE_BASIS @ luma @ _FINE_BASIS.T).reshape(n, -1)[:, 1:]
+    coarse = (_COARSE_BASIS @ pooled @ _COARSE_BASIS.T).reshape(n, -1)[:, 1:]
+
+    levels = (pixels // (256 // COLOR_LEVELS)).astype(np.int64)
+    bins = (levels[..., 0] * COLOR_LEVELS + levels[..., 1]) * COLOR_LEVELS
+    bins = (bins + levels[..., 2]).reshape(n, -1)
+    offsets = np.arange(n)[:, None] * COLOR_LEVELS**3
+    counts = np.bincount((bins + offsets).ravel(), minlength=n * COLOR_LEVELS**3)
+    # Square roots make the dot product the Bhattacharyya coefficient
+    histogram = np.sqrt(counts.reshape(n, -1).astype(np.float32))
+
+    # Each part has unit norm, so each weighs the same in the similarity
+    descriptor = np.concatenate(
+        [_unit_rows(fine), _unit_rows(coarse), _unit_rows(histogram)], axis=1
+    )
+    return (descriptor / np.sqrt(3.0)).astype(np.float32)
+
+
+def describe(image: Image.Image) -> np.ndarray:
+    return describe_many([image])[0]
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on ``path`` shared with other processes (blocks until free)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    # Retries for about 10 s, then raises; keep waiting
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_npz(path: str) -> tuple[list[tuple[int, Variant]], np.ndarray]:
+    """Keys and vectors stored at ``path``; none if missing or of another layout."""
+    nothing = [], np.empty((0, DESCRIPTOR_SIZE), dtype=np.float32)
+    if not os.path.isfile(path):
+        return nothing
+    with np.load(path) as data:
+        vectors = data["vectors"]
+        if vectors.shape[1:] != (DESCRIPTOR_SIZE,):
+            # Written by another descriptor layout; relearn from scratch
+            return nothing
+        keys = list(zip(data["song_ids"].tolist(), data["variants"].tolist()))
+    return keys, vectors
+
+
+class JacketIndex:
+    """Learned descriptors in one contiguous float32 matrix, keyed by (song id, variant)."""
+
+    def __init__(
+        self,
+        keys: list[tuple[int, Variant]] | None = None,
+        vectors: np.ndarray | None = None,
+        path: str | None = None,
+    ):
+        keys = list(keys or [])
+        if vectors is None:
+            vectors = np.empty((0, DESCRIPTOR_SIZE), dtype=np.float32)
+        # (keys, rows, vectors), swapped as one so readers never see a row
+        # index the vectors do not have yet
+        self._state = (
+            keys,
+            {key: row for row, key in enumerate(keys)},
+            np.ascontiguousarray(vectors, dtype=np.float32),
+        )
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __contains__(self, key: tuple[int, Variant]):
+        return key in self._state[1]
+
+    def similarities(
+        self, descriptor: np.ndarray, keys: list[tuple[int, Variant]]
+    ) -> dict[tuple[int, Variant], float]:
+        """Cosine similarity to each of ``keys`` that has a descriptor."""
+        _, rows, vectors = self._state
+        known = [key for key in keys if key in rows]
+        if not known:
+            return {}
+        scores = vectors[[rows[key] for key in known]] @ descriptor
+        return dict(zip(known, scores.tolist()))
+
+    def add(self, key: tuple[int, Variant], descriptor: np.ndarray, persist=True):
+        """Learns a descriptor; keys that already have one are left alone."""
+        if key in self:
+            return
+        self._merge([key], descriptor[None, :])
+        if persist and self._path:
+            self.save()
+
+    def _merge(self, keys: list[tuple[int, Variant]], vectors: np.ndarray):
+        """Adds the rows whose keys are new, copy-on-write."""
+        with self._lock:
+            old_keys, old_rows, old_vectors = self._state
+            new = [i for i, key in enumerate(keys) if key not in old_rows]
+            if not new:
+                return
+            merged_keys = old_keys + [keys[i] for i in new]
+            rows = {key: row for row, key in enumerate(merged_keys)}
+            merged = np.vstack([old_vectors, np.asarray(vectors, np.float32)[new]])
+            self._state = (merged_keys, rows, merged)
+
+    def save(self, path: str | None = None):
+        """Writes the index, first taking in what other processes saved.
+
+        Workers of one pool each learn on their own copy; merging under a
+        file lock keeps one worker's save from dropping another's descriptors.
+        """
+        path = path or self._path
+        with _file_lock(f"{path}.lock"):
+            self._merge(*_read_npz(path))
+            keys, _, vectors = self._state
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path,
+                song_ids=np.array([key[0] for key in keys], dtype=np.int64),
+                variants=np.array([key[1] for key in keys], dtype="U6"),
+                vectors=vectors,
+            )
+            # Readers that do not lock still always find a whole file
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = EMBEDDINGS_PATH) -> JacketIndex:
+        keys, vectors = _read_npz(path)
+        return cls(keys, vectors, path)
+
+
+_index: JacketIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_jacket_index() -> JacketIndex:
+    """Loads the learned index on first use and returns the shared instance afterwards."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = JacketIndex.load()
+    return _index
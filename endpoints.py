@@ -0,0 +1,18 @@
+"""URLs of the platina-archive.app API.
+
+The base URL can be pointed elsewhere with ``PLATINA_API_URL``, e.g. at the
+local stand-in in ``benchmarks/mock_api.py`` for offline load testing.
+"""
+
+import os
+
+DEFAULT_API_BASE_URL = "https://www.platina-archive.app"
+
+
+def api_base_url() -> str:
+    return os.environ.get("PLATINA_API_URL", DEFAULT_API_BASE_URL).rstrip("/")
+
+
+def api_url(name: str) -> str:
+    """Full URL of an API v1 endpoint, e.g. ``api_url("get_archive")``."""
+    return f"{api_base_url()}/api/v1/{name}"
@@ -0,0 +1,103 @@
+"""Normalizes every screenshot source into one canonical 8-bit RGB image.
+
+Captures reach the analyzer in many shapes: the clipboard hands over RGBA
+(Windows DIBs often with an all-zero alpha), files are RGB, RGBA, palette,
+grayscale or 16-bit PNGs, the server receives raw pixel buffers and videos
+yield numpy frames. Each source is converted here exactly once, so every
+stage after it (calibration, crops, pixel reads, pHashes, OCR) sees the same
+three 8-bit channels and never has to guess the mode. ``rgb_array`` views the
+result as an (H, W, 3) uint8 array.
+
+Alpha is dropped, not composited: screenshots are opaque, and a zero alpha
+from the clipboard would otherwise black out the whole capture.
+"""
+
+from __future__ import annotations
+
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+CANONICAL_MODE = "RGB"
+# Channel positions of the R, G and B values in each supported pixel format
+PIXEL_FORMATS = {
+    "RGB": (0, 1, 2),
+    "BGR": (2, 1, 0),
+    "RGBA": (0, 1, 2),
+    "RGBX": (0, 1, 2),
+    "BGRA": (2, 1, 0),
+    "BGRX": (2, 1, 0),
+}
+
+
+def _to_uint8(array: np.ndarray) -> np.ndarray:
+    if array.dtype == np.uint8:
+        return array
+    if array.dtype.kind in "ui" and array.size and array.max() > 255:
+        # 16-bit samples; PIL's own conversion clips them to white instead
+        return (np.clip(array, 0, 65535) >> 8).astype(np.uint8)
+    return np.clip(array, 0, 255).astype(np.uint8)
+
+
+def to_rgb(img: Image.Image) -> Image.Image:
+    """The canonical form of ``img``; an image already in it is returned as is."""
+    if img.mode == CANONICAL_MODE:
+        img.load()
+        return img
+    if img.mode in ("I", "F") or img.mode.startswith("I;16"):
+        return from_array(np.asarray(img))
+    if img.mode == "La":
+        img = img.convert("LA")
+    # RGBA, RGBX, LA, PA and P with transparency simply lose their alpha
+    return img.convert(CANONICAL_MODE)
+
+
+def from_array(array: np.ndarray, channel_order: str = "RGB") -> Image.Image:
+    """Canonical image of an (H, W), (H, W, 3) or (H, W, 4) array, e.g. a video frame."""
+    array = _to_uint8(np.asarray(array))
+    if array.ndim == 2:
+        array = np.repeat(array[:, :, None], 3, axis=2)
+    elif array.ndim != 3 or array.shape[2] not in (3, 4):
+        raise ValueError(
+            f"expected an (H, W), (H, W, 3) or (H, W, 4) array, got {array.shape}"
+        )
+    elif array.shape[2] == 4 or channel_order != "RGB":
+        array = array[:, :, list(PIXEL_FORMATS[channel_order])]
+    return Image.fromarray(np.ascontiguousarray(array))
+
+
+def from_buffer(
+    data: bytes, width: int, height: int, pixel_format: str = "RGB"
+) -> Image.Image:
+    """Canonical image of raw, tightly packed pixels in ``pixel_format``."""
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(
+            f"unknown pixel format {pixel_format!r}, expected one of {', '.join(PIXEL_FORMATS)}"
+        )
+    channels = len(pixel_format)
+    if len(data) != width * height * channels:
+        raise ValueError(
+            f"expected {width * height * channels} bytes of {pixel_format} for {width}x{height}, got {len(data)}"
+        )
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width, channels)
+    return from_array(pixels, pixel_format)
+
+
+def open_image(source: str | BinaryIO) -> Image.Image:
+    """Decodes an image file (a path or a binary file object) into canonical form."""
+    with Image.open(source) as img:
+        return to_rgb(img)
+
+
+def grab_clipboard() -> Image.Image | None:
+    """The clipboard image in canonical form, or None when it holds no image."""
+    img = ImageGrab.grabclipboard()
+    if not isinstance(img, Image.Image):
+        return None
+    return to_rgb(img)
+
+
+def rgb_array(img: Image.Image) -> np.ndarray:
+    """(H, W, 3) uint8 pixels of an image, converting it first if needed."""
+    return np.asarray(to_rgb(img))
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+MAX_EVENTS = 500
+
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.n = 0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.n += 1
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def json(self):
+        labels = [f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+        return {
+            "n": self.n,
+            "mean_ms": round(self.total / self.n, 3) if self.n else 0.0,
+            "min_ms": round(self.min, 3) if self.n else 0.0,
+            "max_ms": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _Span:
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: Instrumentation, name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._name, (time.perf_counter() - self._start) * 1000)
+        return False
+
+
+class Instrumentation:
+    """Spans, counters and latency histograms for the analysis pipeline.
+
+    Every method is a cheap no-op while ``enabled`` is False, so call sites
+    don't need to guard themselves.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters: dict[str, int] = {}
+            self.histograms: dict[str, Histogram] = {}
+            self.events: deque[str] = deque(maxlen=MAX_EVENTS)
+            self.started_at = datetime.now()
+
+    def span(self, name: str):
+        """Context manager that records the wall time of a stage in ``name``'s histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, ms: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def event(self, msg: str):
+        """Records a diagnostic message (replaces the old debug prints)."""
+        if not self.enabled:
+            return
+        now = datetime.now()
+        with self._lock:
+            self.events.append(f"[{now:%H:%M:%S}] {msg}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "counters": dict(self.counters),
+                "histograms": {k: h.json() for k, h in self.histograms.items()},
+                "events": list(self.events),
+            }
+
+    def export_json(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+
+    def summary_lines(self) -> list[str]:
+        """Human readable summary for the diagnostics panel."""
+        snapshot = self.snapshot()
+        lines = [
+            f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())
+        ]
+        for name, hist in sorted(snapshot["histograms"].items()):
+            lines.append(
+                f"{name}: n={hist['n']} mean={hist['mean_ms']}ms max={hist['max_ms']}ms"
+            )
+        return lines
+
+
+# Shared instance used by the analyzer; enable with PLATINA_METRICS=1
+METRICS = Instrumentation(enabled=os.environ.get("PLATINA_METRICS") == "1")
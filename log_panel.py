@@ -0,0 +1,125 @@
+"""Bounded log model and the Tk panel that shows it.
+
+``LogBuffer`` takes lines from any thread into a fixed-size ring buffer and,
+optionally, a rotating log file. ``LogPanel`` drains it on a Tk timer, so a
+burst of lines from a folder import costs one widget update per tick instead
+of one per line, and the widget never holds more than the buffer's capacity.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import tkinter as tk
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from tkinter import ttk
+
+LOG_CAPACITY = 1000
+FLUSH_INTERVAL_MS = 100
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class LogBuffer:
+    """Thread-safe ring buffer of timestamped log lines."""
+
+    def __init__(self, capacity: int = LOG_CAPACITY, log_path: str | None = None):
+        self._capacity = capacity
+        self._lines: deque[str] = deque(maxlen=capacity)
+        self._pending: deque[str] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._file_logger = None
+        if log_path:
+            self._file_logger = logging.getLogger(f"platina_archive.log.{log_path}")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            if not self._file_logger.handlers:
+                handler = RotatingFileHandler(
+                    log_path,
+                    maxBytes=LOG_FILE_MAX_BYTES,
+                    backupCount=LOG_FILE_BACKUPS,
+                    encoding="utf-8",
+                    delay=True,
+                )
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self._file_logger.addHandler(handler)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def append(self, msg: str):
+        now = datetime.now()
+        line = f"[{now.hour:02d}:{now.minute:02d}:{now.second:02d}] {msg}"
+        with self._lock:
+            self._lines.append(line)
+            self._pending.append(line)
+        if self._file_logger:
+            self._file_logger.info(msg)
+
+    def drain(self) -> list[str]:
+        """Lines appended since the last drain (at most ``capacity`` of them)."""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+        return lines
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            return list(self._lines)
+
+
+class LogPanel:
+    """Read-only Text widget fed from a LogBuffer on a timer."""
+
+    def __init__(
+        self,
+        parent: tk.Widget,
+        buffer: LogBuffer,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+    ):
+        self._buffer = buffer
+        self._flush_interval_ms = flush_interval_ms
+        self._text = tk.Text(
+            parent,
+            wrap=tk.WORD,
+            height=10,
+            font=("Roboto", 9),
+            bg="#F0F0F0",
+            fg="black",
+            state=tk.DISABLED,
+        )
+        self._text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(parent, command=self._text.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self._text.config(yscrollcommand=scrollbar.set)
+        self._after_id = self._text.after(self._flush_interval_ms, self._flush)
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    def log(self, msg: str):
+        """Safe to call from any thread; shows up on the next flush."""
+        self._buffer.append(msg)
+
+    def _flush(self):
+        lines = self._buffer.drain()
+        if lines:
+            # Only follow new lines if the user has not scrolled up
+            at_bottom = self._text.yview()[1] >= 1.0
+            self._text.config(state=tk.NORMAL)
+            self._text.insert(tk.END, "\n".join(lines) + "\n")
+            excess = int(self._text.index("end-1c").split(".")[0]) - 1
+            excess -= self._buffer.capacity
+            if excess > 0:
+                self._text.delete("1.0", f"{excess + 1}.0")
+            self._text.config(state=tk.DISABLED)
+            if at_bottom:
+                self._text.see(tk.END)
+        self._after_id = self._text.after(self._flush_interval_ms, self._flush)
+
+    def stop(self):
+        self._text.after_cancel(self._after_id)
@@ -1,43 +1,20 @@
-import os
-import sys
 import tkinter as tk
 from tkinter import messagebox, ttk
 
-import keyring
-from keyring.backends import Windows
-import requests
+from credentials import load_api_key, load_key_from_file, save_api_key
+from endpoints import api_url
 
-keyring.set_keyring(Windows.WinVaultKeyring())
-KEYRING_SERVICE_ID = "PlatinaArchiveClient"
-KEY_FILE = "platina.key"
-
-if getattr(sys, "frozen", False):
-    base_dir = os.path.dirname(sys.executable)
-else:
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-
-
-def load_key_from_file():
-    key_path = os.path.join(base_dir, KEY_FILE)
-    if not os.path.isfile(key_path):
-        return None
-    with open(key_path, "r") as f:
-        api_key = f.read().strip()
-
-    os.remove(key_path)
-    keyring.set_password(KEYRING_SERVICE_ID, "main_api_key", api_key)
-    return api_key
-
-
-def _check_local_key():
-    return keyring.get_password(KEYRING_SERVICE_ID, "main_api_key")
+# Kept for older callers
+_check_local_key = load_api_key
 
 
 class RegisterWindow(tk.Toplevel):
-    def __init__(self, parent, success_callback):
+    def __init__(self, parent, success_callback, net):
         super().__init__(parent)
         self.parent = parent
         self.success_callback = success_callback
+        # net.NetworkLoop; its results come back on the Tk thread
+        self.net = net
         self.title("플라티나 아카이브 등록")
         self.center_window()
         self.transient(parent)
@@ -69,29 +46,41 @@ class RegisterWindow(tk.Toplevel):
         self.password_entry.pack(pady=2, padx=10, fill="x")
 
         # Register button
-        ttk.Button(self, text="등록", command=self.attempt_register).pack(pady=10)
+        self.register_button = ttk.Button(
+            self, text="등록", command=self.attempt_register
+        )
+        self.register_button.pack(pady=10)
         self.bind("<Return>", lambda x: self.attempt_register())
 
     def attempt_register(self):
         name = self.name_entry.get().strip()
         password = self.password_entry.get().strip()
-        register_endpoint = "https://www.platina-archive.app/api/v1/register"
 
         if not name or not password:
             messagebox.showerror("Error", "이름과 비밀번호는 공백일 수 없습니다.")
             return
 
+        self.register_button.config(state=tk.DISABLED)
+        self.net.submit(
+            self.net.register(name, password),
+            on_done=lambda response: self._handle_response(name, response),
+            on_error=self._handle_connection_error,
+        )
+
+    def _handle_response(self, name: str, response):
+        import requests
+
+        if not self.winfo_exists():
+            return  # closed while the request was in flight
+        self.register_button.config(state=tk.NORMAL)
         try:
-            response = requests.post(
-                register_endpoint, json={"name": name, "password": password}
-            )
             response.raise_for_status()
 
             data = response.json()
             api_key = data.get("key")
 
             if api_key:
-                keyring.set_password(KEYRING_SERVICE_ID, "main_api_key", api_key)
+                save_api_key(api_key)
                 self.destroy()
                 self.success_callback(name, api_key)
             else:
@@ -104,6 +93,10 @@ class RegisterWindow(tk.Toplevel):
             error_message = response.json().get("msg", "Invalid username or password")
             messagebox.showerror("Login Failed", error_message)
         except Exception as e:
-            messagebox.showerror(
-                "Connection Error", f"Could not connect to server: {e}"
-            )
+            self._handle_connection_error(e)
+
+    def _handle_connection_error(self, e: BaseException):
+        if not self.winfo_exists():
+            return
+        self.register_button.config(state=tk.NORMAL)
+        messagebox.showerror("Connection Error", f"Could not connect to server: {e}")
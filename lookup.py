@@ -0,0 +1,150 @@
+"""pHash lookup tables for glyphs and badges, loaded from ``tables/<field>.json``.
+
+Each table file is versioned and holds a match threshold and a list of
+``{"value", "phash"}`` entries. Tables are loaded once into packed uint64
+arrays and matched with a vectorized Hamming search. User-confirmed
+corrections are appended at runtime and persisted next to the app cache, so
+they survive restarts and updates of the bundled tables.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+from phash import hamming_distances, hex_to_value, value_to_hex
+
+if getattr(sys, "frozen", False):
+    BASEDIR = os.path.dirname(sys.executable)
+else:
+    BASEDIR = os.path.dirname(os.path.abspath(__file__))
+TABLES_DIR = os.path.join(BASEDIR, "tables")
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+USER_TABLES_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "tables")
+
+
+class HashTable:
+    """One field's known hashes and the value each one stands for."""
+
+    def __init__(
+        self,
+        field: str,
+        version: int,
+        threshold: int,
+        values: list,
+        hashes: np.ndarray,
+        user_path: str | None = None,
+    ):
+        self._field = field
+        self._version = version
+        self._threshold = threshold
+        # (hashes, values), swapped as one so readers never pair mismatched lists
+        self._entries = (np.asarray(hashes, dtype=np.uint64), list(values))
+        self._user_path = user_path
+        self._lock = threading.Lock()
+
+    @property
+    def field(self):
+        return self._field
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    def __len__(self):
+        return len(self._entries[1])
+
+    def nearest(self, target_hash: int) -> tuple[object, int]:
+        """Closest entry and its distance, regardless of the threshold."""
+        hashes, values = self._entries
+        if not values:
+            return None, 64
+        distances = hamming_distances(hashes, target_hash)
+        best = int(np.argmin(distances))
+        return values[best], int(distances[best])
+
+    def match(self, target_hash: int):
+        """Value of the closest entry if it is within the threshold, else None."""
+        value, distance = self.nearest(target_hash)
+        return value if distance < self._threshold else None
+
+    def match_confidence(self, target_hash: int) -> tuple[object, float]:
+        """``match`` plus a 0-100 confidence from the margin under the threshold."""
+        value, distance = self.nearest(target_hash)
+        if distance >= self._threshold:
+            return None, 0.0
+        return value, 100.0 * (self._threshold - distance) / self._threshold
+
+    def add(self, value, target_hash: int, persist: bool = True):
+        """Learns a user-confirmed (value, hash) pair."""
+        with self._lock:
+            # Copy-on-write, published in one assignment, so concurrent
+            # readers always see matching hashes and values
+            hashes, values = self._entries
+            self._entries = (
+                np.append(hashes, np.uint64(target_hash)),
+                values + [value],
+            )
+        if persist and self._user_path:
+            self._append_user_entry(value, target_hash)
+
+    def _append_user_entry(self, value, target_hash: int):
+        data = {"field": self._field, "base_version": self._version, "entries": []}
+        if os.path.isfile(self._user_path):
+            with open(self._user_path, "r") as f:
+                data = json.load(f)
+        data["base_version"] = self._version
+        data["entries"].append({"value": value, "phash": value_to_hex(target_hash)})
+        os.makedirs(os.path.dirname(self._user_path), exist_ok=True)
+        with open(self._user_path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(
+        cls,
+        field: str,
+        tables_dir: str = TABLES_DIR,
+        user_tables_dir: str | None = USER_TABLES_DIR,
+    ) -> HashTable:
+        with open(os.path.join(tables_dir, f"{field}.json"), "r") as f:
+            data = json.load(f)
+        entries = list(data["entries"])
+
+        user_path = None
+        if user_tables_dir:
+            user_path = os.path.join(user_tables_dir, f"{field}.json")
+            if os.path.isfile(user_path):
+                with open(user_path, "r") as f:
+                    entries += json.load(f).get("entries", [])
+
+        return cls(
+            field,
+            data.get("version", 1),
+            data["threshold"],
+            [entry["value"] for entry in entries],
+            np.array([hex_to_value(e["phash"]) for e in entries], dtype=np.uint64),
+            user_path,
+        )
+
+
+_tables: dict[str, HashTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(field: str) -> HashTable:
+    """Loads a table on first use and returns the shared instance afterwards."""
+    table = _tables.get(field)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(field)
+            if table is None:
+                table = _tables[field] = HashTable.load(field)
+    return table
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-from imagehash import ImageHash
-from PIL import Image
+if TYPE_CHECKING:
+    # Only needed for annotations; keeps this module cheap to import at startup
+    from PIL import Image
 
 
 class DecodeResult:
@@ -108,7 +109,7 @@ class AnalysisReport:
         difficulty: Literal["EASY", "HARD", "OVER", "PLUS"],
         level: int,
         jacket_image: Image.Image,
-        jacket_hash: ImageHash,
+        jacket_hash: int,
         match_distance,
         rank: str,
         is_full_combo: bool,
@@ -116,6 +117,10 @@ class AnalysisReport:
         is_maximum_patch: bool,
         total_notes: int = 0,
         perfect_high: int = 0,
+        screen_type: Literal["SELECT", "RESULT"] = "RESULT",
+        confidence: dict[str, float] | None = None,
+        match_margin: int | None = None,
+        crop_hashes: dict[str, int] | None = None,
     ):
         self._song = song
         self._score = score
@@ -133,6 +138,10 @@ class AnalysisReport:
         self._is_maximum_patch = is_maximum_patch
         self._total_notes = total_notes
         self._perfect_high = perfect_high
+        self._screen_type = screen_type
+        self._confidence = confidence
+        self._match_margin = match_margin
+        self._crop_hashes = crop_hashes or {}
 
     def __str__(self):
         return f"{self.song.title} - {self.song.artist} | {self.line}L {self.difficulty} Lv.{self.level}\nJudge: {self.judge}%\nScore: {self.score}\nP.A.T.C.H.: {self.patch}"
@@ -214,6 +223,30 @@ class AnalysisReport:
     def perfect_high(self):
         return self._perfect_high
 
+    @property
+    def screen_type(self):
+        return self._screen_type
+
+    @property
+    def confidence(self):
+        """Per-field recognizer confidence (0-100), if the analyzer recorded it"""
+        return self._confidence
+
+    @property
+    def match_margin(self):
+        """How many bits further the closest other plausible song's jacket was (None if none)"""
+        return self._match_margin
+
+    @property
+    def crop_hashes(self):
+        """pHashes of the preprocessed table-backed crops, keyed by table field name"""
+        return self._crop_hashes
+
+    @property
+    def chart_key(self):
+        """Same key format as the archive: song_id|line|difficulty|level"""
+        return f"{self.song.id}|{self.line}|{self.difficulty}|{self.level}"
+
 
 class Pattern:
     def __init__(
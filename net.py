@@ -0,0 +1,276 @@
+"""Client network I/O on one asyncio event loop thread.
+
+Every request the client makes (version check, song and pattern fetch,
+archive sync, registration and the upload queue) goes through one
+``NetworkLoop``, which shares a single ``requests.Session`` and therefore one
+keep-alive connection pool to the API. The client ships no asyncio HTTP
+library, so each request runs on a small executor that bounds how many
+connections are open. The loop schedules the requests, runs independent ones
+concurrently, keeps uploads in order and cancels everything on close.
+
+requests is imported on the loop thread, keeping it out of the client's
+startup path. Nothing here touches Tk. Results reach the UI through
+``UiQueue``: callbacks posted from any thread run on the Tk thread on its
+next timer tick.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from endpoints import api_url
+
+if TYPE_CHECKING:
+    import requests
+
+MAX_CONNECTIONS = 4
+# (connect, read) seconds; bounds how long a request abandoned on close can run
+REQUEST_TIMEOUT = (5, 30)
+UPLOAD_RETRIES = 3
+RETRY_DELAY = 1.0  # seconds, doubled after each failed attempt
+SONGS_RETRY_DELAY = 0.5
+POLL_INTERVAL_MS = 50
+
+
+class UiQueue:
+    """Runs callbacks posted from any thread on the Tk thread, on a timer."""
+
+    def __init__(self, widget, interval_ms: int = POLL_INTERVAL_MS):
+        self._widget = widget
+        self._interval_ms = interval_ms
+        self._calls: queue.SimpleQueue = queue.SimpleQueue()
+        self._after_id = widget.after(interval_ms, self._poll)
+
+    def post(self, func: Callable, *args):
+        self._calls.put((func, args))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    func, args = self._calls.get_nowait()
+                except queue.Empty:
+                    break
+                func(*args)
+        finally:
+            self._after_id = self._widget.after(self._interval_ms, self._poll)
+
+    def stop(self):
+        self._widget.after_cancel(self._after_id)
+
+
+class NetworkLoop:
+    """An asyncio loop on its own thread, with the client's API calls as coroutines.
+
+    ``dispatch(func, *args)`` delivers results, e.g. ``UiQueue.post``; without
+    it callbacks run on the loop thread. ``on_error`` receives exceptions of
+    submitted work that has no error callback of its own.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[..., None] | None = None,
+        on_error: Callable[[BaseException], None] | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+    ):
+        self._dispatch = dispatch or (lambda func, *args: func(*args))
+        self._on_error = on_error
+        self._max_connections = max_connections
+        self._session: requests.Session | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="net"
+        )
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._uploads: asyncio.Queue | None = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="network-loop", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def session(self):
+        return self._session
+
+    def _run(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._max_connections)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # Set before the loop runs, so every coroutine sees it
+        self._session = session
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    # --- Scheduling ---
+
+    def submit(
+        self,
+        coro: Awaitable,
+        on_done: Callable[[Any], None] | None = None,
+        on_error: Callable[[BaseException], None] | None = None,
+    ) -> Future:
+        """Runs ``coro`` on the loop; callable from any thread."""
+        return asyncio.run_coroutine_threadsafe(
+            self._deliver(coro, on_done, on_error), self._loop
+        )
+
+    async def _deliver(self, coro: Awaitable, on_done, on_error):
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            handler = on_error or self._on_error
+            if handler is None:
+                raise
+            self._dispatch(handler, e)
+            return None
+        if on_done is not None:
+            self._dispatch(on_done, result)
+        return result
+
+    async def run_blocking(self, func: Callable, *args, **kwargs):
+        """Runs a blocking call (a request, a parse, a disk write) on the executor."""
+        return await self._loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
+        )
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return await self.run_blocking(self._session.request, method, url, **kwargs)
+
+    # --- API calls ---
+
+    async def fetch_latest_client_version(self) -> tuple[int, int, int]:
+        res = await self.request("GET", api_url("client_version"))
+        res.raise_for_status()
+        data = res.json()
+        return (data["major"], data["minor"], data["patch"])
+
+    async def fetch_archive(self, api_key: str) -> dict:
+        from analyzer import parse_archive
+
+        headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+        res = await self.request("POST", api_url("get_archive"), headers=headers)
+        return await self.run_blocking(parse_archive, res.json())
+
+    async def fetch_songs(self) -> list:
+        """Songs and patterns, fetched concurrently against the db.json cache."""
+        from analyzer import songs_from_responses, songs_request_headers
+
+        cached_db, songs_headers, patterns_headers = await self.run_blocking(
+            songs_request_headers
+        )
+        res_songs, res_patterns = await asyncio.gather(
+            self.request("GET", api_url("platina_songs"), headers=songs_headers),
+            self.request("GET", api_url("platina_patterns"), headers=patterns_headers),
+        )
+        return await self.run_blocking(
+            songs_from_responses, cached_db, res_songs, res_patterns
+        )
+
+    async def fetch_songs_until_loaded(self) -> list:
+        """``fetch_songs``, retried until it succeeds or the loop closes."""
+        while True:
+            try:
+                return await self.fetch_songs()
+            except Exception:
+                await asyncio.sleep(SONGS_RETRY_DELAY)
+
+    async def register(self, name: str, password: str) -> requests.Response:
+        return await self.request(
+            "POST", api_url("register"), json={"name": name, "password": password}
+        )
+
+    # --- Upload queue ---
+
+    def queue_upload(
+        self,
+        api_key: str,
+        payload: dict,
+        on_done: Callable[[requests.Response], None] | None = None,
+        on_error: Callable[[BaseException], None] | None = None,
+    ):
+        """Queues a record for ``update_archive``; uploads go out one at a time, in order.
+
+        ``on_done`` runs only once the server accepted the record, ``on_error``
+        once every retry failed.
+        """
+        self._loop.call_soon_threadsafe(
+            self._enqueue_upload, api_key, payload, on_done, on_error
+        )
+
+    def _enqueue_upload(self, api_key: str, payload: dict, on_done, on_error):
+        if self._uploads is None:
+            self._uploads = asyncio.Queue()
+            self._loop.create_task(self._upload_worker())
+        self._uploads.put_nowait((api_key, payload, on_done, on_error))
+
+    async def _upload_worker(self):
+        while True:
+            api_key, payload, on_done, on_error = await self._uploads.get()
+            try:
+                response = await self._upload(api_key, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                handler = on_error or self._on_error
+                if handler is not None:
+                    self._dispatch(handler, e)
+                continue
+            if on_done is not None:
+                self._dispatch(on_done, response)
+
+    async def _upload(self, api_key: str, payload: dict) -> requests.Response:
+        import requests
+
+        headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+        delay = RETRY_DELAY
+        for attempt in range(UPLOAD_RETRIES):
+            try:
+                res = await self.request(
+                    "POST", api_url("update_archive"), json=payload, headers=headers
+                )
+                res.raise_for_status()
+                return res
+            except requests.RequestException:
+                if attempt == UPLOAD_RETRIES - 1:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    # --- Shutdown ---
+
+    def close(self):
+        """Cancels queued and running work and stops the loop; callable from any thread.
+
+        Requests already on the wire are abandoned: closing the session drops
+        their connections and the timeouts bound the rest.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+
+    async def _shutdown(self):
+        tasks = [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
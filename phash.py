@@ -0,0 +1,79 @@
+"""Perceptual hash bit-compatible with imagehash.phash, without scipy or imagehash.
+
+imagehash runs scipy.fftpack.dct twice on a 32x32 grayscale thumbnail, keeps
+the top-left 8x8 block and thresholds it at its median. Only the first 8 rows
+of the 32x32 DCT-II matrix contribute to that block, so the whole transform is
+``DCT_BASIS @ pixels @ DCT_BASIS.T``. Hashes are returned as native 64-bit
+integers whose hex form equals ``str(imagehash.phash(img))``, i.e. the
+``pHash``/``plusPHash`` values stored on the server.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+IMG_SIZE = HASH_SIZE * 4  # imagehash's highfreq_factor=4
+
+
+def _dct_basis(n: int = IMG_SIZE, rows: int = HASH_SIZE) -> np.ndarray:
+    """First ``rows`` rows of the unnormalized DCT-II matrix (scipy's default scaling)."""
+    k = np.arange(rows)[:, None]
+    i = np.arange(n)[None, :]
+    return 2 * np.cos(np.pi * k * (2 * i + 1) / (2 * n))
+
+
+DCT_BASIS = _dct_basis()
+DCT_BASIS_T = np.ascontiguousarray(DCT_BASIS.T)
+# Number of set bits for every byte value, for vectorized Hamming distances
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _thumbnail(image: Image.Image) -> np.ndarray:
+    return np.asarray(
+        image.convert("L").resize((IMG_SIZE, IMG_SIZE), Image.Resampling.LANCZOS),
+        dtype=np.float64,
+    )
+
+
+def phash_many(images: Iterable[Image.Image]) -> np.ndarray:
+    """Hashes several images in one batched transform. Returns a uint64 array."""
+    thumbnails = [_thumbnail(image) for image in images]
+    if not thumbnails:
+        return np.empty(0, dtype=np.uint64)
+    pixels = np.stack(thumbnails)
+    low_freq = DCT_BASIS @ pixels @ DCT_BASIS_T  # (N, 8, 8)
+    flat = low_freq.reshape(len(pixels), HASH_SIZE * HASH_SIZE)
+    bits = flat > np.median(flat, axis=1, keepdims=True)
+    # Row-major, first bit most significant: same order as imagehash's hex string
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def phash(image: Image.Image) -> int:
+    """Hash of a single image as a Python int."""
+    return int(phash_many([image])[0])
+
+
+def hex_to_value(hex_str: str) -> int:
+    return int(hex_str, 16)
+
+
+def value_to_hex(value: int) -> str:
+    return f"{int(value):016x}"
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def hamming_distances(values: np.ndarray, target: int) -> np.ndarray:
+    """Hamming distance from ``target`` to every hash in a uint64 array."""
+    xor = np.ascontiguousarray(values, dtype=np.uint64) ^ np.uint64(target)
+    return POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def hashes_from_hex(hex_values: Iterable[str]) -> np.ndarray:
+    return np.array([hex_to_value(h) for h in hex_values], dtype=np.uint64)
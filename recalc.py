@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+import numpy as np
+
+from models import AnalysisReport, DecodeResult
+
+# Lower bounds (inclusive) of each rank, ascending. RANK_NAMES[i] is the rank
+# for judge rates in [RANK_THRESHOLDS[i - 1], RANK_THRESHOLDS[i]).
+RANK_THRESHOLDS = np.array([70, 80, 90, 95, 97, 98, 99, 99.5, 99.8])
+RANK_NAMES = np.array(["C", "B", "A", "A+", "AA", "AA+", "S", "S+", "SS", "SS+"])
+RANK_RATIO = {
+    "F": 0.0,
+    "C": 0.2,
+    "B": 0.3,
+    "A": 0.4,
+    "A+": 0.5,
+    "AA": 0.6,
+    "AA+": 0.7,
+    "S": 0.8,
+    "S+": 0.9,
+    "SS": 0.95,
+    "SS+": 1,
+}
+_RANK_RATIO_BY_INDEX = np.array([RANK_RATIO[name] for name in RANK_NAMES])
+
+PLUS_BONUS = 1.02
+PATCH_TOLERANCE = 0.1
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round, except near-halfway values are re-rounded with Python's round.
+
+    np.round scales by 10**ndigits before rounding, which can land on the other
+    side of a tie than the scalar calculators (Python's correctly rounded
+    round()). Only the handful of ambiguous elements take the slow path.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10**ndigits
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ties:
+        rounded.flat[i] = round(float(values.flat[i]), ndigits)
+    return rounded
+
+
+def calculate_judge_rates(ph, p, g, d, m) -> np.ndarray:
+    """Vectorized ScreenshotAnalyzer.calculate_judge_rate. Empty charts get 0."""
+    ph, p, g, d, m = (np.asarray(x, dtype=np.int64) for x in (ph, p, g, d, m))
+    total_judge = (ph + p) * 100 + g * 70 + d * 30
+    total_notes = ph + p + g + d + m
+    rates = np.divide(
+        total_judge,
+        total_notes,
+        out=np.zeros(total_judge.shape, dtype=np.float64),
+        where=total_notes > 0,
+    )
+    return _round(rates, 4)
+
+
+def calculate_scores(perfect_high, perfect, great) -> np.ndarray:
+    """Vectorized ScreenshotAnalyzer.calculate_score."""
+    return (
+        200 * np.asarray(perfect_high, dtype=np.int64)
+        + 150 * np.asarray(perfect, dtype=np.int64)
+        + 100 * np.asarray(great, dtype=np.int64)
+    )
+
+
+def calculate_rank_indices(judge_rates) -> np.ndarray:
+    """Index into RANK_NAMES for each judge rate."""
+    return np.searchsorted(RANK_THRESHOLDS, np.asarray(judge_rates), side="right")
+
+
+def calculate_ranks(judge_rates) -> np.ndarray:
+    """Vectorized ScreenshotAnalyzer.calculate_rank (F cannot be calculated)."""
+    return RANK_NAMES[calculate_rank_indices(judge_rates)]
+
+
+def calculate_patches(levels, judge_rates, is_plus, is_f_rank=None) -> np.ndarray:
+    """Vectorized ScreenshotAnalyzer.calculate_patch.
+
+    The rank is derived from the judge rate; pass ``is_f_rank`` to zero out
+    plays that ended with an F.
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    judge_rates = np.asarray(judge_rates, dtype=np.float64)
+    ratios = _RANK_RATIO_BY_INDEX[calculate_rank_indices(judge_rates)]
+    patches = levels * 42 * (judge_rates / 100) * ratios
+    patches = np.where(np.asarray(is_plus, dtype=bool), patches * PLUS_BONUS, patches)
+    if is_f_rank is not None:
+        patches = np.where(np.asarray(is_f_rank, dtype=bool), 0.0, patches)
+    return _round(patches, 2)
+
+
+# --- Bulk helpers ---
+
+
+def archive_columns(archive: dict[str, DecodeResult]) -> dict[str, np.ndarray]:
+    """Turns an archive dict into column arrays (one row per record)."""
+    records = list(archive.values())
+    return {
+        "key": np.array(list(archive.keys()), dtype=object),
+        "song_id": np.array([r.song_id for r in records], dtype=np.int64),
+        "level": np.array([r.level for r in records], dtype=np.int64),
+        "judge": np.array([r.judge for r in records], dtype=np.float64),
+        "patch": np.array([r.patch for r in records], dtype=np.float64),
+        "is_plus": np.array([r.difficulty == "PLUS" for r in records], dtype=bool),
+    }
+
+
+def rederive_archive(
+    archive: dict[str, DecodeResult],
+    patch_func: Callable[..., np.ndarray] = calculate_patches,
+) -> dict[str, float]:
+    """Recomputes P.A.T.C.H. for every record, e.g. after a formula change.
+
+    ``patch_func`` receives (levels, judge_rates, is_plus, is_f_rank) columns.
+    Records stored with a patch of 0 are treated as F ranks and kept at 0.
+    Perfect decodes keep their stored value since it includes bonus patch.
+    Returns only the keys whose value changed.
+    """
+    if not archive:
+        return {}
+    cols = archive_columns(archive)
+    is_f_rank = cols["patch"] == 0
+    new_patch = patch_func(cols["level"], cols["judge"], cols["is_plus"], is_f_rank)
+    new_patch = np.where(cols["judge"] == 100, cols["patch"], new_patch)
+    changed = np.flatnonzero(new_patch != cols["patch"])
+    return {cols["key"][i]: float(new_patch[i]) for i in changed}
+
+
+def find_inconsistent_reports(
+    reports: Iterable[AnalysisReport], tolerance: float = PATCH_TOLERANCE
+) -> list[AnalysisReport]:
+    """Returns the reports whose rank or P.A.T.C.H. disagrees with their judge rate."""
+    reports = list(reports)
+    if not reports:
+        return []
+    judge = np.array([r.judge for r in reports], dtype=np.float64)
+    level = np.array([r.level for r in reports], dtype=np.int64)
+    patch = np.array([r.patch for r in reports], dtype=np.float64)
+    is_plus = np.array([r.difficulty == "PLUS" for r in reports], dtype=bool)
+    ranks = np.array([r.rank for r in reports])
+    is_f_rank = ranks == "F"
+
+    expected_rank = calculate_ranks(judge)
+    expected_patch = calculate_patches(level, judge, is_plus, is_f_rank)
+    rank_ok = is_f_rank | (ranks == expected_rank)
+    # Perfect decodes may carry bonus patch on top of the formula
+    patch_ok = (np.abs(patch - expected_patch) <= tolerance) | (judge == 100)
+    return [reports[i] for i in np.flatnonzero(~(rank_ok & patch_ok))]
+
+
+def find_inconsistent_counts(
+    counts, scores, judge_rates, tolerance: float = 0.0001
+) -> np.ndarray:
+    """Checks OCR'd note counts (N x [PH, P, G, D, M]) against OCR'd score and judge.
+
+    Returns a boolean mask of rows that do not add up.
+    """
+    counts = np.asarray(counts, dtype=np.int64).reshape(-1, 5)
+    ph, p, g, d, m = counts.T
+    score_ok = calculate_scores(ph, p, g) == np.asarray(scores, dtype=np.int64)
+    judge_ok = (
+        np.abs(calculate_judge_rates(ph, p, g, d, m) - np.asarray(judge_rates))
+        <= tolerance
+    )
+    return ~(score_ok & judge_ok)
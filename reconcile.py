@@ -0,0 +1,141 @@
+"""Reconciles OCR'd note counts, score and judge rate into one consistent play.
+
+Every number on the result screen is a noisy observation of the same five
+counts: the total is their sum, the score is ``calculate_score`` of the first
+three and the judge rate is ``calculate_judge_rate`` of all five. When the
+observations disagree, the cheapest explanation is usually a single misread
+digit. ``reconcile_result`` searches digit-edit neighborhoods of every
+observation (one substituted, dropped or inserted digit per field) for the
+assignment that satisfies all three relations with the fewest edits, and
+refuses to guess when two explanations are equally cheap.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+
+from recalc import calculate_judge_rates, calculate_scores
+
+COUNT_FIELDS = ("perfect_high_y", "perfect_y", "great_y", "good_y", "miss_y")
+OBSERVED_FIELDS = ("total_notes", *COUNT_FIELDS, "score", "judge")
+# Judge rates are shown with four decimals; compare them as integers
+JUDGE_SCALE = 10_000
+MAX_EDITS = 2
+
+
+@lru_cache(maxsize=4096)
+def _digit_neighbors(value: int) -> tuple[int, ...]:
+    digits = str(value)
+    variants = set()
+    for i in range(len(digits)):
+        variants.add(digits[:i] + digits[i + 1 :])
+        for c in "0123456789":
+            variants.add(digits[:i] + c + digits[i + 1 :])
+    for i in range(len(digits) + 1):
+        for c in "0123456789":
+            variants.add(digits[:i] + c + digits[i:])
+    values = {int(v) for v in variants if v}
+    values.discard(value)
+    return tuple(sorted(values))
+
+
+def digit_neighbors(value: int) -> np.ndarray:
+    """Every non-negative integer one digit substitution, deletion or insertion away."""
+    return np.array(_digit_neighbors(int(value)), dtype=np.int64)
+
+
+def _extend(rows, edits, observed: int, max_edits: int):
+    """Appends a column holding ``observed`` or, within the edit budget, a neighbor."""
+    neighbors = digit_neighbors(observed)
+    kept = np.column_stack([rows, np.full(len(rows), observed, dtype=np.int64)])
+    open_rows = rows[edits < max_edits]
+    edited = np.column_stack(
+        [
+            np.repeat(open_rows, len(neighbors), axis=0),
+            np.tile(neighbors, len(open_rows)),
+        ]
+    )
+    return (
+        np.concatenate([kept, edited]),
+        np.concatenate(
+            [edits, np.repeat(edits[edits < max_edits] + 1, len(neighbors))]
+        ),
+    )
+
+
+def _check(values, edits, observed: int, max_edits: int):
+    """Edit count after requiring a derived column to match ``observed`` or a neighbor.
+
+    Rows that match neither get an edit count past the budget.
+    """
+    exact = values == observed
+    near = np.isin(values, digit_neighbors(observed)) & (edits < max_edits)
+    return np.where(exact, edits, np.where(near, edits + 1, max_edits + 1))
+
+
+def reconcile_result(
+    observed: dict[str, int | float],
+    confidence: dict[str, float] | None = None,
+    max_edits: int = MAX_EDITS,
+) -> dict[str, int | float] | None:
+    """Fewest-edit consistent reading of ``observed``, keyed by OBSERVED_FIELDS.
+
+    Editing a field costs one edit plus a fraction for the recognizer's
+    confidence in it, so among equally short explanations the one blaming the
+    least trusted field wins. Returns None if nothing within ``max_edits``
+    digit edits is consistent, or if the best explanation is not unique.
+    """
+    confidence = confidence or {}
+    obs = {key: int(observed[key]) for key in OBSERVED_FIELDS if key != "judge"}
+    obs["judge"] = int(round(float(observed["judge"]) * JUDGE_SCALE))
+
+    # Counts are built up column by column, pruning rows over the edit budget
+    rows = np.zeros((1, 0), dtype=np.int64)
+    edits = np.zeros(1, dtype=np.int64)
+    for key in COUNT_FIELDS[:3]:
+        rows, edits = _extend(rows, edits, obs[key], max_edits)
+    edits = _check(calculate_scores(*rows.T), edits, obs["score"], max_edits)
+    rows, edits = rows[edits <= max_edits], edits[edits <= max_edits]
+    rows, edits = _extend(rows, edits, obs["good_y"], max_edits)
+    rows, edits = _extend(rows, edits, obs["total_notes"], max_edits)
+
+    # Miss follows from the total; it must still look like what was read
+    total = rows[:, 4]
+    miss = total - rows[:, :4].sum(axis=1)
+    edits = np.where(
+        miss >= 0, _check(miss, edits, obs["miss_y"], max_edits), max_edits + 1
+    )
+    rows = np.column_stack([rows[:, :4], miss, total])
+    rows, edits = rows[edits <= max_edits], edits[edits <= max_edits]
+    if not len(rows):
+        return None
+
+    judge = np.rint(calculate_judge_rates(*rows[:, :5].T) * JUDGE_SCALE).astype(
+        np.int64
+    )
+    edits = _check(judge, edits, obs["judge"], max_edits)
+    valid = edits <= max_edits
+    if not valid.any():
+        return None
+    rows, judge = rows[valid], judge[valid]
+    score = calculate_scores(*rows[:, :3].T)
+
+    columns = {
+        **{key: rows[:, i] for i, key in enumerate(COUNT_FIELDS)},
+        "total_notes": rows[:, 5],
+        "score": score,
+        "judge": judge,
+    }
+    cost = np.zeros(len(rows))
+    for key, values in columns.items():
+        weight = 1 + confidence.get(key, 0.0) / 100
+        cost += np.where(values != obs[key], weight, 0.0)
+    order = np.argsort(cost, kind="stable")
+    if len(order) > 1 and np.isclose(cost[order[0]], cost[order[1]]):
+        return None  # two explanations fit equally well; leave it to re-OCR
+    best = order[0]
+    solution = {key: int(values[best]) for key, values in columns.items()}
+    solution["judge"] = solution["judge"] / JUDGE_SCALE
+    return solution
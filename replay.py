@@ -0,0 +1,181 @@
+"""Re-runs recognition on crop dumps instead of whole screenshots.
+
+Dumps come from ``platina-archive analyze --dump-crops DIR`` (or
+``ScreenshotAnalyzer(dump_dir=...)``). Each recorded field is read again from
+its preprocessed crop, or with ``--from-raw`` preprocessed again first, so
+preprocessing options can be overridden with ``--set``. Raw crops read by a
+lookup table (rank, full combo) are matched against the current table
+again, and jacket crops are re-matched when songs are given. The summary lists, per field, how many
+readings changed and the mean confidence; ``--diffs`` prints every change.
+
+Usage:
+    python -m replay dumps/ --workers 8
+    python -m replay dumps/ --from-raw --set threshold=180 --diffs
+    python -m replay dumps/ --songs db.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from analyzer import ScreenshotAnalyzer, last_confidence, record_confidence
+from crop_dump import array_key, list_dumps, load_dump
+from lookup import get_table
+from phash import phash
+from songindex import SongIndex, publish_song_index
+
+_worker_analyzer: ScreenshotAnalyzer | None = None
+_worker_options: dict = {}
+
+
+def _init_worker(index_path: str | None, tesseract_cmd: str | None, options: dict):
+    global _worker_analyzer, _worker_options
+    songs = SongIndex.open(index_path) if index_path else []
+    _worker_analyzer = ScreenshotAnalyzer(songs, tesseract_cmd)
+    _worker_options = options
+
+
+def replay_dump(path: str) -> list[dict]:
+    """One row per recorded field: old and new value, confidence and time."""
+    meta, arrays = load_dump(path)
+    rows = []
+    for name, field in meta["fields"].items():
+        screen_type, config_key = field["screen_type"], field["config_key"]
+        raw = Image.fromarray(arrays[array_key(screen_type, config_key, "raw")])
+        start = time.perf_counter()
+        if config_key == "jacket":
+            if not len(_worker_analyzer.song_index):
+                continue
+            song, distance = _worker_analyzer.get_best_match_song(phash(raw), raw)
+            old, new = meta.get("song_id"), song.id if song else None
+            confidence = None
+        elif field.get("table"):
+            old, new = field["value"], get_table(field["table"]).match(phash(raw))
+            confidence = None
+        elif field["ocr_func"]:
+            kwargs = field["kwargs"]
+            if _worker_options["from_raw"]:
+                kwargs = {**kwargs, **_worker_options["overrides"]}
+                crop = ScreenshotAnalyzer.ocr_preprocess(raw, **kwargs)
+            else:
+                crop = Image.fromarray(
+                    arrays[array_key(screen_type, config_key, "pre")]
+                )
+            record_confidence(0.0)
+            ocr_func = getattr(ScreenshotAnalyzer, field["ocr_func"])
+            old, new = field["value"], ocr_func(crop, **kwargs)
+            confidence = last_confidence()
+        else:
+            continue
+        rows.append(
+            {
+                "dump": os.path.basename(path),
+                "field": name,
+                "old": old,
+                "new": new,
+                "confidence": confidence,
+                "ms": (time.perf_counter() - start) * 1000,
+            }
+        )
+    return rows
+
+
+def summarize(rows: list[dict]) -> dict:
+    fields: dict[str, dict] = {}
+    for row in rows:
+        stats = fields.setdefault(
+            row["field"], {"n": 0, "changed": 0, "confidence": [], "ms": 0.0}
+        )
+        stats["n"] += 1
+        stats["changed"] += row["old"] != row["new"]
+        stats["ms"] += row["ms"]
+        if row["confidence"] is not None:
+            stats["confidence"].append(row["confidence"])
+    return {
+        name: {
+            "n": stats["n"],
+            "changed": stats["changed"],
+            "mean_confidence": (
+                round(sum(stats["confidence"]) / len(stats["confidence"]), 2)
+                if stats["confidence"]
+                else None
+            ),
+            "mean_ms": round(stats["ms"] / stats["n"], 3),
+        }
+        for name, stats in sorted(fields.items())
+    }
+
+
+def parse_override(text: str) -> tuple[str, object]:
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dumps", help="Folder of .npz crop dumps")
+    parser.add_argument("--songs", help="db.json; enables jacket re-matching")
+    parser.add_argument("--tesseract", help="Path to the tesseract binary")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--from-raw", action="store_true", help="Preprocess the raw crops again"
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Preprocessing override for --from-raw, e.g. threshold=180 or scale=3",
+    )
+    parser.add_argument("--diffs", action="store_true", help="Print changed readings")
+    args = parser.parse_args(argv)
+
+    options = {
+        "from_raw": args.from_raw,
+        "overrides": dict(parse_override(text) for text in args.set),
+    }
+    paths = list_dumps(args.dumps)
+    index_path = None
+    if args.songs:
+        from cli import load_songs
+
+        index_path = publish_song_index(load_songs(args.songs))
+    initargs = (index_path, args.tesseract, options)
+    start = time.perf_counter()
+    if (args.workers or 1) <= 1:
+        _init_worker(*initargs)
+        results = list(map(replay_dump, paths))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=args.workers, initializer=_init_worker, initargs=initargs
+        ) as pool:
+            results = list(pool.map(replay_dump, paths, chunksize=8))
+    rows = [row for result in results for row in result]
+
+    if args.diffs:
+        for row in rows:
+            if row["old"] != row["new"]:
+                print(json.dumps(row, ensure_ascii=False))
+    summary = {
+        "dumps": len(paths),
+        "readings": len(rows),
+        "changed": sum(row["old"] != row["new"] for row in rows),
+        "seconds": round(time.perf_counter() - start, 3),
+        "fields": summarize(rows),
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""Local HTTP analysis service backed by a warm, pre-forked worker pool.
+
+Endpoints:
+    POST /analyze  screenshot body, either an encoded image (``image/png``,
+                   ``image/jpeg``, ...) or raw pixels
+                   (``application/octet-stream`` with ``X-Width``/``X-Height``
+                   and optionally ``X-Pixel-Format``: RGB, RGBA, BGRA, ...)
+    GET  /health   liveness, pool size and queue depth
+    GET  /metrics  request counters and latency histograms
+
+The song index and jacket hashes are compiled once in the parent and
+published as a file that every worker maps read-only (see songindex.py), so
+workers start in milliseconds and share one copy of it. Every worker is
+started before the service accepts requests. Requests beyond ``max_pending``
+are rejected with 503 instead of queuing without bound.
+
+Usage:
+    python -m server --songs db.json --workers 4 --port 8765
+    curl --data-binary @shot.png -H "Content-Type: image/png" localhost:8765/analyze
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from analyzer import ScreenshotAnalyzer
+from cli import load_songs, report_to_json
+from ingest import PIXEL_FORMATS, from_buffer, open_image
+from instrumentation import METRICS, Instrumentation
+from models import Song
+from songindex import SongIndex, publish_song_index
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024 * 1024  # a raw 4K RGB frame is ~25 MB
+REQUEST_TIMEOUT = 30.0
+WARM_UP_TIMEOUT = 60.0
+
+_worker_analyzer: ScreenshotAnalyzer | None = None
+
+
+def _init_worker(index_path: str, tesseract_cmd: str | None):
+    global _worker_analyzer
+    _worker_analyzer = ScreenshotAnalyzer(SongIndex.open(index_path), tesseract_cmd)
+    # Per-request diagnostics come from the worker's own counters
+    METRICS.enabled = True
+
+
+def _warm_up(barrier) -> int:
+    # Returns only once every worker holds a warm-up job, i.e. all have started
+    barrier.wait(WARM_UP_TIMEOUT)
+    return os.getpid()
+
+
+def decode_image(
+    body: bytes, width: int | None, height: int | None, pixel_format: str = "RGB"
+) -> Image.Image:
+    """Encoded image bytes, or raw pixels when ``width``/``height`` are given."""
+    if width is None:
+        return open_image(io.BytesIO(body))
+    return from_buffer(body, width, height, pixel_format)
+
+
+def _analyze(
+    body: bytes, width: int | None, height: int | None, pixel_format: str = "RGB"
+) -> dict:
+    METRICS.reset()
+    start = time.perf_counter()
+    report = _worker_analyzer.analyze_image(
+        decode_image(body, width, height, pixel_format)
+    )
+    snapshot = METRICS.snapshot()
+    return {
+        **report_to_json(report),
+        "diagnostics": {
+            "worker_pid": os.getpid(),
+            "analyze_ms": round((time.perf_counter() - start) * 1000, 3),
+            "counters": snapshot["counters"],
+            "stages_ms": {
+                name: hist["mean_ms"] for name, hist in snapshot["histograms"].items()
+            },
+        },
+    }
+
+
+class AnalysisService:
+    """Worker pool plus the admission control shared by all request threads."""
+
+    def __init__(
+        self,
+        songs: list[Song],
+        workers: int,
+        max_pending: int,
+        tesseract_cmd: str | None = None,
+    ):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._song_count = len(songs)
+        self.metrics = Instrumentation(enabled=True)
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(publish_song_index(songs), tesseract_cmd),
+        )
+        # Start every worker now rather than on the first requests; the
+        # barrier keeps one early worker from taking every warm-up job
+        with multiprocessing.Manager() as manager:
+            barrier = manager.Barrier(workers)
+            warm_ups = [self._pool.submit(_warm_up, barrier) for _ in range(workers)]
+            for future in warm_ups:
+                future.result()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "workers": self._workers,
+            "songs": self._song_count,
+            "pending": self._pending,
+            "max_pending": self._max_pending,
+        }
+
+    def analyze(
+        self,
+        body: bytes,
+        width: int | None,
+        height: int | None,
+        pixel_format: str = "RGB",
+    ) -> dict:
+        """Runs one analysis on the pool. Raises OverflowError when the queue is full."""
+        with self._lock:
+            if self._pending >= self._max_pending:
+                raise OverflowError("analysis queue is full")
+            self._pending += 1
+        try:
+            future = self._pool.submit(_analyze, body, width, height, pixel_format)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the pool is done with the work, not until the
+        # request gives up on it, so timed-out work still counts as pending
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=REQUEST_TIMEOUT)
+        except TimeoutError:
+            # Drops it if still queued; work already running keeps its slot
+            future.cancel()
+            raise
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PlatinaArchiveAnalyzer/1"
+    service: AnalysisService  # set by make_server
+
+    def _send_json(self, status: HTTPStatus, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, self.service.health())
+        elif self.path == "/metrics":
+            snapshot = self.service.metrics.snapshot()
+            snapshot.pop("events")
+            snapshot["pending"] = self.service.pending
+            self._send_json(HTTPStatus.OK, snapshot)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/analyze":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        metrics = self.service.metrics
+        metrics.count("requests")
+        with metrics.span("request"):
+            status, payload, headers = self._handle_analyze()
+        metrics.count(f"status.{status.value}")
+        self._send_json(status, payload, headers)
+
+    def _handle_analyze(self) -> tuple[HTTPStatus, dict, dict]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return HTTPStatus.BAD_REQUEST, {"error": "empty body"}, {}
+        if length > MAX_BODY_BYTES:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, {}
+        body = self.rfile.read(length)
+
+        width = height = None
+        pixel_format = self.headers.get("X-Pixel-Format", "RGB").upper()
+        if self.headers.get("Content-Type", "").startswith("application/octet-stream"):
+            try:
+                width = int(self.headers["X-Width"])
+                height = int(self.headers["X-Height"])
+            except (KeyError, TypeError, ValueError):
+                return (
+                    HTTPStatus.BAD_REQUEST,
+                    {"error": "raw pixels need X-Width and X-Height headers"},
+                    {},
+                )
+            if pixel_format not in PIXEL_FORMATS:
+                return (
+                    HTTPStatus.BAD_REQUEST,
+                    {
+                        "error": f"X-Pixel-Format must be one of {', '.join(PIXEL_FORMATS)}"
+                    },
+                    {},
+                )
+
+        try:
+            return (
+                HTTPStatus.OK,
+                self.service.analyze(body, width, height, pixel_format),
+                {},
+            )
+        except OverflowError as e:
+            return (
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                {"error": str(e)},
+                {"Retry-After": "1"},
+            )
+        except TimeoutError:
+            return HTTPStatus.GATEWAY_TIMEOUT, {"error": "analysis timed out"}, {}
+        except (ValueError, OSError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"{type(e).__name__}: {e}"}, {}
+        except Exception as e:
+            return (
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                {"error": f"{type(e).__name__}: {e}"},
+                {},
+            )
+
+    def log_message(self, format, *args):
+        pass  # /metrics covers it; per-request stderr lines slow down load tests
+
+
+def make_server(
+    service: AnalysisService, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundAnalysisRequestHandler", (AnalysisRequestHandler,), {"service": service}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(
+    songs_path: str | None = None,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    workers: int | None = None,
+    max_pending: int | None = None,
+    tesseract_cmd: str | None = None,
+):
+    workers = workers or os.cpu_count() or 1
+    service = AnalysisService(
+        load_songs(songs_path), workers, max_pending or workers * 4, tesseract_cmd
+    )
+    server = make_server(service, host, port)
+    print(f"Listening on http://{host}:{port} with {workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--songs", help="db.json with songs (default: client cache)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="Requests admitted at once before answering 503 (default: 4 per worker)",
+    )
+    parser.add_argument("--tesseract", help="Path to the tesseract binary")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    serve(
+        args.songs, args.host, args.port, args.workers, args.max_pending, args.tesseract
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Session-level deduplication of analyzed plays.
+
+The same play is often captured more than once: the RESULT screen twice, or
+the SELECT screen right after the RESULT. ``ResultSession`` skips byte-identical
+captures before they reach the analyzer, folds every report of one play into a
+single best record and remembers what has already been uploaded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Iterable
+
+from PIL import Image
+
+from ingest import open_image
+from models import AnalysisReport
+from recalc import find_inconsistent_reports
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def play_key(report: AnalysisReport) -> tuple:
+    """One play: the chart (song matched from the jacket hash) plus its score and judge."""
+    return (report.chart_key, report.score, report.judge)
+
+
+def merge_reports(a: AnalysisReport, b: AnalysisReport) -> AnalysisReport:
+    """Best-of merge of two reports of the same play.
+
+    RESULT screens carry the precise note counts and P.A.T.C.H., SELECT screens
+    the rank badge. Flags are OR-ed and the closest jacket match is kept.
+    """
+    result = a if a.screen_type == "RESULT" else b
+    select = b if result is a else a
+    if select.screen_type != "SELECT":
+        select = result
+    closest = a if a.match_distance <= b.match_distance else b
+    return AnalysisReport(
+        result.song,
+        result.score,
+        result.judge,
+        result.patch,
+        result.line,
+        result.difficulty,
+        result.level,
+        result.jacket_image,
+        closest.jacket_hash,
+        closest.match_distance,
+        select.rank,
+        a.is_full_combo or b.is_full_combo,
+        a.is_perfect_decode or b.is_perfect_decode,
+        a.is_maximum_patch or b.is_maximum_patch,
+        max(a.total_notes, b.total_notes),
+        max(a.perfect_high, b.perfect_high),
+        screen_type=result.screen_type,
+        confidence=result.confidence,
+        match_margin=closest.match_margin,
+        crop_hashes={**a.crop_hashes, **b.crop_hashes},
+    )
+
+
+class ResultSession:
+    """Plays seen since the client started, keyed by ``play_key``."""
+
+    def __init__(self):
+        self._fingerprints: set[bytes] = set()
+        self._plays: dict[tuple, AnalysisReport] = {}
+        self._uploaded: dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._plays)
+
+    @staticmethod
+    def fingerprint(img: Image.Image) -> bytes:
+        return hashlib.blake2b(
+            f"{img.mode}{img.size}".encode() + img.tobytes(), digest_size=16
+        ).digest()
+
+    def seen_image(self, img: Image.Image) -> bool:
+        """True if this exact capture was already analyzed; records it otherwise."""
+        fingerprint = self.fingerprint(img)
+        with self._lock:
+            if fingerprint in self._fingerprints:
+                return True
+            self._fingerprints.add(fingerprint)
+            return False
+
+    def add(self, report: AnalysisReport) -> tuple[AnalysisReport, bool]:
+        """Merges ``report`` into its play.
+
+        Returns the best record so far and whether it changed, i.e. whether the
+        report was a new play or contributed a field the record lacked.
+        """
+        key = play_key(report)
+        with self._lock:
+            previous = self._plays.get(key)
+            if previous is None:
+                self._plays[key] = report
+                return report, True
+            merged = merge_reports(previous, report)
+            changed = (
+                merged.json() != previous.json()
+                or merged.rank != previous.rank
+                or merged.total_notes != previous.total_notes
+            )
+            self._plays[key] = merged
+            return merged, changed
+
+    def needs_upload(self, report: AnalysisReport) -> bool:
+        with self._lock:
+            return self._uploaded.get(play_key(report)) != report.json()
+
+    def mark_uploaded(self, report: AnalysisReport):
+        with self._lock:
+            self._uploaded[play_key(report)] = report.json()
+
+    def import_images(
+        self, analyzer, paths: Iterable[str]
+    ) -> tuple[list[AnalysisReport], list[tuple[str, str]], list[AnalysisReport]]:
+        """Analyzes every new capture in ``paths`` and merges it into its play.
+
+        Returns the best record of each play the captures touched, once per play,
+        (path, error) pairs for the files that failed, and the records among
+        them whose rank or P.A.T.C.H. disagrees with their judge rate, which
+        points at a misread.
+        """
+        touched: dict[tuple, None] = {}
+        errors = []
+        for path in paths:
+            try:
+                img = open_image(path)
+                if self.seen_image(img):
+                    continue
+                report = analyzer.analyze_image(img)
+            except Exception as e:
+                errors.append((path, f"{type(e).__name__}: {e}"))
+                continue
+            self.add(report)
+            touched[play_key(report)] = None
+        with self._lock:
+            reports = [self._plays[key] for key in touched]
+        return reports, errors, find_inconsistent_reports(reports)
+
+
+def list_screenshots(folder: str) -> list[str]:
+    """Screenshots in ``folder``, oldest first so merges follow capture order."""
+    paths = [
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    return sorted(paths, key=os.path.getmtime)
@@ -9,24 +9,45 @@ build_exe_options = {
     "packages": [
         "tkinter",
         "PIL",
-        "imagehash",
+        "numpy",
         "pytesseract",
         "requests",
         "keyring",
         "keyring.backends.Windows",
         "pynput",
-        "scipy",
         "win32ctypes",
         "win32ctypes.pywin32",
     ],
     "includes": [
         "analyzer",
+        "archive_db",
+        "calibration",
+        "cli",
+        "credentials",
+        "crop_dump",
+        "embedding",
+        "ingest",
+        "instrumentation",
+        "lookup",
+        "log_panel",
         "login",
         "models",
+        "net",
+        "phash",
+        "recalc",
+        "replay",
+        "reconcile",
+        "server",
+        "session",
+        "songindex",
+        "thumbnails",
+        "version",
+        "video",
     ],
     "include_files": [
         ("tesseract/", "tesseract/"),  # Include entire tesseract directory
         ("icon.ico", "icon.ico"),
+        ("tables/", "tables/"),
     ],
     "excludes": [
         "matplotlib",
@@ -61,7 +82,14 @@ executables = [
         icon="icon.ico",
         shortcut_name="PLATiNA-ARCHiVE",
         shortcut_dir="DesktopFolder",
-    )
+    ),
+    # Headless analyzer for batch use: platina-archive analyze <screenshots>
+    Executable(
+        script="cli.py",
+        base=None,
+        target_name="platina-archive.exe",
+        icon="icon.ico",
+    ),
 ]
 
 setup(
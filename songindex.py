@@ -0,0 +1,278 @@
+"""Compiled song index in one flat buffer that worker processes map read-only.
+
+``publish_song_index`` packs the songs, their charts and the jacket hashes
+into a single file next to the song cache:
+
+    header   magic, then a JSON table of (offset, dtype, shape) per array
+    songs    ids (sorted) and string ids of title, artist, BPM, DLC and hashes
+    charts   line, difficulty, level and designer per chart, grouped by song
+    jackets  pHash, song row and variant per jacket
+    strings  UTF-8 pool with offsets
+
+Workers open it with ``SongIndex.open``: the arrays are numpy views over a
+shared read-only mapping, so attaching takes milliseconds, the page cache
+holds one copy for every worker, and the jacket hashes are matched in place.
+Song objects are built only for the songs a worker actually looks at.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import io
+import json
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from models import Pattern, Song
+from phash import hex_to_value
+
+APPDATA_ROAMING = os.environ.get("APPDATA", os.path.expanduser("~"))
+SONG_INDEX_DIR = os.path.join(APPDATA_ROAMING, "PLATiNA-ARCHiVE", "cache")
+
+# Seconds after its last publish before an index file may be removed
+STALE_INDEX_AGE = 7 * 24 * 3600
+MAGIC = b"PLASIDX1"
+ALIGN = 64
+NO_VALUE = -1
+VARIANTS = ("normal", "plus")
+# Per-song string columns
+SONG_STRINGS = ("title", "artist", "bpm", "dlc", "phash", "plus_phash")
+
+
+class _StringPool:
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+
+    def add(self, value: str | None) -> int:
+        if value is None:
+            return NO_VALUE
+        return self._ids.setdefault(value, len(self._ids))
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        encoded = [value.encode("utf-8") for value in self._ids]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def compile_songs(songs: list[Song]) -> bytes:
+    """The index of ``songs`` as one buffer (see the module docstring)."""
+    songs = sorted(songs, key=lambda song: song.id)
+    pool = _StringPool()
+    song_strings = np.array(
+        [
+            [
+                pool.add(song.title),
+                pool.add(song.artist),
+                # Free-form payload values; kept exactly as the API sent them
+                pool.add(json.dumps(song.bpm)),
+                pool.add(json.dumps(song.dlc)),
+                pool.add(song.phash),
+                pool.add(song.plus_phash),
+            ]
+            for song in songs
+        ],
+        dtype=np.int32,
+    ).reshape(len(songs), len(SONG_STRINGS))
+
+    charts = [
+        (pattern, row) for row, song in enumerate(songs) for pattern in song.patterns
+    ]
+    chart_start = np.searchsorted(
+        np.array([row for _, row in charts], dtype=np.int64),
+        np.arange(len(songs) + 1),
+    )
+    jackets = [
+        (hex_to_value(song_hash), row, variant)
+        for row, song in enumerate(songs)
+        for variant, song_hash in enumerate((song.phash, song.plus_phash))
+        if song_hash
+    ]
+
+    def optional_int(value) -> int:
+        return NO_VALUE if value is None else value
+
+    arrays = {
+        "song_ids": np.array([song.id for song in songs], dtype=np.int64),
+        "song_strings": song_strings,
+        "chart_start": chart_start.astype(np.int64),
+        "chart_line": np.array(
+            [optional_int(p.line) for p, _ in charts], dtype=np.int16
+        ),
+        "chart_difficulty": np.array(
+            [pool.add(p.difficulty) for p, _ in charts], dtype=np.int32
+        ),
+        "chart_level": np.array(
+            [optional_int(p.level) for p, _ in charts], dtype=np.int16
+        ),
+        "chart_designer": np.array(
+            [pool.add(p.designer) for p, _ in charts], dtype=np.int32
+        ),
+        "jacket_hashes": np.array([h for h, _, _ in jackets], dtype=np.uint64),
+        "jacket_rows": np.array([row for _, row, _ in jackets], dtype=np.int32),
+        "jacket_variants": np.array([v for _, _, v in jackets], dtype=np.int8),
+    }
+    # Last, once the chart columns have added their strings
+    arrays["strings"], arrays["string_offsets"] = pool.arrays()
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [offset, array.dtype.str, list(array.shape)]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps(layout).encode("utf-8")
+    header_size = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    out = io.BytesIO()
+    out.write(MAGIC)
+    out.write(np.uint64(len(header)).tobytes())
+    out.write(header)
+    for name, array in arrays.items():
+        out.seek(header_size + layout[name][0])
+        out.write(np.ascontiguousarray(array).tobytes())
+    out.seek(0, io.SEEK_END)
+    out.write(b"\0" * (header_size + offset - out.tell()))
+    return out.getvalue()
+
+
+class SongIndex:
+    """Read-only song index over a compiled buffer (bytes or a memory map)."""
+
+    def __init__(self, buffer, songs: dict[int, Song] | None = None):
+        view = memoryview(buffer)
+        if bytes(view[: len(MAGIC)]) != MAGIC:
+            raise ValueError("not a song index")
+        header_len = int(np.frombuffer(view, np.uint64, 1, len(MAGIC))[0])
+        header_start = len(MAGIC) + 8
+        layout = json.loads(bytes(view[header_start : header_start + header_len]))
+        header_size = -(-(header_start + header_len) // ALIGN) * ALIGN
+        arrays = {}
+        for name, (offset, dtype, shape) in layout.items():
+            count = int(np.prod(shape, dtype=np.int64))
+            arrays[name] = np.frombuffer(
+                view, np.dtype(dtype), count, header_size + offset
+            ).reshape(shape)
+            arrays[name].flags.writeable = False
+        self._buffer = buffer
+        self._arrays = arrays
+        # Row -> Song, built on first use
+        self._songs: dict[int, Song] = dict(songs or {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_songs(cls, songs: list[Song]) -> SongIndex:
+        """An in-memory index that hands out the given Song objects."""
+        by_row = dict(enumerate(sorted(songs, key=lambda song: song.id)))
+        return cls(compile_songs(songs), by_row)
+
+    @classmethod
+    def open(cls, path: str) -> SongIndex:
+        """Maps a published index read-only."""
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapping)
+
+    def __len__(self):
+        return len(self._arrays["song_ids"])
+
+    @property
+    def song_ids(self):
+        return self._arrays["song_ids"]
+
+    @property
+    def jacket_hashes(self):
+        return self._arrays["jacket_hashes"]
+
+    @property
+    def jacket_rows(self):
+        """Song row of each jacket hash."""
+        return self._arrays["jacket_rows"]
+
+    @property
+    def jacket_variants(self):
+        """Index into VARIANTS of each jacket hash."""
+        return self._arrays["jacket_variants"]
+
+    def _string(self, string_id: int) -> str | None:
+        if string_id == NO_VALUE:
+            return None
+        offsets = self._arrays["string_offsets"]
+        start, end = int(offsets[string_id]), int(offsets[string_id + 1])
+        return self._arrays["strings"][start:end].tobytes().decode("utf-8")
+
+    def song(self, row: int) -> Song:
+        song = self._songs.get(row)
+        if song is not None:
+            return song
+        values = dict(
+            zip(SONG_STRINGS, map(self._string, self._arrays["song_strings"][row]))
+        )
+        song = Song(
+            song_id=int(self._arrays["song_ids"][row]),
+            title=values["title"],
+            artist=values["artist"],
+            bpm=json.loads(values["bpm"]),
+            dlc=json.loads(values["dlc"]),
+            phash=values["phash"],
+            plus_phash=values["plus_phash"],
+        )
+        start, end = self._arrays["chart_start"][row : row + 2]
+        for chart in range(int(start), int(end)):
+            line = int(self._arrays["chart_line"][chart])
+            level = int(self._arrays["chart_level"][chart])
+            song.add_pattern(
+                Pattern(
+                    line=None if line == NO_VALUE else line,
+                    difficulty=self._string(
+                        int(self._arrays["chart_difficulty"][chart])
+                    ),
+                    level=None if level == NO_VALUE else level,
+                    designer=self._string(int(self._arrays["chart_designer"][chart])),
+                )
+            )
+        with self._lock:
+            return self._songs.setdefault(row, song)
+
+    def find(self, song_id: int) -> Song | None:
+        ids = self._arrays["song_ids"]
+        row = int(np.searchsorted(ids, song_id))
+        if row < len(ids) and ids[row] == song_id:
+            return self.song(row)
+        return None
+
+    def songs(self) -> list[Song]:
+        return [self.song(row) for row in range(len(self))]
+
+
+def publish_song_index(songs: list[Song], folder: str = SONG_INDEX_DIR) -> str:
+    """Writes the index of ``songs`` once and returns its path for workers to open.
+
+    The file is named by its content, so publishing the same songs again
+    reuses it. Indexes nobody has published for STALE_INDEX_AGE are removed;
+    a younger one may belong to another process whose workers have yet to
+    open it (POSIX lets a file be removed while it is about to be opened).
+    """
+    data = compile_songs(songs)
+    name = f"songs-{hashlib.blake2b(data, digest_size=16).hexdigest()}.idx"
+    path = os.path.join(folder, name)
+    if os.path.isfile(path):
+        # Publishing counts as use, so it is not reaped while in use
+        os.utime(path)
+    else:
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    cutoff = time.time() - STALE_INDEX_AGE
+    for old_path in glob.glob(os.path.join(folder, "songs-*.idx")):
+        try:
+            if old_path != path and os.path.getmtime(old_path) < cutoff:
+                os.remove(old_path)
+        except OSError:
+            pass  # gone already, or still mapped by a running worker (Windows)
+    return path
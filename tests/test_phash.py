@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmarks.synthetic import make_jacket
+from phash import (
+    hamming,
+    hamming_distances,
+    hashes_from_hex,
+    hex_to_value,
+    phash,
+    phash_many,
+    value_to_hex,
+)
+
+
+def sample_images(count: int) -> list[Image.Image]:
+    """Jackets, noise of odd sizes and binary text-like crops."""
+    rng = random.Random(1)
+    images = []
+    for i in range(count):
+        if i % 3 == 0:
+            images.append(make_jacket(rng, rng.choice([37, 50, 100, 400])))
+        elif i % 3 == 1:
+            shape = (rng.randint(10, 200), rng.randint(10, 200), 3)
+            pixels = np.random.RandomState(i).randint(0, 256, shape, dtype=np.uint8)
+            images.append(Image.fromarray(pixels))
+        else:
+            mask = np.random.RandomState(i).rand(40, 90) > 0.5
+            images.append(Image.fromarray(mask.astype(np.uint8) * 255).convert("RGB"))
+    return images
+
+
+def test_matches_imagehash_bit_exact():
+    imagehash = pytest.importorskip("imagehash")
+    for img in sample_images(1500):
+        assert value_to_hex(phash(img)) == str(imagehash.phash(img))
+
+
+def test_phash_many_matches_phash():
+    images = sample_images(60)
+    assert [int(h) for h in phash_many(images)] == [phash(img) for img in images]
+
+
+def test_phash_many_of_nothing():
+    assert len(phash_many([])) == 0
+
+
+def test_hex_round_trip():
+    for hex_str in ("0000000000000000", "c0c73d38273ed2c3", "ffffffffffffffff"):
+        assert value_to_hex(hex_to_value(hex_str)) == hex_str
+
+
+def test_hamming_distances_match_hamming():
+    rng = random.Random(2)
+    values = [rng.getrandbits(64) for _ in range(500)] + [0, 2**64 - 1]
+    hashes = hashes_from_hex(value_to_hex(v) for v in values)
+    target = rng.getrandbits(64)
+    distances = hamming_distances(hashes, target)
+    assert distances.tolist() == [hamming(v, target) for v in values]
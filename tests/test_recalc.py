@@ -0,0 +1,123 @@
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+
+from analyzer import ScreenshotAnalyzer
+from models import AnalysisReport, DecodeResult
+from recalc import (
+    calculate_judge_rates,
+    calculate_patches,
+    calculate_ranks,
+    calculate_scores,
+    find_inconsistent_counts,
+    find_inconsistent_reports,
+    rederive_archive,
+)
+
+
+def random_counts(count: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    counts = np.column_stack(
+        [
+            rng.integers(0, 2000, count),
+            rng.integers(0, 300, count),
+            rng.integers(0, 80, count),
+            rng.integers(0, 30, count),
+            rng.integers(0, 30, count),
+        ]
+    )
+    counts[0] = 0  # an empty chart
+    counts[1] = (7, 0, 0, 0, 0)
+    return counts
+
+
+def test_judge_rates_and_scores_match_the_scalar_calculators():
+    counts = random_counts(5000)
+    rates = calculate_judge_rates(*counts.T)
+    scores = calculate_scores(*counts[:, :3].T)
+    for row, rate, score in zip(counts.tolist(), rates, scores):
+        if sum(row):
+            assert rate == ScreenshotAnalyzer.calculate_judge_rate(*row)
+        else:
+            assert rate == 0
+        assert score == ScreenshotAnalyzer.calculate_score(*row[:3])
+
+
+def test_ranks_and_patches_match_the_scalar_calculators():
+    rng = random.Random(0)
+    # Thresholds and values around them, plus random rates
+    judges = [70, 80, 90, 95, 97, 98, 99, 99.5, 99.8, 100, 69.9999, 99.7999]
+    judges += [round(rng.uniform(50, 100), 4) for _ in range(3000)]
+    levels = [rng.randint(1, 20) for _ in judges]
+    is_plus = [rng.random() < 0.5 for _ in judges]
+
+    ranks = calculate_ranks(judges)
+    patches = calculate_patches(levels, judges, is_plus)
+    for judge, level, plus, rank, patch in zip(judges, levels, is_plus, ranks, patches):
+        expected_rank = ScreenshotAnalyzer.calculate_rank(judge)
+        assert rank == expected_rank
+        assert patch == ScreenshotAnalyzer.calculate_patch(
+            level, expected_rank, plus, judge
+        )
+
+
+def test_f_ranks_get_no_patch():
+    patches = calculate_patches([15, 15], [95.0, 95.0], [False, False], [True, False])
+    assert patches[0] == 0 and patches[1] > 0
+
+
+def record(judge: float, patch: float, level: int = 15) -> DecodeResult:
+    return DecodeResult(
+        1, 6, "HARD", level, judge, 0, patch, datetime.now(timezone.utc), False, False
+    )
+
+
+def test_rederive_archive_returns_only_changes():
+    correct = ScreenshotAnalyzer.calculate_patch(15, "S+", False, 99.1)
+    archive = {
+        "correct": record(99.1, correct),
+        "stale": record(99.1, correct - 5),
+        "f_rank": record(60.0, 0.0),
+        "perfect": record(100.0, 700.0),
+    }
+    assert rederive_archive(archive) == {"stale": correct}
+    assert rederive_archive({}) == {}
+
+
+def test_rederive_archive_with_a_new_formula():
+    def flat_patch(value):
+        return lambda levels, judges, is_plus, is_f_rank: np.where(is_f_rank, 0, value)
+
+    archive = {"a": record(99.1, 1.0), "f_rank": record(60.0, 0.0)}
+    assert rederive_archive(archive, flat_patch(1.0)) == {}
+    assert rederive_archive(archive, flat_patch(2.0)) == {"a": 2.0}
+
+
+def report(judge: float, rank: str, patch: float) -> AnalysisReport:
+    return AnalysisReport(
+        None, 0, judge, patch, 6, "HARD", 15, None, 0, 0, rank, False, False, False
+    )
+
+
+def test_find_inconsistent_reports():
+    patch = ScreenshotAnalyzer.calculate_patch(15, "S", False, 98.5)
+    good = report(98.5, "S", patch)
+    wrong_rank = report(98.5, "AA", patch)
+    wrong_patch = report(98.5, "S", patch + 1)
+    f_rank = report(98.5, "F", 0.0)
+    reports = [good, wrong_rank, wrong_patch, f_rank]
+    assert find_inconsistent_reports(reports) == [wrong_rank, wrong_patch]
+    assert find_inconsistent_reports([]) == []
+
+
+def test_find_inconsistent_counts():
+    counts = random_counts(200, seed=3)[2:]
+    scores = calculate_scores(*counts[:, :3].T)
+    rates = calculate_judge_rates(*counts.T)
+    scores[5] += 100
+    rates[7] -= 0.01
+    assert np.flatnonzero(find_inconsistent_counts(counts, scores, rates)).tolist() == [
+        5,
+        7,
+    ]
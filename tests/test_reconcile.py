@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from analyzer import ScreenshotAnalyzer
+from reconcile import OBSERVED_FIELDS, reconcile_result
+
+
+def observe(ph: int, p: int, g: int, d: int, m: int) -> dict:
+    """What a correct read of the result screen of these counts shows."""
+    return {
+        "total_notes": ph + p + g + d + m,
+        "perfect_high_y": ph,
+        "perfect_y": p,
+        "great_y": g,
+        "good_y": d,
+        "miss_y": m,
+        "score": ScreenshotAnalyzer.calculate_score(ph, p, g),
+        "judge": ScreenshotAnalyzer.calculate_judge_rate(ph, p, g, d, m),
+    }
+
+
+def misread_digit(observed: dict, key: str, rng: random.Random) -> dict:
+    """``observed`` with one digit of ``key`` substituted."""
+    text = f"{observed[key]:.4f}" if key == "judge" else str(observed[key])
+    positions = [i for i, c in enumerate(text) if c.isdigit()]
+    i = rng.choice(positions)
+    digit = str((int(text[i]) + rng.randint(1, 9)) % 10)
+    text = text[:i] + digit + text[i + 1 :]
+    return {**observed, key: float(text) if key == "judge" else int(text)}
+
+
+def test_consistent_reading_is_kept():
+    truth = observe(1000, 10, 2, 0, 0)
+    assert reconcile_result(truth) == truth
+
+
+@pytest.mark.parametrize("key", OBSERVED_FIELDS)
+def test_single_misread_is_recovered(key):
+    truth = observe(1234, 56, 7, 3, 2)
+    observed = misread_digit(truth, key, random.Random(key))
+    assert observed != truth
+    assert reconcile_result(observed) == truth
+
+
+def test_random_single_misreads():
+    """A misread digit is corrected or refused, never replaced by a wrong play."""
+    rng = random.Random(1)
+    recovered = 0
+    for _ in range(200):
+        counts = [
+            rng.randint(300, 1500),
+            rng.randint(0, 200),
+            rng.randint(0, 60),
+            rng.randint(0, 20),
+            rng.randint(0, 20),
+        ]
+        truth = observe(*counts)
+        observed = misread_digit(truth, rng.choice(OBSERVED_FIELDS), rng)
+        result = reconcile_result(observed)
+        assert result is None or result == truth
+        recovered += result == truth
+    assert recovered >= 190
+
+
+def test_unexplainable_reading_is_refused():
+    truth = observe(1234, 56, 7, 3, 2)
+    observed = {**truth, "score": 999999, "judge": 12.3456}
+    assert reconcile_result(observed, max_edits=1) is None
+
+
+def test_ambiguous_reading_is_refused():
+    # perfect_y 102 read as 002 has more than one equally cheap explanation
+    observed = {**observe(1162, 102, 17, 15, 3), "perfect_y": 2}
+    assert reconcile_result(observed) is None
@@ -0,0 +1,95 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_song_corpus
+from models import Pattern, Song
+from songindex import STALE_INDEX_AGE, SongIndex, compile_songs, publish_song_index
+
+
+def song_fields(song: Song) -> tuple:
+    return (
+        song.id,
+        song.title,
+        song.artist,
+        song.bpm,
+        song.dlc,
+        song.phash,
+        song.plus_phash,
+        [(p.line, p.difficulty, p.level, p.designer) for p in song.patterns],
+    )
+
+
+@pytest.fixture
+def songs() -> list[Song]:
+    songs, _ = make_song_corpus(30)
+    odd = Song(
+        song_id=1000,
+        title="곡 이름 ~ ♪",
+        artist="",
+        bpm="90-180",
+        dlc="DLC 1",
+        phash="c0c73d38273ed2c3",
+        plus_phash="8a82953d9d376b1a",
+    )
+    odd.add_pattern(Pattern(None, "EASY", None, None))
+    # Out of order on purpose; the index sorts by id
+    return [odd] + songs[::-1]
+
+
+def test_round_trip(songs):
+    index = SongIndex(compile_songs(songs))
+    expected = sorted(songs, key=lambda song: song.id)
+    assert len(index) == len(expected)
+    assert [song_fields(s) for s in index.songs()] == [song_fields(s) for s in expected]
+    assert song_fields(index.find(1000)) == song_fields(songs[0])
+    assert index.find(999) is None
+
+
+def test_jacket_hashes(songs):
+    index = SongIndex(compile_songs(songs))
+    for hash_value, row in zip(index.jacket_hashes, index.jacket_rows):
+        song = index.song(int(row))
+        assert f"{int(hash_value):016x}" in (song.phash, song.plus_phash)
+    # One row per jacket: every song has a normal one, one of them a PLUS one
+    assert len(index.jacket_hashes) == len(songs) + 1
+
+
+def test_arrays_are_read_only(songs):
+    index = SongIndex(compile_songs(songs))
+    with pytest.raises(ValueError):
+        index.jacket_hashes[0] = 0
+
+
+def test_from_songs_hands_out_the_given_objects(songs):
+    index = SongIndex.from_songs(songs)
+    assert index.find(1000) is songs[0]
+
+
+def test_rejects_other_buffers():
+    with pytest.raises(ValueError):
+        SongIndex(b"not an index at all")
+
+
+def test_publish_and_open(songs, tmp_path):
+    path = publish_song_index(songs, str(tmp_path))
+    assert publish_song_index(songs, str(tmp_path)) == path
+    index = SongIndex.open(path)
+    assert [song_fields(s) for s in index.songs()] == [
+        song_fields(s) for s in sorted(songs, key=lambda song: song.id)
+    ]
+    assert np.array_equal(index.song_ids, sorted(song.id for song in songs))
+
+
+def test_publish_removes_only_stale_indexes(songs, tmp_path):
+    stale = tmp_path / "songs-stale.idx"
+    recent = tmp_path / "songs-recent.idx"
+    stale.write_bytes(b"")
+    recent.write_bytes(b"")
+    old = time.time() - STALE_INDEX_AGE - 60
+    os.utime(stale, (old, old))
+    publish_song_index(songs, str(tmp_path))
+    assert not stale.exists()
+    assert recent.exists()
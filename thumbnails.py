@@ -0,0 +1,59 @@
+"""Display-sized jacket thumbnails, cached per song and jacket variant.
+
+Reports keep a thumbnail instead of the full-resolution jacket crop, so a
+long session or a folder import holds a few hundred kilobytes per song rather
+than one crop per screenshot. Thumbnails are made on whichever thread runs
+the analysis, keeping the resize off the Tk thread.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Literal
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (200, 200)
+MAX_THUMBNAILS = 128
+
+
+def jacket_variant(difficulty: str) -> Literal["normal", "plus"]:
+    """PLUS charts have their own jacket art (``Song.plus_phash``)."""
+    return "plus" if difficulty == "PLUS" else "normal"
+
+
+def make_thumbnail(jacket: Image.Image) -> Image.Image:
+    return jacket.convert("RGB").resize(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+
+
+class ThumbnailCache:
+    """Bounded LRU of jacket thumbnails keyed by (song id, variant)."""
+
+    def __init__(self, capacity: int = MAX_THUMBNAILS):
+        self._capacity = capacity
+        self._thumbnails: OrderedDict[tuple[int, str], Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._thumbnails)
+
+    def thumbnail(
+        self, song_id: int, variant: Literal["normal", "plus"], jacket: Image.Image
+    ) -> Image.Image:
+        """The cached thumbnail for the song, made from ``jacket`` on a miss."""
+        key = (song_id, variant)
+        with self._lock:
+            cached = self._thumbnails.get(key)
+            if cached is not None:
+                self._thumbnails.move_to_end(key)
+                return cached
+        thumbnail = make_thumbnail(jacket)
+        with self._lock:
+            self._thumbnails[key] = thumbnail
+            if len(self._thumbnails) > self._capacity:
+                self._thumbnails.popitem(last=False)
+        return thumbnail
+
+
+JACKET_THUMBNAILS = ThumbnailCache()
@@ -0,0 +1,2 @@
+def version_to_string(version: tuple[int, int, int]):
+    return f"v{version[0]}.{version[1]}.{version[2]}"
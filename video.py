@@ -0,0 +1,338 @@
+"""Ingests recorded gameplay (a video file or a folder of extracted frames).
+
+Frames are scanned with a cheap pixel classifier that skips gameplay, and a
+RESULT screen is only taken once its numbers have stopped counting up. Each
+stable RESULT contributes one representative frame to ``ScreenshotAnalyzer``,
+and repeated captures of the same play are merged through ``ResultSession``.
+
+Scanning and analysis both run on a process pool: a video is split into frame
+ranges that are decoded in parallel; a RESULT screen that crosses a range
+boundary is followed to its end by the range it started in.
+
+Reading video files needs OpenCV (``pip install opencv-python-headless``);
+frame folders work without it.
+
+Usage (the same as ``platina-archive video``):
+    python -m video recording.mp4 --songs db.json --out plays.jsonl
+    python -m video frames/ --songs db.json
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Literal, Optional
+
+import numpy as np
+from PIL import Image
+
+from analyzer import (
+    COLOR_TOLERANCE,
+    DIFFICULTY_COLORS,
+    ROI_CONFIG,
+    ScreenshotAnalyzer,
+    load_cached_songs,
+)
+from calibration import Layout, cached_layout, get_layout
+from ingest import from_array, open_image, rgb_array
+from instrumentation import METRICS
+from lookup import get_table
+from models import AnalysisReport
+from phash import phash
+from session import IMAGE_EXTENSIONS, ResultSession, play_key
+from songindex import SongIndex, publish_song_index
+
+# Frames sampled per second of video; RESULT screens stay up for several seconds
+DEFAULT_SAMPLE_FPS = 4.0
+# Consecutive sampled RESULT frames with an unchanged signature before one is kept
+STABLE_FRAMES = 3
+# Mean absolute grayscale difference below which two signatures are "unchanged"
+STABLE_TOLERANCE = 2.0
+# Area holding the judge, score and note counts, which animate while counting up
+SIGNATURE_BOX = (874, 186, 1345, 890)
+SIGNATURE_GRID = (48, 64)  # rows, columns
+SELECT_SPEED_BOX = (30, 908, 119, 932)
+# Calibration key of recorded frames; a recording is one capture setup
+VIDEO_SOURCE = "video"
+_DIFFICULTY_ARRAY = np.array(list(DIFFICULTY_COLORS.values()), dtype=np.int16)
+
+
+def _frame_layout(frame: np.ndarray) -> Layout:
+    """Calibrated layout of the recording, so letterboxed video is read right."""
+    layout = cached_layout((frame.shape[1], frame.shape[0]), VIDEO_SOURCE)
+    if layout is not None:
+        return layout
+    return get_layout(from_array(frame), VIDEO_SOURCE)
+
+
+def classify_frame(frame: np.ndarray) -> Optional[Literal["SELECT", "RESULT"]]:
+    """Fast screen type of an RGB frame (H, W, 3); None for gameplay and menus.
+
+    A RESULT screen shows the difficulty color around a fixed point, so a 3x3
+    patch there is checked first. Only frames that fail that test pay for the
+    pHash of the SELECT speed indicator.
+    """
+    layout = _frame_layout(frame)
+    cx, cy = layout.point(*ROI_CONFIG["RESULT"]["difficulty_color"])
+    patch = frame[cy - 1 : cy + 2, cx - 1 : cx + 2, :3].reshape(-1, 1, 3)
+    within = np.abs(patch.astype(np.int16) - _DIFFICULTY_ARRAY) <= COLOR_TOLERANCE
+    if within.all(axis=2).all(axis=0).any():
+        return "RESULT"
+
+    x0, y0, x1, y1 = layout.box(SELECT_SPEED_BOX)
+    crop = Image.fromarray(np.ascontiguousarray(frame[y0:y1, x0:x1, :3]))
+    if get_table("screen_select_speed").match(phash(crop)) == "SELECT":
+        return "SELECT"
+    return None
+
+
+def frame_signature(frame: np.ndarray) -> np.ndarray:
+    """Coarse grayscale grid of the stats area, for cheap frame-to-frame diffs."""
+    x0, y0, x1, y1 = _frame_layout(frame).box(SIGNATURE_BOX)
+    rows = np.linspace(y0, y1 - 1, SIGNATURE_GRID[0]).astype(int)
+    cols = np.linspace(x0, x1 - 1, SIGNATURE_GRID[1]).astype(int)
+    grid = frame[np.ix_(rows, cols)][..., :3].astype(np.float32)
+    return grid @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class _Segment:
+    """A run of consecutive RESULT frames within one scanned range."""
+
+    __slots__ = ("start", "end", "frame", "stable_run", "last_signature")
+
+    def __init__(self, index: int):
+        self.start = index
+        self.end = index
+        self.frame = None  # representative frame, once the screen is stable
+        self.stable_run = 0
+        self.last_signature = None
+
+
+def scan_frames(
+    frames: Iterable[tuple[int, np.ndarray]],
+    start: int = 0,
+    stop: int | None = None,
+    stable_frames: int = STABLE_FRAMES,
+    tolerance: float = STABLE_TOLERANCE,
+) -> list[_Segment]:
+    """Finds RESULT screens in (index, frame) pairs.
+
+    Returns one segment per run of RESULT frames starting in [start, stop).
+    ``segment.frame`` holds the first frame after the screen stayed unchanged
+    for ``stable_frames`` samples (None if it never settled). A segment still
+    open at ``stop`` is followed past it, and one already running before
+    ``start`` belongs to the previous range, so ranges can be scanned
+    independently as long as each one begins a sample early.
+    """
+    segments = []
+    current = None
+    for index, frame in frames:
+        if stop is not None and index >= stop:
+            if current is None or current.frame is not None:
+                break
+        if classify_frame(frame) != "RESULT":
+            current = None
+            continue
+        if current is None:
+            current = _Segment(index)
+            segments.append(current)
+        current.end = index
+        if current.frame is not None:
+            continue
+        signature = frame_signature(frame)
+        if (
+            current.last_signature is not None
+            and np.abs(signature - current.last_signature).mean() < tolerance
+        ):
+            current.stable_run += 1
+        else:
+            current.stable_run = 1
+        current.last_signature = signature
+        if current.stable_run >= stable_frames:
+            current.frame = frame
+    for segment in segments:
+        segment.last_signature = None  # not needed past the scan; keeps pickles small
+    return [segment for segment in segments if segment.start >= start]
+
+
+def _open_video(path: str):
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError(
+            "Reading video files needs OpenCV: pip install opencv-python-headless"
+        )
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video {path}")
+    return cv2, capture
+
+
+def video_info(path: str) -> tuple[int, float]:
+    """(frame count, frames per second) of a video file."""
+    cv2, capture = _open_video(path)
+    try:
+        count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 60.0
+    finally:
+        capture.release()
+    return count, fps
+
+
+def iter_video_frames(
+    path: str, start: int = 0, stop: int | None = None, step: int = 1
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yields (frame index, RGB array) for every ``step``-th frame in [start, stop)."""
+    cv2, capture = _open_video(path)
+    try:
+        if start:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while stop is None or index < stop:
+            # grab() skips the color conversion of frames that aren't sampled
+            if not capture.grab():
+                break
+            if (index - start) % step == 0:
+                ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+                yield index, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_folder_frames(
+    paths: list[str], start: int = 0, stop: int | None = None
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yields (position, RGB array) for extracted frame images in [start, stop)."""
+    for index in range(start, len(paths) if stop is None else stop):
+        yield index, rgb_array(open_image(paths[index]))
+
+
+def iter_folder_chunk(
+    folder: str, paths: list[str], offset: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Frames of one range of a folder: ``paths`` start at position ``offset``.
+
+    A scan still following a RESULT screen past the range gets the frames
+    after it too; only then is the folder listed.
+    """
+    for index, path in enumerate(paths, offset):
+        yield index, rgb_array(open_image(path))
+    yield from iter_folder_frames(list_frames(folder), offset + len(paths))
+
+
+def list_frames(folder: str) -> list[str]:
+    """Frame images in ``folder`` in name order (the order ffmpeg writes them)."""
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _scan_chunk(job: tuple) -> list[_Segment]:
+    kind, source, start, stop, step = job
+    if kind == "video":
+        # Start one sample early to tell whether a RESULT screen is already showing
+        frames = iter_video_frames(source, max(0, start - step), step=step)
+    else:
+        frames = iter_folder_chunk(*source)
+    return scan_frames(frames, start, stop)
+
+
+_worker_analyzer: ScreenshotAnalyzer | None = None
+
+
+def _init_worker(index_path: str):
+    global _worker_analyzer
+    _worker_analyzer = ScreenshotAnalyzer(SongIndex.open(index_path))
+    _worker_analyzer.capture_source = VIDEO_SOURCE
+
+
+def _analyze_frame(frame: np.ndarray) -> tuple[AnalysisReport | None, str | None]:
+    """(report, None), or (None, error) when the analysis raised."""
+    try:
+        return _worker_analyzer.analyze_image(from_array(frame)), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def ingest(
+    source: str,
+    songs_path: str,
+    workers: int | None = None,
+    sample_fps: float = DEFAULT_SAMPLE_FPS,
+) -> tuple[list[tuple[float, AnalysisReport]], list[tuple[float, str]]]:
+    """Finds every play in a recording.
+
+    Returns (seconds, report) once per play, plus (seconds, error) for the
+    stable frames whose analysis failed. ``source`` is a video file or a
+    folder of extracted frames. For folders the frames are taken as already
+    sampled, and positions are reported instead of seconds.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = None
+    if os.path.isdir(source):
+        paths = list_frames(source)
+        total, fps, step = len(paths), 1.0, 1
+    else:
+        total, fps = video_info(source)
+        step = max(1, round(fps / sample_fps))
+    if not total:
+        return [], []
+
+    # A few chunks per worker so uneven decode speed still balances out
+    chunk = -(-total // (workers * 4))
+    chunk += (-chunk) % step  # keep sampling aligned across chunks
+    jobs = []
+    for start in range(0, total, chunk):
+        stop = min(start + chunk, total)
+        if paths is None:
+            jobs.append(("video", source, start, stop, step))
+        else:
+            # Only this range's paths: one sample early and one past the end,
+            # which is where scan_frames stops unless a screen is still open
+            lead_in = max(0, start - step)
+            job_source = (source, paths[lead_in : stop + 1], lead_in)
+            jobs.append(("folder", job_source, start, stop, step))
+
+    session = ResultSession()
+    plays = {}
+    errors = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(publish_song_index(load_cached_songs(songs_path)),),
+    ) as pool:
+        stable = [
+            segment
+            for segments in pool.map(_scan_chunk, jobs)
+            for segment in segments
+            if segment.frame is not None
+        ]
+        reports = pool.map(_analyze_frame, [segment.frame for segment in stable])
+        for segment, (report, error) in zip(stable, reports):
+            if error is not None:
+                # Counted here: counters of the worker processes are not collected
+                METRICS.count("video.frame_error")
+                METRICS.event(f"Frame at {segment.start / fps:.2f}s: {error}")
+                errors.append((segment.start / fps, error))
+                continue
+            merged, _ = session.add(report)
+            key = play_key(merged)
+            seconds = plays[key][0] if key in plays else segment.start / fps
+            plays[key] = (seconds, merged)
+    return sorted(plays.values(), key=lambda play: play[0]), errors
+
+
+def main(argv=None) -> int:
+    from cli import main as cli_main
+
+    return cli_main(["video", *(sys.argv[1:] if argv is None else argv)])
+
+
+if __name__ == "__main__":
+    sys.exit(main())